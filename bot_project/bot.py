@@ -20,6 +20,7 @@ from typing import Optional
 
 from aiogram import Bot, Dispatcher
 from aiogram.client.default import DefaultBotProperties
+from aiogram.client.session.aiohttp import AiohttpSession
 from aiogram.enums import ParseMode
 from aiogram.webhook.aiohttp_server import SimpleRequestHandler, setup_application
 from aiohttp import web
@@ -49,6 +50,10 @@ dp: Optional[Dispatcher] = None
 scheduler: Optional[ReportScheduler] = None
 web_app: Optional[web.Application] = None
 
+# Размер пула соединений с api.telegram.org - рассылки отчётов идут параллельно
+# и переиспользуют уже открытые TLS-соединения
+BOT_CONNECTION_LIMIT = 200
+
 
 async def create_bot() -> Bot:
     """Создать экземпляр бота с настройками."""
@@ -60,6 +65,7 @@ async def create_bot() -> Bot:
     # Создаём бота с настройками по умолчанию
     bot = Bot(
         token=bot_token,
+        session=AiohttpSession(limit=BOT_CONNECTION_LIMIT),
         default=DefaultBotProperties(
             parse_mode=ParseMode.MARKDOWN
         )
@@ -5,6 +5,8 @@ Provides CRUD operations for SQLite database with user events tracking.
 
 import sqlite3
 import logging
+import queue
+import threading
 from typing import Optional, List, Dict, Any, Tuple
 from datetime import datetime, date, timezone
 import os
@@ -13,6 +15,35 @@ from contextlib import contextmanager
 # Setup logging
 logger = logging.getLogger(__name__)
 
+# Maximum number of pooled SQLite connections per database
+DB_POOL_SIZE = 5
+
+# Seconds to wait for a pooled connection before opening a temporary overflow one
+DB_POOL_TIMEOUT = 5.0
+
+# Applied once per pooled connection
+CONNECTION_PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA cache_size=-20000",
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA busy_timeout=5000",
+    "PRAGMA foreign_keys=ON",
+)
+
+# Per-connection cache of compiled statements (sqlite3 looks statements up by SQL text)
+STATEMENT_CACHE_SIZE = 256
+
+# Hot write statements, shared so every call site hits the same cached statement
+UPSERT_USER_SQL = """INSERT INTO users (tg_user_id, username, name) VALUES (?, ?, ?)
+                   ON CONFLICT(tg_user_id) DO UPDATE SET 
+                   username = COALESCE(excluded.username, username),
+                   name = COALESCE(excluded.name, name)"""
+INSERT_JOURNAL_SQL = """INSERT INTO journal (event_time, event_type, tg_user_id, username, name, inviter_id, status, note, telegram_update_id) 
+                       VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)"""
+INSERT_JOURNAL_OR_IGNORE_SQL = INSERT_JOURNAL_SQL.replace("INSERT INTO", "INSERT OR IGNORE INTO", 1)
+REPEAT_INVITE_SQL = "SELECT COUNT(*) FROM journal WHERE tg_user_id = ? AND event_type = 'subscribe' AND inviter_id IS NOT NULL AND inviter_id != ?"
+
 
 class DatabaseManager:
     """
@@ -28,30 +59,109 @@ class DatabaseManager:
             db_path: Path to SQLite database file
         """
         self.db_path = db_path
+        
+        # Long-lived connections, reused across calls (most recently used first)
+        self._pool: "queue.LifoQueue[sqlite3.Connection]" = queue.LifoQueue()
+        self._pool_size = DB_POOL_SIZE
+        self._pool_created = 0
+        self._pool_lock = threading.Lock()
+        self._overflow: set = set()
+        
+        # Whether inviters.name is unique, so writes can upsert with ON CONFLICT(name)
+        self.unique_inviter_names = False
+        
+        # Bumped on every write to inviters, so caches built from that table can tell they are stale
+        self.inviters_version = 0
+        
         self.init_database()
     
+    def _connect(self) -> sqlite3.Connection:
+        """Open a new connection with row access by name and the connection PRAGMAs applied."""
+        conn = sqlite3.connect(self.db_path, check_same_thread=False,
+                               cached_statements=STATEMENT_CACHE_SIZE)
+        conn.row_factory = sqlite3.Row  # Enable dict-like access to rows
+        for pragma in CONNECTION_PRAGMAS:
+            conn.execute(pragma)
+        return conn
+    
+    def _acquire_connection(self) -> sqlite3.Connection:
+        """
+        Take a connection from the pool, opening a new one while the pool is below its size.
+        
+        When the pool is exhausted for longer than DB_POOL_TIMEOUT (e.g. a caller that
+        already holds a connection asks for another one), a temporary overflow connection
+        is opened instead of blocking forever; it is closed on release.
+        """
+        try:
+            return self._pool.get_nowait()
+        except queue.Empty:
+            pass
+        
+        with self._pool_lock:
+            can_open = self._pool_created < self._pool_size
+            if can_open:
+                self._pool_created += 1
+        
+        if not can_open:
+            try:
+                return self._pool.get(timeout=DB_POOL_TIMEOUT)
+            except queue.Empty:
+                logger.warning(f"Connection pool exhausted ({self._pool_size}), opening an overflow connection")
+                conn = self._connect()
+                with self._pool_lock:
+                    self._overflow.add(id(conn))
+                return conn
+        
+        try:
+            return self._connect()
+        except Exception:
+            with self._pool_lock:
+                self._pool_created -= 1
+            raise
+    
+    def _release_connection(self, conn: sqlite3.Connection) -> None:
+        """Return a connection to the pool, discarding any uncommitted changes."""
+        if conn.in_transaction:
+            conn.rollback()
+        with self._pool_lock:
+            is_overflow = id(conn) in self._overflow
+            self._overflow.discard(id(conn))
+        if is_overflow:
+            conn.close()
+            return
+        self._pool.put(conn)
+    
     @contextmanager
     def get_connection(self):
         """
-        Context manager for database connections with automatic cleanup.
+        Context manager for pooled database connections.
+        
+        Uncommitted changes are rolled back when the connection goes back to the pool,
+        so callers still have to commit() their writes.
         
         Yields:
             sqlite3.Connection: Database connection
         """
-        conn = None
+        conn = self._acquire_connection()
         try:
-            conn = sqlite3.connect(self.db_path)
-            conn.row_factory = sqlite3.Row  # Enable dict-like access to rows
-            conn.execute("PRAGMA foreign_keys=ON")  # Enable foreign key constraints
             yield conn
         except Exception as e:
-            if conn:
-                conn.rollback()
+            conn.rollback()
             logger.error(f"Database error: {e}")
             raise
         finally:
-            if conn:
-                conn.close()
+            self._release_connection(conn)
+    
+    def close(self) -> None:
+        """Close all idle pooled connections."""
+        while True:
+            try:
+                conn = self._pool.get_nowait()
+            except queue.Empty:
+                return
+            conn.close()
+            with self._pool_lock:
+                self._pool_created -= 1
     
     def init_database(self) -> None:
         """
@@ -75,6 +185,15 @@ class DatabaseManager:
                     # Column already exists
                     pass
                 
+                # Unique inviter names; older databases may already hold duplicates
+                try:
+                    conn.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_inviters_name ON inviters(name)")
+                    self.unique_inviter_names = True
+                except sqlite3.IntegrityError:
+                    logger.warning("Duplicate inviter names found - idx_inviters_name not created")
+                    # Still index lookups by name
+                    conn.execute("CREATE INDEX IF NOT EXISTS idx_inviters_name_nonunique ON inviters(name)")
+                
                 conn.commit()
                 logger.info("Database initialized successfully")
                 
@@ -100,13 +219,7 @@ class DatabaseManager:
         """
         with self.get_connection() as conn:
             # Atomic UPSERT operation
-            cursor = conn.execute(
-                """INSERT INTO users (tg_user_id, username, name) VALUES (?, ?, ?)
-                   ON CONFLICT(tg_user_id) DO UPDATE SET 
-                   username = COALESCE(excluded.username, username),
-                   name = COALESCE(excluded.name, name)""",
-                (tg_user_id, username, name)
-            )
+            cursor = conn.execute(UPSERT_USER_SQL, (tg_user_id, username, name))
             
             # Get the user ID (either newly inserted or existing)
             cursor = conn.execute(
@@ -140,6 +253,11 @@ class DatabaseManager:
             row = cursor.fetchone()
             return row[0] if row else None
 
+    def mark_inviters_changed(self) -> None:
+        """Record a write to the inviters table (invalidates name/id and export caches)."""
+        with self._pool_lock:
+            self.inviters_version += 1
+    
     def upsert_inviter(self, name: str, username: Optional[str] = None, 
                        invite_link: Optional[str] = None, channel_id: Optional[str] = None) -> int:
         """
@@ -174,6 +292,7 @@ class DatabaseManager:
                     (name, username, invite_link, channel_id, existing[0])
                 )
                 conn.commit()
+                self.mark_inviters_changed()
                 return existing[0]
             else:
                 # Insert new
@@ -182,6 +301,7 @@ class DatabaseManager:
                     (name, username, invite_link, channel_id)
                 )
                 conn.commit()
+                self.mark_inviters_changed()
                 return cursor.lastrowid
     
     def insert_journal_event(self, event_type: str, tg_user_id: int, 
@@ -210,10 +330,7 @@ class DatabaseManager:
         with self.get_connection() as conn:
             # Check if this is a repeat invitation
             if event_type == 'subscribe' and inviter_id:
-                cursor = conn.execute(
-                    "SELECT COUNT(*) FROM journal WHERE tg_user_id = ? AND event_type = 'subscribe' AND inviter_id IS NOT NULL AND inviter_id != ?",
-                    (tg_user_id, inviter_id)
-                )
+                cursor = conn.execute(REPEAT_INVITE_SQL, (tg_user_id, inviter_id))
                 previous_invites = cursor.fetchone()[0]
                 if previous_invites > 0:
                     note = 'repeat' if note is None else f"{note},repeat"
@@ -222,8 +339,7 @@ class DatabaseManager:
             if telegram_update_id:
                 # For better idempotency, use INSERT OR IGNORE then SELECT
                 cursor = conn.execute(
-                    """INSERT OR IGNORE INTO journal (event_time, event_type, tg_user_id, username, name, inviter_id, status, note, telegram_update_id) 
-                       VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)""",
+                    INSERT_JOURNAL_OR_IGNORE_SQL,
                     (event_time, event_type, tg_user_id, username, name, inviter_id, status, note, telegram_update_id)
                 )
                 
@@ -251,8 +367,7 @@ class DatabaseManager:
             else:
                 # No telegram_update_id - regular insert
                 cursor = conn.execute(
-                    """INSERT INTO journal (event_time, event_type, tg_user_id, username, name, inviter_id, status, note, telegram_update_id) 
-                       VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)""",
+                    INSERT_JOURNAL_SQL,
                     (event_time, event_type, tg_user_id, username, name, inviter_id, status, note, None)
                 )
                 conn.commit()
@@ -264,6 +379,34 @@ class DatabaseManager:
                 logger.info(f"Journal event inserted: {event_type} for tg_user_id={tg_user_id}, journal_id={journal_id}")
                 return journal_id
     
+    def add_manual_user(self, tg_user_id: int, username: Optional[str] = None,
+                        name: Optional[str] = None, inviter_id: Optional[int] = None) -> int:
+        """
+        Upsert a manually added user and record a 'manual_add' journal event in one transaction.
+        
+        Args:
+            tg_user_id: Telegram user ID
+            username: Telegram username (optional)
+            name: User display name (optional)
+            inviter_id: ID of inviter (optional)
+            
+        Returns:
+            int: Journal entry ID
+        """
+        event_time = datetime.now(timezone.utc).isoformat()
+        
+        with self.get_connection() as conn:
+            conn.execute(UPSERT_USER_SQL, (tg_user_id, username, name))
+            cursor = conn.execute(
+                INSERT_JOURNAL_SQL,
+                (event_time, 'manual_add', tg_user_id, username, name,
+                 inviter_id, 'subscribed', 'manually_added', None)
+            )
+            conn.commit()
+            
+            logger.info(f"Manual user added: tg_user_id={tg_user_id}, journal_id={cursor.lastrowid}")
+            return cursor.lastrowid
+    
     def get_subscriptions_for_retention_check(self, retention_days: int, check_date: str) -> List[Dict[str, Any]]:
         """
         Get subscriptions that need retention check. Only selects subscriptions 
@@ -289,6 +432,38 @@ class DatabaseManager:
             )
             return [dict(row) for row in cursor.fetchall()]
     
+    def get_subscriptions_with_retention(self, retention_days: int, check_date: str) -> List[Dict[str, Any]]:
+        """
+        Get subscriptions that need retention check together with their retention flag.
+        Same selection as get_subscriptions_for_retention_check, but resolves
+        check_user_retention for every row in a single query.
+        
+        Args:
+            retention_days: Number of days to check retention after subscription
+            check_date: Date of the check (ISO format)
+            
+        Returns:
+            List of journal entries with extra 'not_retained' column (0 or 1)
+        """
+        with self.get_connection() as conn:
+            cursor = conn.execute(
+                """SELECT j.*, EXISTS (
+                       SELECT 1 FROM journal u
+                       WHERE u.tg_user_id = j.tg_user_id
+                       AND u.event_type = 'unsubscribe'
+                       AND u.event_time > j.event_time
+                   ) AS not_retained
+                   FROM journal j 
+                   WHERE j.event_type = 'subscribe' 
+                   AND date(j.event_time) = date(?, ? || ' days')
+                   AND NOT EXISTS (
+                       SELECT 1 FROM retention_checks rc 
+                       WHERE rc.journal_id = j.id
+                   )""",
+                (check_date, f'-{retention_days}')
+            )
+            return [dict(row) for row in cursor.fetchall()]
+    
     def check_user_retention(self, journal_id: int, tg_user_id: int, 
                            subscription_time: str) -> str:
         """
@@ -359,32 +534,30 @@ class DatabaseManager:
         Get aggregated statistics for all inviters.
         
         Returns:
-            List of statistics per inviter
+            List of statistics per inviter (retention_pct is the rounded integer percentage)
         """
         with self.get_connection() as conn:
             cursor = conn.execute(
-                """SELECT 
-                    COALESCE(i.username, i.name, 'Не указан') as inviter_name,
-                    COUNT(CASE WHEN j.event_type = 'subscribe' THEN 1 END) as total_invited,
-                    COUNT(CASE WHEN j.event_type = 'subscribe' AND j.tg_user_id NOT IN (
-                        SELECT j2.tg_user_id FROM journal j2 
-                        WHERE j2.event_type = 'unsubscribe' AND j2.event_time > j.event_time
-                    ) THEN 1 END) as currently_subscribed,
-                    COUNT(CASE WHEN j.event_type = 'subscribe' AND j.tg_user_id IN (
-                        SELECT j2.tg_user_id FROM journal j2 
-                        WHERE j2.event_type = 'unsubscribe' AND j2.event_time > j.event_time
-                    ) THEN 1 END) as unsubscribed,
-                    ROUND(
-                        CAST(COUNT(CASE WHEN j.event_type = 'subscribe' AND j.tg_user_id NOT IN (
+                """SELECT *,
+                    ROUND(CAST(currently_subscribed AS FLOAT) * 100.0 / NULLIF(total_invited, 0), 2) as retention_percentage,
+                    COALESCE(CAST(ROUND(currently_subscribed * 100.0 / NULLIF(total_invited, 0)) AS INTEGER), 0) as retention_pct
+                FROM (
+                    SELECT 
+                        COALESCE(i.username, i.name, 'Не указан') as inviter_name,
+                        COUNT(CASE WHEN j.event_type = 'subscribe' THEN 1 END) as total_invited,
+                        COUNT(CASE WHEN j.event_type = 'subscribe' AND j.tg_user_id NOT IN (
+                            SELECT j2.tg_user_id FROM journal j2 
+                            WHERE j2.event_type = 'unsubscribe' AND j2.event_time > j.event_time
+                        ) THEN 1 END) as currently_subscribed,
+                        COUNT(CASE WHEN j.event_type = 'subscribe' AND j.tg_user_id IN (
                             SELECT j2.tg_user_id FROM journal j2 
                             WHERE j2.event_type = 'unsubscribe' AND j2.event_time > j.event_time
-                        ) THEN 1 END) AS FLOAT) * 100.0 / 
-                        NULLIF(COUNT(CASE WHEN j.event_type = 'subscribe' THEN 1 END), 0), 2
-                    ) as retention_percentage
-                FROM inviters i
-                LEFT JOIN journal j ON i.id = j.inviter_id
-                GROUP BY i.id, i.name, i.username
-                HAVING total_invited > 0
+                        ) THEN 1 END) as unsubscribed
+                    FROM inviters i
+                    LEFT JOIN journal j ON i.id = j.inviter_id
+                    GROUP BY i.id, i.name, i.username
+                    HAVING total_invited > 0
+                )
                 ORDER BY total_invited DESC"""
             )
             return [dict(row) for row in cursor.fetchall()]
@@ -492,6 +665,59 @@ class DatabaseManager:
             )
             return [dict(row) for row in cursor.fetchall()]
     
+    def count_events_for_period(self, start_date: str, end_date: str) -> int:
+        """
+        Count events for a specific period without loading them.
+        
+        Args:
+            start_date: Start date in YYYY-MM-DD format
+            end_date: End date in YYYY-MM-DD format
+            
+        Returns:
+            int: Number of events
+        """
+        with self.get_connection() as conn:
+            cursor = conn.execute(
+                """SELECT COUNT(*) FROM journal 
+                   WHERE date(event_time) >= ? AND date(event_time) <= ?""",
+                (start_date, end_date)
+            )
+            return cursor.fetchone()[0]
+    
+    def get_sent_reports(self, since_ts: float) -> List[Tuple[str, float]]:
+        """
+        Get scheduled reports sent after a given time, oldest first.
+        
+        Args:
+            since_ts: Unix timestamp lower bound (exclusive)
+            
+        Returns:
+            List[Tuple[str, float]]: (report_key, ts) pairs
+        """
+        with self.get_connection() as conn:
+            cursor = conn.execute(
+                "SELECT report_key, ts FROM sent_reports WHERE ts > ? ORDER BY ts",
+                (since_ts,)
+            )
+            return [(row[0], row[1]) for row in cursor.fetchall()]
+    
+    def mark_report_sent(self, report_key: str, ts: float, expire_before: float) -> None:
+        """
+        Record a sent scheduled report and drop records older than expire_before.
+        
+        Args:
+            report_key: Report key (type and period)
+            ts: Unix timestamp of the send
+            expire_before: Records with ts below this are deleted
+        """
+        with self.get_connection() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO sent_reports (report_key, ts) VALUES (?, ?)",
+                (report_key, ts)
+            )
+            conn.execute("DELETE FROM sent_reports WHERE ts < ?", (expire_before,))
+            conn.commit()
+    
     def get_retention_stats(self, retention_days: int, check_date: str) -> Dict[str, Any]:
         """
         Get retention statistics for a specific period.
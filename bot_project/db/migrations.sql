@@ -47,9 +47,23 @@ CREATE TABLE IF NOT EXISTS retention_checks (
   UNIQUE(journal_id, check_date)
 );
 
+-- sent_reports: scheduled reports already delivered (so a restart doesn't resend them)
+CREATE TABLE IF NOT EXISTS sent_reports (
+  report_key TEXT PRIMARY KEY,     -- e.g. 'daily_2024-01-31', 'weekly_2024-W05', 'monthly_2024-01'
+  ts REAL NOT NULL                 -- unix timestamp of the send
+);
+
 -- Indexes for better performance
 CREATE INDEX IF NOT EXISTS idx_journal_event_time ON journal(event_time);
 CREATE INDEX IF NOT EXISTS idx_journal_tg_user_id ON journal(tg_user_id);
 CREATE INDEX IF NOT EXISTS idx_journal_event_type ON journal(event_type);
+-- "is there a later unsubscribe for this user" anti-joins and per-inviter counts
+CREATE INDEX IF NOT EXISTS idx_journal_user_type_time ON journal(tg_user_id, event_type, event_time);
+CREATE INDEX IF NOT EXISTS idx_journal_inviter_event ON journal(inviter_id, event_type);
+-- user history newest first (find_user)
+CREATE INDEX IF NOT EXISTS idx_journal_user_time ON journal(tg_user_id, event_time);
+-- поиск пользователя по @username (find_user); tg_user_id в users уже UNIQUE
+CREATE INDEX IF NOT EXISTS idx_users_username ON users(username);
+CREATE INDEX IF NOT EXISTS idx_journal_username ON journal(username);
 CREATE INDEX IF NOT EXISTS idx_retention_checks_journal_id ON retention_checks(journal_id);
 CREATE INDEX IF NOT EXISTS idx_retention_checks_check_date ON retention_checks(check_date);
\ No newline at end of file
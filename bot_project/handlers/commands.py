@@ -314,7 +314,7 @@ async def handle_status(message: Message):
 ⏰ **Планировщик:** {scheduler_status}
 
 ⏰ **Время сервера:** {format_datetime_for_report(now)}
-🌍 **Часовой пояс:** Москва (UTC+3)
+🌍 **Часовой пояс:** Алматы (Asia/Almaty)
 
 💡 **Версия:** 1.0.0
 🤖 **Бот ID:** {message.bot.id}
@@ -665,7 +665,7 @@ async def _handle_schedule_status(message: Message) -> None:
 🕒 **Статус планировщика отчётов:**
 
 📊 **Состояние:** {'✅ Включён' if config.enabled else '❌ Выключен'}
-⏰ **Время отправки:** {config.report_time.strftime('%H:%M')} (МСК)
+⏰ **Время отправки:** {config.report_time.strftime('%H:%M')} (Алматы)
 📨 **Целевые чаты:** {len(config.target_chats)} шт.
 📋 **Типы отчётов:** {', '.join(config.report_types)}
 🔄 **Запущен:** {'✅ Да' if scheduler.running else '❌ Нет'}
@@ -692,7 +692,7 @@ async def _handle_schedule_config(message: Message, args: List[str]) -> None:
             config_text = f"""
 ⚙️ **Текущая конфигурация:**
 
-⏰ **Время:** {config.report_time.strftime('%H:%M')} (МСК)
+⏰ **Время:** {config.report_time.strftime('%H:%M')} (Алматы)
 📨 **Чаты:** {', '.join(map(str, config.target_chats)) if config.target_chats else 'Не настроены'}
 📋 **Типы:** {', '.join(config.report_types)}
 
@@ -733,7 +733,7 @@ async def _handle_schedule_config(message: Message, args: List[str]) -> None:
         
         await message.reply(
             f"✅ Планировщик настроен:\n"
-            f"⏰ Время: {report_time.strftime('%H:%M')} (МСК)\n"
+            f"⏰ Время: {report_time.strftime('%H:%M')} (Алматы)\n"
             f"📨 Чаты: {', '.join(map(str, target_chats))}",
             parse_mode="Markdown"
         )
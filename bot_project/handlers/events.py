@@ -141,8 +141,8 @@ async def handle_chat_member_update(chat_member: ChatMemberUpdated):
         
         # Добавляем событие в Excel файл согласно ТЗ
         try:
-            from reports.subscribers_database_manager import SubscribersDatabaseManager
-            excel_manager = SubscribersDatabaseManager(db)
+            from reports.subscribers_database_manager import get_subscribers_database_manager
+            excel_manager = get_subscribers_database_manager(db)
             
             # Получаем имя пригласителя
             inviter_name = "Не указан"
@@ -162,9 +162,9 @@ async def handle_chat_member_update(chat_member: ChatMemberUpdated):
                 'status': new_status.value if hasattr(new_status, 'value') else str(new_status)
             }
             
-            # Добавляем в единый Excel файл subscribers_database.xlsx
+            # Добавляем в единый Excel файл subscribers_database.xlsx (пачками)
             excel_manager.add_history_event(excel_event_data)
-            logger.info(f"📊 [Events] Added to Excel: {event_type} for user {user.id}")
+            logger.info(f"📊 [Events] Queued for Excel: {event_type} for user {user.id}")
             
         except Exception as excel_error:
             # Не прерываем основной поток если Excel дает ошибку
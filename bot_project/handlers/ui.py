@@ -5,6 +5,7 @@ UI модуль с inline клавиатурами для Telegram бота.
 Реализует полное меню согласно ТЗ с правами доступа и callback-обработчиками.
 """
 
+import asyncio
 import logging
 from typing import Dict, List, Optional, Any
 from datetime import datetime
@@ -296,7 +297,7 @@ async def handle_list_invites(callback: CallbackQuery, **kwargs):
         return
     
     try:
-        invites = get_invites()
+        invites = get_invites(limit=15)  # Ограничиваем до 15 ссылок
         
         if not invites:
             text = "📝 **Список пригласительных ссылок**\n\nСписок пуст. Создайте первую ссылку!"
@@ -310,7 +311,7 @@ async def handle_list_invites(callback: CallbackQuery, **kwargs):
         
         # Показываем каждую ссылку отдельно с кнопкой удаления
         buttons = []
-        for i, invite in enumerate(invites[:15], 1):  # Ограничиваем до 15 ссылок
+        for i, invite in enumerate(invites, 1):
             name = invite['name']
             total = invite.get('total_invited', 0)
             active = invite.get('active_now', 0)
@@ -375,7 +376,7 @@ async def handle_reports(callback: CallbackQuery, **kwargs):
             # Полный Excel отчет
             await callback.answer("📊 Генерирую Excel отчет...")
             
-            file_path = export_excel("full")
+            file_path = await asyncio.to_thread(export_excel, "full")
             if not file_path or not Path(file_path).exists():
                 await callback.message.answer("❌ Ошибка при создании отчета")
                 return
@@ -624,7 +625,7 @@ async def handle_export_excel(callback: CallbackQuery, **kwargs):
     try:
         await callback.answer("📊 Генерирую Excel файл...")
         
-        file_path = export_excel("full")
+        file_path = await asyncio.to_thread(export_excel, "full")
         if not file_path or not Path(file_path).exists():
             await callback.message.answer("❌ Ошибка при создании файла")
             return
@@ -261,20 +261,18 @@ class BaseReportTemplate:
             # Chart creation failed, continue without chart
     
     def _auto_adjust_columns(self, ws) -> None:
-        """Auto-adjust column widths based on content."""
-        for column in ws.columns:
-            max_length = 0
-            column_letter = get_column_letter(column[0].column)
-            
-            for cell in column:
-                try:
-                    if len(str(cell.value)) > max_length:
-                        max_length = len(str(cell.value))
-                except:
-                    pass
-            
+        """Auto-adjust column widths based on content (single row-wise pass over the sheet)."""
+        widths = [0] * ws.max_column
+        for row in ws.iter_rows(values_only=True):
+            for i, value in enumerate(row):
+                if value is not None:
+                    length = len(value) if isinstance(value, str) else len(str(value))
+                    if length > widths[i]:
+                        widths[i] = length
+        
+        for col_idx, max_length in enumerate(widths, 1):
             adjusted_width = min(max_length + 2, 50)  # Cap at 50 characters
-            ws.column_dimensions[column_letter].width = adjusted_width
+            ws.column_dimensions[get_column_letter(col_idx)].width = adjusted_width
 
 
 class DailyReportTemplate(BaseReportTemplate):
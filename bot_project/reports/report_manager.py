@@ -21,13 +21,29 @@ from openpyxl.utils.dataframe import dataframe_to_rows
 from db.db import DatabaseManager
 from utils.time_utils import (
     get_almaty_now, get_today_date_str, get_date_n_days_ago,
-    format_datetime_for_report, get_week_start_date, get_month_start_date,
-    format_time_period_ru
+    format_datetime_for_report, get_week_start_date_as_date,
+    get_month_start_date, format_time_period_ru
 )
 from utils.logging_conf import log_report_generation
+from .excel_templates import (
+    DailyReportTemplate, WeeklyReportTemplate, MonthlyReportTemplate, RetentionReportTemplate
+)
 
 logger = logging.getLogger(__name__)
 
+# Header styles shared by all exported sheets
+_HEADER_FONT = Font(bold=True)
+_HEADER_FILL = PatternFill(start_color="CCCCCC", end_color="CCCCCC", fill_type="solid")
+
+# Excel template classes by report type. Templates keep the workbook being
+# built on the instance, so a fresh instance is created for every report.
+_TEMPLATES = {
+    'daily': DailyReportTemplate,
+    'weekly': WeeklyReportTemplate,
+    'monthly': MonthlyReportTemplate,
+    'retention': RetentionReportTemplate,
+}
+
 
 class ReportManager:
     """
@@ -75,6 +91,7 @@ class ReportManager:
             retention_14d = self._get_retention_for_date(target_date, 14)
             retention_30d = self._get_retention_for_date(target_date, 30)
             
+            now = get_almaty_now()
             report_data = {
                 'date': target_date,
                 'stats': daily_stats,
@@ -84,11 +101,11 @@ class ReportManager:
                     '14_days': retention_14d,
                     '30_days': retention_30d
                 },
-                'generated_at': get_almaty_now().isoformat()
+                'generated_at': now.isoformat()
             }
             
             # Generate Excel file
-            excel_path = self._generate_daily_excel(report_data)
+            excel_path = self._generate_daily_excel(report_data, now.strftime("%Y%m%d_%H%M%S"))
             report_data['excel_file'] = str(excel_path)
             
             log_report_generation("daily", target_date, "completed", 
@@ -117,8 +134,9 @@ class ReportManager:
             days_since_monday = today.weekday()
             target_date = (today - timedelta(days=days_since_monday + 7)).isoformat()
         
-        week_start = get_week_start_date(target_date)
-        week_end = (date.fromisoformat(week_start) + timedelta(days=6)).isoformat()
+        week_start_date = get_week_start_date_as_date(target_date)
+        week_start = week_start_date.isoformat()
+        week_end = (week_start_date + timedelta(days=6)).isoformat()
         
         log_report_generation("weekly", f"{week_start} to {week_end}", "started")
         
@@ -131,7 +149,7 @@ class ReportManager:
             
             # Get daily breakdown
             daily_breakdown = []
-            current_date = date.fromisoformat(week_start)
+            current_date = week_start_date
             for i in range(7):
                 day_str = current_date.isoformat()
                 day_stats = self.db.get_daily_stats(day_str)
@@ -142,17 +160,18 @@ class ReportManager:
                 })
                 current_date += timedelta(days=1)
             
+            now = get_almaty_now()
             report_data = {
                 'week_start': week_start,
                 'week_end': week_end,
                 'stats': weekly_stats,
                 'daily_breakdown': daily_breakdown,
                 'events': events,
-                'generated_at': get_almaty_now().isoformat()
+                'generated_at': now.isoformat()
             }
             
             # Generate Excel file
-            excel_path = self._generate_weekly_excel(report_data)
+            excel_path = self._generate_weekly_excel(report_data, now.strftime("%Y%m%d_%H%M%S"))
             report_data['excel_file'] = str(excel_path)
             
             log_report_generation("weekly", f"{week_start} to {week_end}", "completed",
@@ -195,8 +214,8 @@ class ReportManager:
             # Get monthly statistics
             monthly_stats = self.db.get_monthly_stats(month_start)
             
-            # Get events for the month
-            events = self.db.get_events_for_period(month_start, month_end)
+            # Monthly template has no events sheet - only the count is needed
+            events_count = self.db.count_events_for_period(month_start, month_end)
             
             # Get weekly breakdown
             weekly_breakdown = self._get_weekly_breakdown_for_month(month_start, month_end)
@@ -204,22 +223,23 @@ class ReportManager:
             # Get retention analysis for the month
             retention_analysis = self._get_monthly_retention_analysis(month_start, month_end)
             
+            now = get_almaty_now()
             report_data = {
                 'month_start': month_start,
                 'month_end': month_end,
                 'stats': monthly_stats,
                 'weekly_breakdown': weekly_breakdown,
                 'retention_analysis': retention_analysis,
-                'events': events,
-                'generated_at': get_almaty_now().isoformat()
+                'events_count': events_count,
+                'generated_at': now.isoformat()
             }
             
             # Generate Excel file
-            excel_path = self._generate_monthly_excel(report_data)
+            excel_path = self._generate_monthly_excel(report_data, now.strftime("%Y%m%d_%H%M%S"))
             report_data['excel_file'] = str(excel_path)
             
             log_report_generation("monthly", f"{month_start} to {month_end}", "completed",
-                                  events_count=len(events), excel_file=excel_path)
+                                  events_count=events_count, excel_file=excel_path)
             
             return report_data
             
@@ -254,17 +274,18 @@ class ReportManager:
             # Get historical retention trends
             retention_trends = self._get_retention_trends(retention_days, target_date, 30)  # Last 30 days
             
+            now = get_almaty_now()
             report_data = {
                 'retention_days': retention_days,
                 'target_date': target_date,
                 'stats': retention_stats,
                 'details': retention_details,
                 'trends': retention_trends,
-                'generated_at': get_almaty_now().isoformat()
+                'generated_at': now.isoformat()
             }
             
             # Generate Excel file
-            excel_path = self._generate_retention_excel(report_data)
+            excel_path = self._generate_retention_excel(report_data, now.strftime("%Y%m%d_%H%M%S"))
             report_data['excel_file'] = str(excel_path)
             
             log_report_generation("retention", f"{retention_days}d from {target_date}", "completed",
@@ -293,7 +314,8 @@ class ReportManager:
             user_stats = self.db.get_user_stats_summary()
             
             # Generate timestamp for filename
-            timestamp = get_almaty_now().strftime("%Y%m%d_%H%M%S")
+            now = get_almaty_now()
+            timestamp = now.strftime("%Y%m%d_%H%M%S")
             filename = f"full_database_export_{timestamp}.xlsx"
             file_path = self.reports_dir / filename
             
@@ -323,7 +345,7 @@ class ReportManager:
             if not sheets_added:
                 ws = wb.create_sheet("No_Data")
                 ws['A1'] = "Нет данных для экспорта"
-                ws['A2'] = f"Время создания: {get_almaty_now().strftime('%Y-%m-%d %H:%M:%S')}"
+                ws['A2'] = f"Время создания: {now.strftime('%Y-%m-%d %H:%M:%S')}"
             
             # Remove default sheet only if we added other sheets
             if active is not None and sheets_added:
@@ -379,13 +401,11 @@ class ReportManager:
         end_date = date.fromisoformat(month_end)
         
         while current_date <= end_date:
-            week_start = get_week_start_date(current_date.isoformat())
-            week_end_date = date.fromisoformat(week_start) + timedelta(days=6)
-            
+            week_start_date = get_week_start_date_as_date(current_date)
             # Don't go beyond month end
-            if week_end_date > end_date:
-                week_end_date = end_date
+            week_end_date = min(week_start_date + timedelta(days=6), end_date)
             
+            week_start = week_start_date.isoformat()
             week_end = week_end_date.isoformat()
             
             try:
@@ -399,7 +419,7 @@ class ReportManager:
                 logger.warning(f"Failed to get weekly stats for {week_start}: {e}")
             
             # Move to next week
-            current_date = date.fromisoformat(week_start) + timedelta(days=7)
+            current_date = week_start_date + timedelta(days=7)
         
         return weekly_breakdown
     
@@ -441,27 +461,20 @@ class ReportManager:
             List of detailed retention records
         """
         try:
-            # Get subscriptions that need retention check
-            subscriptions = self.db.get_subscriptions_for_retention_check(retention_days, target_date)
-            
-            detailed_data = []
-            for subscription in subscriptions:
-                retention_result = self.db.check_user_retention(
-                    subscription['id'], 
-                    subscription['tg_user_id'], 
-                    subscription['event_time']
-                )
-                
-                detailed_data.append({
-                    'journal_id': subscription['id'],
-                    'tg_user_id': subscription['tg_user_id'],
-                    'username': subscription.get('username'),
-                    'subscription_date': subscription['event_time'],
-                    'retention_result': retention_result,
-                    'inviter_id': subscription.get('inviter_id')
-                })
+            # Get subscriptions that need retention check with retention already resolved
+            subscriptions = self.db.get_subscriptions_with_retention(retention_days, target_date)
+            if not subscriptions:
+                return []
             
-            return detailed_data
+            df = pd.DataFrame(subscriptions)
+            df['retention_result'] = df['not_retained'].map({0: 'retained', 1: 'not_retained'})
+            df = df.rename(columns={'id': 'journal_id', 'event_time': 'subscription_date'})
+            df = df[['journal_id', 'tg_user_id', 'username', 'subscription_date',
+                     'retention_result', 'inviter_id']]
+            
+            # Keep None instead of NaN for missing username/inviter_id
+            df = df.astype(object).where(df.notna(), None)
+            return df.to_dict('records')
             
         except Exception as e:
             logger.warning(f"Failed to get detailed retention analysis: {e}")
@@ -495,48 +508,36 @@ class ReportManager:
         
         return list(reversed(trends))  # Oldest first
     
-    def _generate_daily_excel(self, report_data: Dict[str, Any]) -> Path:
+    def _generate_daily_excel(self, report_data: Dict[str, Any], timestamp: str) -> Path:
         """Generate Excel file for daily report."""
-        from .excel_templates import DailyReportTemplate
-        
-        template = DailyReportTemplate()
-        timestamp = get_almaty_now().strftime("%Y%m%d_%H%M%S")
+        template = _TEMPLATES['daily']()
         filename = f"daily_report_{report_data['date']}_{timestamp}.xlsx"
         file_path = self.reports_dir / filename
         
         template.generate(report_data, file_path)
         return file_path
     
-    def _generate_weekly_excel(self, report_data: Dict[str, Any]) -> Path:
+    def _generate_weekly_excel(self, report_data: Dict[str, Any], timestamp: str) -> Path:
         """Generate Excel file for weekly report."""
-        from .excel_templates import WeeklyReportTemplate
-        
-        template = WeeklyReportTemplate()
-        timestamp = get_almaty_now().strftime("%Y%m%d_%H%M%S")
+        template = _TEMPLATES['weekly']()
         filename = f"weekly_report_{report_data['week_start']}_to_{report_data['week_end']}_{timestamp}.xlsx"
         file_path = self.reports_dir / filename
         
         template.generate(report_data, file_path)
         return file_path
     
-    def _generate_monthly_excel(self, report_data: Dict[str, Any]) -> Path:
+    def _generate_monthly_excel(self, report_data: Dict[str, Any], timestamp: str) -> Path:
         """Generate Excel file for monthly report."""
-        from .excel_templates import MonthlyReportTemplate
-        
-        template = MonthlyReportTemplate()
-        timestamp = get_almaty_now().strftime("%Y%m%d_%H%M%S")
+        template = _TEMPLATES['monthly']()
         filename = f"monthly_report_{report_data['month_start']}_to_{report_data['month_end']}_{timestamp}.xlsx"
         file_path = self.reports_dir / filename
         
         template.generate(report_data, file_path)
         return file_path
     
-    def _generate_retention_excel(self, report_data: Dict[str, Any]) -> Path:
+    def _generate_retention_excel(self, report_data: Dict[str, Any], timestamp: str) -> Path:
         """Generate Excel file for retention report."""
-        from .excel_templates import RetentionReportTemplate
-        
-        template = RetentionReportTemplate()
-        timestamp = get_almaty_now().strftime("%Y%m%d_%H%M%S")
+        template = _TEMPLATES['retention']()
         filename = f"retention_report_{report_data['retention_days']}d_{report_data['target_date']}_{timestamp}.xlsx"
         file_path = self.reports_dir / filename
         
@@ -552,6 +553,10 @@ class ReportManager:
             df: DataFrame to add
             sheet_name: Name of the sheet
         """
+        # Don't emit empty sheets
+        if df is None or df.empty:
+            return
+        
         ws = wb.create_sheet(title=sheet_name)
         
         # Add DataFrame to worksheet
@@ -561,8 +566,8 @@ class ReportManager:
         # Style the header row
         if ws.max_row > 0:
             for cell in ws[1]:
-                cell.font = Font(bold=True)
-                cell.fill = PatternFill(start_color="CCCCCC", end_color="CCCCCC", fill_type="solid")
+                cell.font = _HEADER_FONT
+                cell.fill = _HEADER_FILL
     
     def get_report_summary(self, days_back: int = 30) -> Dict[str, Any]:
         """
@@ -627,17 +632,21 @@ class ReportManager:
             int: Number of files deleted
         """
         try:
-            cutoff_time = datetime.now() - timedelta(days=days_to_keep)
+            cutoff = (datetime.now() - timedelta(days=days_to_keep)).timestamp()
             deleted_count = 0
             
-            for file_path in self.reports_dir.glob("*.xlsx"):
-                if file_path.stat().st_mtime < cutoff_time.timestamp():
-                    try:
-                        file_path.unlink()
-                        deleted_count += 1
-                        logger.info(f"Deleted old report: {file_path}")
-                    except Exception as e:
-                        logger.warning(f"Failed to delete {file_path}: {e}")
+            # DirEntry caches stat() results, so each file is stat'ed only once
+            with os.scandir(self.reports_dir) as entries:
+                for entry in entries:
+                    if not entry.name.endswith('.xlsx') or not entry.is_file():
+                        continue
+                    if entry.stat().st_mtime < cutoff:
+                        try:
+                            os.unlink(entry.path)
+                            deleted_count += 1
+                            logger.info(f"Deleted old report: {entry.path}")
+                        except Exception as e:
+                            logger.warning(f"Failed to delete {entry.path}: {e}")
             
             logger.info(f"Cleanup completed: {deleted_count} files deleted")
             return deleted_count
@@ -12,8 +12,12 @@
 
 import asyncio
 import logging
+import random
+from collections import defaultdict, OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, time, timedelta
-from typing import Dict, List, Optional, Set, Any, Union, TYPE_CHECKING
+from time import monotonic, time as wall_time
+from typing import Dict, List, Optional, Set, Tuple, Any, Union, Callable, Awaitable, Iterable, TYPE_CHECKING
 from dataclasses import dataclass, field
 from pathlib import Path
 
@@ -29,28 +33,150 @@ if TYPE_CHECKING:
 # Runtime imports
 try:
     from aiogram import Bot
-    from aiogram.types import FSInputFile
+    from aiogram.types import FSInputFile, BufferedInputFile
+    from aiogram.exceptions import TelegramRetryAfter, TelegramForbiddenError
     AIOGRAM_AVAILABLE = True
 except ImportError:
     # Fallback for when aiogram is not available
     AIOGRAM_AVAILABLE = False
     Bot = Any
     FSInputFile = Any
+    BufferedInputFile = Any
+    
+    class TelegramRetryAfter(Exception):
+        retry_after: int = 0
+    
+    class TelegramForbiddenError(Exception):
+        pass
 
 from db.db import DatabaseManager
-from utils.time_utils import get_almaty_now, format_datetime_for_report
+from utils.time_utils import ALMATY_TZ, get_almaty_now, format_datetime_for_report
 from utils.logging_conf import get_logger
 from reports.report_manager import ReportManager
 from reports.unified_report_manager import UnifiedReportManager
 
 logger = get_logger(__name__)
 
+# Лимиты Telegram Bot API на отправку сообщений
+GLOBAL_SEND_RATE = 30      # сообщений в секунду на бота
+PER_CHAT_SEND_RATE = 20    # сообщений в минуту в один чат
+
+# Количество попыток отправки в чат при ответе 429 (Too Many Requests)
+SEND_RETRY_ATTEMPTS = 3
+
+# Файлы меньше этого размера читаются в память один раз на всю рассылку
+MAX_BUFFERED_DOCUMENT_SIZE = 20 * 1024 * 1024
+
+# Сколько хранить отметку об отправленном отчёте (секунды) - покрывает месячный период
+SENT_REPORT_TTL = 40 * 24 * 60 * 60
+
+# Единая задача планировщика: срабатывает ежедневно и отправляет отчёты, срок которых наступил
+REPORTS_JOB_ID = 'scheduled_reports'
+
+# Типы отчётов: когда отчёт должен отправляться и формат ключа для защиты от повторной отправки
+REPORT_SCHEDULE: Dict[str, Dict[str, Any]] = {
+    'daily': {
+        'due': lambda now: True,
+        'key_format': '%Y-%m-%d',
+    },
+    'weekly': {
+        'due': lambda now: now.weekday() == 0,  # Monday
+        'key_format': '%Y-W%W',
+    },
+    'monthly': {
+        'due': lambda now: now.day == 1,  # 1st of month
+        'key_format': '%Y-%m',
+    },
+}
+
+# Крупные рассылки делятся на части, каждая отправляется отдельной задачей планировщика.
+# Интервал между частями держит 100 отправок ниже лимита 30 сообщений/с
+BROADCAST_CHUNK_SIZE = 100
+BROADCAST_CHUNK_INTERVAL = 4  # секунды
+
+# Время жизни сгенерированных отчётов в кэше (секунды)
+REPORT_CACHE_TTL = 24 * 60 * 60
+
+# Максимум одновременно генерируемых отчётов (pandas/openpyxl в отдельных потоках)
+REPORT_WORKERS = 2
+
+
+def _warm_up_report_stack() -> None:
+    """Прогреть ленивые пути pandas/openpyxl: собрать и сохранить в память маленький xlsx."""
+    import io
+    import pandas as pd
+    from openpyxl import Workbook
+    from openpyxl.utils.dataframe import dataframe_to_rows
+    
+    wb = Workbook()
+    ws = wb.active
+    for row in dataframe_to_rows(pd.DataFrame({'warmup': [1]}), index=False, header=True):
+        ws.append(row)
+    wb.save(io.BytesIO())
+
+
+class TokenBucket:
+    """
+    Асинхронный token bucket: не более `rate` операций за `period` секунд.
+    
+    Используется как асинхронный контекстный менеджер:
+        async with bucket:
+            await bot.send_message(...)
+    """
+    
+    def __init__(self, rate: int, period: float = 1.0):
+        self.rate = rate
+        self.period = period
+        self._tokens = float(rate)
+        self._updated = monotonic()
+        self._lock = asyncio.Lock()
+    
+    async def acquire(self) -> None:
+        """Дождаться свободного токена."""
+        async with self._lock:
+            while True:
+                now = monotonic()
+                self._tokens = min(self.rate, self._tokens + (now - self._updated) * self.rate / self.period)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) * self.period / self.rate)
+    
+    async def __aenter__(self) -> 'TokenBucket':
+        await self.acquire()
+        return self
+    
+    async def __aexit__(self, *exc_info) -> None:
+        return None
+
+
+def _first_of_last_month(now: datetime) -> datetime:
+    """Первое число прошлого месяца относительно now."""
+    return (now.replace(day=1) - timedelta(days=1)).replace(day=1)
+
+
+def _last_monday(now: datetime) -> datetime:
+    """Понедельник прошлой недели относительно now."""
+    return now - timedelta(days=now.weekday() + 7)
+
+
+def _period_anchor(now: datetime) -> datetime:
+    """
+    Момент, от которого отсчитываются отчётные периоды задачи по расписанию.
+    
+    Задача во второй половине дня (по умолчанию 23:59) отчитывается за
+    заканчивающийся день, как если бы она сработала сразу после полуночи;
+    задача после полуночи - за вчерашний день.
+    """
+    return now + timedelta(days=1) if now.hour >= 12 else now
+
 
 @dataclass
 class ScheduleConfig:
     """Конфигурация расписания отправки отчётов."""
     report_time: time = field(default_factory=lambda: time(23, 59))  # 23:59 по Алматы
-    target_chats: List[int] = field(default_factory=list)  # Список chat_id для отправки
+    target_chats: Set[int] = field(default_factory=set)  # Множество chat_id для отправки
     enabled: bool = True
     report_types: List[str] = field(default_factory=lambda: ['daily'])  # daily, weekly, monthly
 
@@ -67,6 +193,9 @@ class ReportScheduler:
     - Алматинское время
     """
     
+    # Единый часовой пояс для расписания и ключей отправленных отчётов
+    TZ = ALMATY_TZ
+    
     def __init__(self, bot: Optional['AiogramBot'], db_manager: DatabaseManager, 
                  reports_dir: Optional[str] = None):
         """
@@ -84,29 +213,54 @@ class ReportScheduler:
         # Initialize unified report manager for TZ-compliant reports
         self.unified_report_manager = UnifiedReportManager(db_manager, reports_dir_str)
         self.config = ScheduleConfig()
-        self.scheduler = AsyncIOScheduler(timezone='Europe/Moscow')
+        self.scheduler = AsyncIOScheduler(timezone=self.TZ)
         self.running = False
-        self._sent_today: Set[str] = set()  # Отслеживание отправленных отчётов
+        # Отслеживание отправленных отчётов: ключ -> время истечения (monotonic)
+        self._sent_today: 'OrderedDict[str, float]' = OrderedDict()
+        # Ключи отправленных отчётов за текущий день (пересчитываются при смене даты)
+        self._cached_keys: Dict[str, str] = {}
+        self._cached_keys_day: str = ''
+        # Ограничение скорости рассылки (глобально и по каждому чату)
+        self._global_bucket = TokenBucket(GLOBAL_SEND_RATE, 1)
+        self._chat_buckets: Dict[int, TokenBucket] = defaultdict(lambda: TokenBucket(PER_CHAT_SEND_RATE, 60))
+        self._broadcast_chunk_size: int = BROADCAST_CHUNK_SIZE
+        # Кэш сгенерированных отчётов: (тип, дата) -> (время создания, report_data)
+        self._report_cache: Dict[Tuple[str, str], Tuple[float, Dict[str, Any]]] = {}
+        self._report_locks: Dict[Tuple[str, str], asyncio.Lock] = defaultdict(asyncio.Lock)
+        # Кэш file_id загруженных в Telegram файлов: (путь, mtime) -> file_id
+        self._file_id_cache: Dict[Tuple[str, float], str] = {}
+        # Пул потоков для генерации Excel, чтобы не блокировать event loop
+        self._exec: Optional[ThreadPoolExecutor] = self._make_executor()
+        # Кэш триггера: (время, CronTrigger) и время, на которое поставлена задача
+        self._trigger: Optional[Tuple[time, CronTrigger]] = None
+        self._scheduled_time: Optional[time] = None
+        # Id задач расписания (без обращения к jobstore в get_status) и подпись времени отправки
+        self._active_job_ids: Set[str] = set()
+        self._prewarm_task: Optional[asyncio.Task] = None
+        self._report_time_label: Tuple[Optional[time], str] = (None, '')
+        self._build_trigger(self.config.report_time)
         
         logger.info("🕒 [Scheduler] Initialized with default config")
     
     async def configure(self, report_time: Optional[time] = None,
-                        target_chats: Optional[List[int]] = None,
+                        target_chats: Optional[Iterable[int]] = None,
                         enabled: Optional[bool] = None,
                         report_types: Optional[List[str]] = None) -> None:
         """
         Настройка планировщика.
         
         Args:
-            report_time: Время отправки отчётов (по Москве)
-            target_chats: Список chat_id для отправки
+            report_time: Время отправки отчётов (по Алматы)
+            target_chats: Список (или множество) chat_id для отправки
             enabled: Включён ли планировщик
             report_types: Типы отчётов для отправки
         """
+        previous = (self.config.report_time, list(self.config.report_types), self.config.enabled)
+        
         if report_time is not None:
             self.config.report_time = report_time
         if target_chats is not None:
-            self.config.target_chats = target_chats
+            self.config.target_chats = set(target_chats)
         if enabled is not None:
             self.config.enabled = enabled
         if report_types is not None:
@@ -120,20 +274,21 @@ class ReportScheduler:
         logger.info(f"🔧 [Scheduler] Configuration updated: time={self.config.report_time}, "
                    f"chats={len(self.config.target_chats)}, enabled={self.config.enabled}")
         
-        # Перенастроить расписание если планировщик запущен
-        if self.running:
+        # Перенастроить расписание если планировщик запущен и изменилось что-то кроме чатов
+        current = (self.config.report_time, list(self.config.report_types), self.config.enabled)
+        if self.running and current != previous:
             await self._setup_schedule()
     
     def add_target_chat(self, chat_id: int) -> None:
         """Добавить чат в список для отправки отчётов."""
         if chat_id not in self.config.target_chats:
-            self.config.target_chats.append(chat_id)
+            self.config.target_chats.add(chat_id)
             logger.info(f"📝 [Scheduler] Added target chat: {chat_id}")
     
     def remove_target_chat(self, chat_id: int) -> None:
         """Удалить чат из списка для отправки отчётов."""
         if chat_id in self.config.target_chats:
-            self.config.target_chats.remove(chat_id)
+            self.config.target_chats.discard(chat_id)
             logger.info(f"🗑️ [Scheduler] Removed target chat: {chat_id}")
     
     async def start(self) -> None:
@@ -155,236 +310,396 @@ class ReportScheduler:
             return
         
         self.running = True
-        await self._setup_schedule()
+        # Пул генерации закрывается в stop() - при повторном запуске создаём новый
+        if self._exec is None:
+            self._exec = self._make_executor()
+        # Сначала запускаем APScheduler, чтобы _setup_schedule видел реальные задачи в jobstore
         self.scheduler.start()
+        await self._load_sent_reports()
+        await self._setup_schedule()
+        # Прогрев генерации отчётов в фоне, чтобы первое срабатывание не платило за холодный старт
+        self._prewarm_task = asyncio.create_task(self._prewarm())
         
         logger.info(f"🚀 [Scheduler] Started with {len(self.config.target_chats)} target chats")
     
+    async def _prewarm(self) -> None:
+        """Прогреть пул потоков генерации, pandas/openpyxl и соединение с БД."""
+        try:
+            await asyncio.gather(*(self._run_blocking(_warm_up_report_stack) for _ in range(REPORT_WORKERS)))
+            today = get_almaty_now().date().isoformat()
+            await asyncio.to_thread(self.db_manager.count_events_for_period, today, today)
+            logger.info("🔥 [Scheduler] Report generation prewarmed")
+        except Exception as e:
+            logger.warning(f"⚠️ [Scheduler] Prewarm failed: {e}")
+    
     async def stop(self) -> None:
         """Остановить планировщик."""
         if not self.running:
             return
         
         self.running = False
+        if self._prewarm_task is not None and not self._prewarm_task.done():
+            self._prewarm_task.cancel()
         self.scheduler.shutdown(wait=True)
+        self._active_job_ids.clear()
+        self._scheduled_time = None
+        # Не ждём уже идущую генерацию и отменяем ещё не начатую
+        if self._exec is not None:
+            self._exec.shutdown(wait=False, cancel_futures=True)
+            self._exec = None
         
         logger.info("🛑 [Scheduler] Stopped")
     
+    @staticmethod
+    def _make_executor() -> ThreadPoolExecutor:
+        """Создать пул потоков генерации отчётов."""
+        return ThreadPoolExecutor(max_workers=REPORT_WORKERS, thread_name_prefix='report-gen')
+    
+    def _build_trigger(self, report_time: time) -> CronTrigger:
+        """
+        Получить ежедневный CronTrigger (кэшируется до смены времени).
+        
+        Args:
+            report_time: Время отправки
+            
+        Returns:
+            CronTrigger: Триггер задачи
+        """
+        if self._trigger is not None and self._trigger[0] == report_time:
+            return self._trigger[1]
+        
+        trigger = CronTrigger(
+            hour=report_time.hour,
+            minute=report_time.minute,
+            timezone=self.TZ
+        )
+        self._trigger = (report_time, trigger)
+        return trigger
+    
     async def _setup_schedule(self) -> None:
-        """Настроить расписание отправки отчётов."""
-        # Очистить существующие задачи
-        self.scheduler.remove_all_jobs()
+        """
+        Настроить расписание отправки отчётов.
         
+        Все типы отчётов обслуживает одна ежедневная задача; она пересоздаётся
+        только при включении/выключении и переносится только при смене времени.
+        """
         # Очистить старые записи о отправленных отчётах
         self._cleanup_sent_today()
         
-        if not self.config.enabled:
+        report_time = self.config.report_time
+        job = self.scheduler.get_job(REPORTS_JOB_ID)
+        
+        if not (self.config.enabled and self.config.report_types):
+            if job is not None:
+                self.scheduler.remove_job(REPORTS_JOB_ID)
+                self._active_job_ids.discard(REPORTS_JOB_ID)
+                logger.info("🗑️ [Scheduler] Scheduled reports unscheduled")
             return
         
-        # Ежедневные отчёты
-        if 'daily' in self.config.report_types:
+        self._active_job_ids.add(REPORTS_JOB_ID)
+        trigger = self._build_trigger(report_time)
+        if job is None:
             self.scheduler.add_job(
-                self._send_daily_reports,
-                CronTrigger(
-                    hour=self.config.report_time.hour,
-                    minute=self.config.report_time.minute,
-                    timezone='Europe/Moscow'
-                ),
-                id='daily_reports',
+                self._send_all_due_reports,
+                trigger,
+                id=REPORTS_JOB_ID,
                 replace_existing=True,
-                misfire_grace_time=300
+                misfire_grace_time=300,
+                coalesce=True
             )
-            logger.info(f"📅 [Scheduler] Daily reports scheduled for {self.config.report_time}")
+        elif self._scheduled_time != report_time:
+            self.scheduler.reschedule_job(REPORTS_JOB_ID, trigger=trigger)
+        else:
+            return
         
-        # Еженедельные отчёты (понедельник)
-        if 'weekly' in self.config.report_types:
-            self.scheduler.add_job(
-                self._send_weekly_reports,
-                CronTrigger(
-                    day_of_week='mon',  # Monday
-                    hour=self.config.report_time.hour,
-                    minute=self.config.report_time.minute,
-                    timezone='Europe/Moscow'
-                ),
-                id='weekly_reports',
-                replace_existing=True,
-                misfire_grace_time=300
-            )
-            logger.info(f"📊 [Scheduler] Weekly reports scheduled for Monday {self.config.report_time}")
+        self._scheduled_time = report_time
+        # Вечерняя задача закрывает неделю в воскресенье и месяц в его последний день
+        periods = ("weekly on Sunday, monthly on last day of month" if report_time.hour >= 12
+                   else "weekly on Monday, monthly on 1st of month")
+        logger.info(f"📅 [Scheduler] Reports scheduled for {report_time} ({periods})")
+    
+    def _remember_sent(self, report_key: str) -> None:
+        """Отметить отчёт как отправленный в памяти (защита от повторной рассылки в этом процессе)."""
+        self._sent_today[report_key] = monotonic() + SENT_REPORT_TTL
+        self._sent_today.move_to_end(report_key)
+        self._cleanup_sent_today()
+    
+    async def _mark_sent(self, report_key: str) -> None:
+        """Отметить отчёт как отправленный (в памяти и в БД, чтобы пережить перезапуск)."""
+        self._remember_sent(report_key)
         
-        # Месячные отчёты (1 число месяца)
-        if 'monthly' in self.config.report_types:
-            self.scheduler.add_job(
-                self._send_monthly_reports,
-                CronTrigger(
-                    day=1,  # 1st of month
-                    hour=self.config.report_time.hour,
-                    minute=self.config.report_time.minute,
-                    timezone='Europe/Moscow'
-                ),
-                id='monthly_reports',
-                replace_existing=True,
-                misfire_grace_time=300
-            )
-            logger.info(f"📈 [Scheduler] Monthly reports scheduled for 1st of month {self.config.report_time}")
+        now = wall_time()
+        try:
+            await asyncio.to_thread(self.db_manager.mark_report_sent, report_key, now, now - SENT_REPORT_TTL)
+        except Exception as e:
+            logger.warning(f"⚠️ [Scheduler] Failed to persist sent report {report_key}: {e}")
+    
+    async def _load_sent_reports(self) -> None:
+        """Загрузить из БД отчёты, отправленные до перезапуска."""
+        now = wall_time()
+        try:
+            rows = await asyncio.to_thread(self.db_manager.get_sent_reports, now - SENT_REPORT_TTL)
+        except Exception as e:
+            logger.warning(f"⚠️ [Scheduler] Failed to load sent reports: {e}")
+            return
+        
+        # Строки упорядочены по времени отправки - порядок истечения сохраняется
+        mono_now = monotonic()
+        for report_key, ts in rows:
+            if report_key not in self._sent_today:
+                self._sent_today[report_key] = mono_now + (ts + SENT_REPORT_TTL - now)
+        
+        if rows:
+            logger.info(f"📥 [Scheduler] Loaded {len(rows)} sent report records")
     
     def _cleanup_sent_today(self) -> None:
         """Очистить старые записи о отправленных отчётах для предотвращения роста памяти."""
-        current_date = get_almaty_now().strftime('%Y-%m-%d')
-        current_week = get_almaty_now().strftime('%Y-W%W')
-        current_month = get_almaty_now().strftime('%Y-%m')
-        
-        # Оставить только записи за текущий день/неделю/месяц
-        keys_to_keep = {
-            f"daily_{current_date}",
-            f"weekly_{current_week}", 
-            f"monthly_{current_month}"
-        }
-        
-        old_count = len(self._sent_today)
-        self._sent_today = {key for key in self._sent_today if key in keys_to_keep}
+        # Записи упорядочены по времени истечения - удаляем с начала до первой актуальной
+        now = monotonic()
+        cleaned_count = 0
+        while self._sent_today and next(iter(self._sent_today.values())) < now:
+            self._sent_today.popitem(last=False)
+            cleaned_count += 1
         
-        cleaned_count = old_count - len(self._sent_today)
         if cleaned_count > 0:
             logger.info(f"🧹 [Scheduler] Cleaned up {cleaned_count} old sent_today entries")
-    
-    async def _send_daily_reports(self) -> None:
-        """Отправить ежедневные отчёты."""
-        report_key = f"daily_{get_almaty_now().strftime('%Y-%m-%d')}"
         
-        if report_key in self._sent_today:
-            logger.info(f"⏭️ [Scheduler] Daily report already sent today: {report_key}")
-            return
+        self._prune_report_cache()
+    
+    def _prune_report_cache(self) -> None:
+        """Удалить из кэша отчёты старше REPORT_CACHE_TTL."""
+        cutoff = monotonic() - REPORT_CACHE_TTL
+        for key in [key for key, (created_at, _) in self._report_cache.items() if created_at < cutoff]:
+            del self._report_cache[key]
+            self._report_locks.pop(key, None)
+        for key in [key for key in self._file_id_cache if not Path(key[0]).exists()]:
+            del self._file_id_cache[key]
+    
+    async def _cached_generate(self, report_type: str, target_date: Optional[str]) -> Dict[str, Any]:
+        """
+        Сгенерировать отчёт через ReportManager с кэшированием по (тип, дата).
         
-        logger.info("📅 [Scheduler] Generating daily report")
+        Повторные запросы того же отчёта (ручные, тестовые и по расписанию)
+        возвращают уже созданный файл, пока он существует и не старше REPORT_CACHE_TTL.
         
-        try:
-            # Генерация отчёта за вчерашний день с помощью unified system
-            yesterday = get_almaty_now() - timedelta(days=1)
-            target_date = yesterday.strftime("%Y-%m-%d")
-            
-            # Get unified daily report message with download button
-            message_text, download_keyboard = self.unified_report_manager.get_daily_message_with_button(target_date)
-            file_path = self.unified_report_manager.get_excel_file_path()
-            
-            if not file_path:
-                logger.error("❌ [Scheduler] No excel file path in unified report data")
-                return
-            
-            # Отправка во все настроенные чаты с сообщением согласно ТЗ
-            await self._send_unified_daily_reports(
-                message_text=message_text,
-                file_path=file_path,
-                keyboard=download_keyboard
-            )
+        Args:
+            report_type: Тип отчёта (daily, weekly, monthly)
+            target_date: Дата отчёта в формате YYYY-MM-DD (None - по умолчанию ReportManager)
             
-            self._sent_today.add(report_key)
-            logger.info(f"✅ [Scheduler] Daily report sent successfully: {target_date}")
+        Returns:
+            Dict: Данные отчёта от ReportManager
+        """
+        generate = getattr(self.report_manager, f'generate_{report_type}_report')
+        
+        # Дата по умолчанию вычисляется внутри ReportManager - кэшировать нечего
+        if target_date is None:
+            return await self._run_blocking(generate, target_date)
+        
+        self._prune_report_cache()
+        key = (report_type, target_date)
+        
+        async with self._report_locks[key]:
+            cached = self._report_cache.get(key)
+            if cached is not None:
+                excel_file = cached[1].get('excel_file')
+                if excel_file and Path(excel_file).exists():
+                    logger.info(f"♻️ [Scheduler] Using cached {report_type} report for {target_date}")
+                    return cached[1]
             
-        except Exception as e:
-            logger.exception(f"❌ [Scheduler] Failed to send daily report: {e}")
+            report_data = await self._run_blocking(generate, target_date)
+            self._report_cache[key] = (monotonic(), report_data)
+            return report_data
     
-    async def _send_unified_daily_reports(self, message_text: str, file_path: str, 
-                                         keyboard: 'InlineKeyboardMarkup') -> None:
-        """Отправить ежедневные отчёты в формате ТЗ с кнопкой скачивания."""
-        if not self.bot or not AIOGRAM_AVAILABLE:
-            logger.warning("⚠️ [Scheduler] Bot not available for unified daily reports")
-            return
+    async def _run_blocking(self, func: Callable[..., Any], *args: Any) -> Any:
+        """Выполнить блокирующую функцию в пуле потоков генерации отчётов."""
+        if self._exec is None:
+            self._exec = self._make_executor()
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._exec, func, *args)
+    
+    def _keys(self, now: Optional[datetime] = None) -> Dict[str, str]:
+        """
+        Ключи отправленных отчётов за текущий период по типам.
         
-        for chat_id in self.config.target_chats:
-            try:
-                # Send message with keyboard
-                await self.bot.send_message(
-                    chat_id=chat_id,
-                    text=message_text,
-                    reply_markup=keyboard,
-                    parse_mode=None
-                )
-                
-                logger.info(f"📤 [Scheduler] Unified daily report sent to chat {chat_id}")
-                
-            except Exception as e:
-                logger.error(f"❌ [Scheduler] Failed to send unified daily report to chat {chat_id}: {e}")
+        Ключи пересчитываются только при смене даты.
+        """
+        now = now or get_almaty_now()
+        day = now.date().isoformat()
+        if day != self._cached_keys_day:
+            self._cached_keys = {
+                report_type: report_type + '_' + now.strftime(spec['key_format'])
+                for report_type, spec in REPORT_SCHEDULE.items()
+            }
+            self._cached_keys_day = day
+        return self._cached_keys
     
-    async def _send_weekly_reports(self) -> None:
-        """Отправить еженедельные отчёты."""
-        report_key = f"weekly_{get_almaty_now().strftime('%Y-W%W')}"
+    async def _send_all_due_reports(self) -> None:
+        """
+        Отправить все отчёты, срок которых наступил.
+        
+        Отчёты разных типов генерируются параллельно, а рассылаются по очереди,
+        чтобы не превышать лимиты Telegram.
+        """
+        # Сроки, ключи и периоды считаются от начала следующего дня, если задача
+        # сработала вечером: в 23:59 отправляется отчёт за сегодняшний день
+        now = _period_anchor(get_almaty_now())
         
-        if report_key in self._sent_today:
-            logger.info(f"⏭️ [Scheduler] Weekly report already sent this week: {report_key}")
+        keys = self._keys(now)
+        due: Dict[str, str] = {}
+        for report_type in self.config.report_types:
+            spec = REPORT_SCHEDULE.get(report_type)
+            if spec is None or not spec['due'](now):
+                continue
+            report_key = keys[report_type]
+            if report_key in self._sent_today:
+                logger.info(f"⏭️ [Scheduler] {report_type.title()} report already sent: {report_key}")
+                continue
+            due[report_type] = report_key
+        
+        if not due:
             return
         
-        logger.info("📊 [Scheduler] Generating weekly report")
+        # Некому отправлять - не генерируем Excel впустую
+        if not self.config.target_chats:
+            logger.info(f"⏭️ [Scheduler] No target chats; skipping generation of {', '.join(due.values())}")
+            return
         
-        try:
-            # Отчёт за прошлую неделю
-            now = get_almaty_now()
-            days_since_monday = now.weekday()
-            last_monday = now - timedelta(days=days_since_monday + 7)
-            target_date = last_monday.strftime("%Y-%m-%d")
-            
-            report_data = self.report_manager.generate_weekly_report(target_date)
-            file_path = report_data.get('excel_file')
+        logger.info(f"🗂️ [Scheduler] Generating reports: {', '.join(due)}")
+        results = await asyncio.gather(
+            *(self._generate_one(report_type, now) for report_type in due),
+            return_exceptions=True
+        )
+        
+        for (report_type, report_key), prepared in zip(due.items(), results):
+            if isinstance(prepared, Exception):
+                logger.error(f"❌ [Scheduler] Failed to generate {report_type} report: {prepared}",
+                             exc_info=prepared)
+                continue
             
-            if not file_path:
-                logger.error("❌ [Scheduler] No excel file path in weekly report data")
-                return
-            
-            # Отправка во все настроенные чаты
-            await self._send_report_to_chats(
-                file_path=file_path,
-                caption=f"📊 Еженедельный отчёт с {format_datetime_for_report(last_monday, False)}",
-                report_type="weekly"
-            )
+            try:
+                if report_type == 'daily':
+                    # Отправка во все настроенные чаты с сообщением согласно ТЗ
+                    await self._send_unified_daily_reports(
+                        message_text=prepared['message_text'],
+                        file_path=prepared['file_path'],
+                        keyboard=prepared['keyboard']
+                    )
+                    delivered = True
+                else:
+                    delivered = await self._send_report_to_chats(
+                        file_path=prepared['file_path'],
+                        caption=prepared['caption'],
+                        report_type=report_type,
+                        report_key=report_key
+                    )
+            except Exception as e:
+                logger.exception(f"❌ [Scheduler] Failed to send {report_type} report: {e}")
+                continue
             
-            self._sent_today.add(report_key)
-            logger.info(f"✅ [Scheduler] Weekly report sent successfully: {target_date}")
+            # Если рассылка продолжается отложенными частями, отметку сохранит последняя из них
+            if not delivered:
+                continue
             
-        except Exception as e:
-            logger.exception(f"❌ [Scheduler] Failed to send weekly report: {e}")
+            await self._mark_sent(report_key)
+            logger.info(f"✅ [Scheduler] {report_type.title()} report sent successfully: {prepared['target_date']}")
     
-    async def _send_monthly_reports(self) -> None:
-        """Отправить месячный отчёт."""
-        now = get_almaty_now()
-        report_key = f"monthly_{now.strftime('%Y-%m')}"
-        
-        if report_key in self._sent_today:
-            logger.info(f"⏭️ [Scheduler] Monthly report already sent this month: {report_key}")
-            return
-        
-        logger.info("📈 [Scheduler] Generating monthly report")
+    async def _generate_one(self, report_type: str, now: datetime) -> Dict[str, Any]:
+        """
+        Сгенерировать отчёт для рассылки по расписанию.
         
-        try:
-            # Отчёт за прошлый месяц
-            if now.month == 1:
-                last_month = now.replace(year=now.year - 1, month=12, day=1)
-            else:
-                last_month = now.replace(month=now.month - 1, day=1)
-            
-            target_date = last_month.strftime("%Y-%m-%d")
+        Args:
+            report_type: Тип отчёта (daily, weekly, monthly)
+            now: Начало дня, следующего за отчётным (см. _period_anchor)
             
-            report_data = self.report_manager.generate_monthly_report(target_date)
-            file_path = report_data.get('excel_file')
+        Returns:
+            Dict: Данные для рассылки (target_date, file_path и caption или текст с клавиатурой)
+        """
+        if report_type == 'daily':
+            # Генерация отчёта за завершившийся день с помощью unified system
+            yesterday = now - timedelta(days=1)
+            target_date = yesterday.date().isoformat()
             
-            if not file_path:
-                logger.error("❌ [Scheduler] No excel file path in monthly report data")
-                return
-            
-            # Отправка во все настроенные чаты
-            await self._send_report_to_chats(
-                file_path=file_path,
-                caption=f"📈 Месячный отчёт за {format_datetime_for_report(last_month, False)}",
-                report_type="monthly"
+            message_text, download_keyboard = await self._run_blocking(
+                self.unified_report_manager.get_daily_message_with_button, target_date
             )
+            file_path = self.unified_report_manager.get_excel_file_path()
+            if not file_path:
+                raise ValueError("No excel file path in unified report data")
             
-            self._sent_today.add(report_key)
-            logger.info(f"✅ [Scheduler] Monthly report sent successfully: {target_date}")
+            return {
+                'target_date': target_date,
+                'file_path': file_path,
+                'message_text': message_text,
+                'keyboard': download_keyboard,
+            }
+        
+        if report_type == 'weekly':
+            # Отчёт за прошлую неделю
+            period_start = _last_monday(now)
+            caption = f"📊 Еженедельный отчёт с {format_datetime_for_report(period_start, False)}"
+        else:
+            # Отчёт за прошлый месяц
+            period_start = _first_of_last_month(now)
+            caption = f"📈 Месячный отчёт за {format_datetime_for_report(period_start, False)}"
+        
+        target_date = period_start.date().isoformat()
+        report_data = await self._cached_generate(report_type, target_date)
+        file_path = report_data.get('excel_file')
+        if not file_path:
+            raise ValueError(f"No excel file path in {report_type} report data")
+        
+        return {
+            'target_date': target_date,
+            'file_path': file_path,
+            'caption': caption,
+        }
+    
+    async def _send_unified_daily_reports(self, message_text: str, file_path: str, 
+                                         keyboard: 'InlineKeyboardMarkup') -> None:
+        """Отправить ежедневные отчёты в формате ТЗ с кнопкой скачивания."""
+        if not self.bot or not AIOGRAM_AVAILABLE:
+            logger.warning("⚠️ [Scheduler] Bot not available for unified daily reports")
+            return
+        
+        async def _send_one(chat_id: int) -> None:
+            # Send message with keyboard
+            await self.bot.send_message(
+                chat_id=chat_id,
+                text=message_text,
+                reply_markup=keyboard,
+                parse_mode=None
+            )
+            logger.info(f"📤 [Scheduler] Unified daily report sent to chat {chat_id}")
+        
+        results = await self._send_to_chats(_send_one)
+        self._log_send_errors(results, "unified daily report")
+    
+    async def _send_to_chats(self, send_one: Callable[[int], Awaitable[Any]],
+                             chat_ids: Optional[Iterable[int]] = None) -> Dict[int, Any]:
+        """
+        Параллельно выполнить отправку во все настроенные чаты с учётом лимитов Telegram.
+        
+        Args:
+            send_one: Корутина отправки в один чат (принимает chat_id)
+            chat_ids: Чаты для отправки (по умолчанию - все настроенные)
             
-        except Exception as e:
-            logger.exception(f"❌ [Scheduler] Failed to send monthly report: {e}")
+        Returns:
+            Dict: chat_id -> результат отправки (исключения возвращаются как значения)
+        """
+        chat_ids = list(self.config.target_chats if chat_ids is None else chat_ids)
+        
+        async def _limited(chat_id: int) -> Any:
+            async with self._chat_buckets[chat_id], self._global_bucket:
+                return await self._send_with_retry(lambda: send_one(chat_id), chat_id)
+        
+        results = await asyncio.gather(
+            *(_limited(chat_id) for chat_id in chat_ids),
+            return_exceptions=True
+        )
+        return dict(zip(chat_ids, results))
     
     async def _send_report_to_chats(self, file_path: str, caption: str, 
-                                   report_type: str) -> None:
+                                   report_type: str, report_key: Optional[str] = None) -> bool:
         """
         Отправить отчёт во все настроенные чаты.
         
@@ -392,42 +707,198 @@ class ReportScheduler:
             file_path: Путь к файлу отчёта
             caption: Подпись к файлу
             report_type: Тип отчёта для логирования
+            report_key: Ключ отправленного отчёта; если рассылка разбита на отложенные
+                части, его сохраняет в БД последняя часть
+            
+        Returns:
+            bool: True, если рассылка завершена в этом вызове
         """
         if not self.config.target_chats:
             logger.warning(f"⚠️ [Scheduler] No target chats for {report_type} report")
-            return
+            return False
         
         if not AIOGRAM_AVAILABLE or self.bot is None:
             logger.error(f"❌ [Scheduler] Aiogram not available or bot is None")
-            return
+            return False
         
+        file_path_obj = Path(file_path)
+        if not file_path_obj.exists():
+            logger.error(f"❌ [Scheduler] Report file not found: {file_path}")
+            return False
+        
+        if FSInputFile is Any:
+            logger.error("❌ [Scheduler] FSInputFile not available")
+            return False
+        
+        chat_ids = list(self.config.target_chats)
+        chunk_size = self._broadcast_chunk_size
+        chunks = [chat_ids[i:i + chunk_size] for i in range(0, len(chat_ids), chunk_size)]
+        
+        # Первая часть отправляется сразу (с загрузкой файла), остальные - отдельными задачами
+        await self._send_chunk(file_path, caption, report_type, chunks[0])
+        
+        if len(chunks) == 1:
+            return True
+        
+        if not self.running:
+            for chunk in chunks[1:]:
+                await self._send_chunk(file_path, caption, report_type, chunk)
+            return True
+        
+        now = datetime.now(self.TZ)
+        last = len(chunks) - 1
+        for i, chunk in enumerate(chunks[1:], start=1):
+            self.scheduler.add_job(
+                self._send_chunk,
+                DateTrigger(run_date=now + timedelta(seconds=i * BROADCAST_CHUNK_INTERVAL)),
+                args=(file_path, caption, report_type, chunk),
+                kwargs={'report_key': report_key if i == last else None},
+                id=f'broadcast_{report_type}_{i}',
+                replace_existing=True,
+                misfire_grace_time=600
+            )
+        
+        # До завершения рассылки отчёт помечается только в памяти: после перезапуска он уйдёт заново
+        if report_key:
+            self._remember_sent(report_key)
+        
+        logger.info(f"🗂️ [Scheduler] {report_type.title()} report: queued {len(chunks) - 1} more chunks "
+                    f"for {len(chat_ids) - len(chunks[0])} chats")
+        return False
+    
+    async def _send_chunk(self, file_path: str, caption: str, report_type: str,
+                          chat_ids: List[int], report_key: Optional[str] = None) -> None:
+        """
+        Отправить файл отчёта в группу чатов.
+        
+        Если файл ещё не загружен в Telegram, он загружается последовательно до первой
+        успешной отправки; остальным чатам отправляется сохранённый file_id.
+        
+        Args:
+            file_path: Путь к файлу отчёта
+            caption: Подпись к файлу
+            report_type: Тип отчёта для логирования
+            chat_ids: Чаты для отправки
+            report_key: Ключ отчёта, который нужно отметить отправленным после этой
+                (последней) части рассылки
+        """
         file_path_obj = Path(file_path)
         if not file_path_obj.exists():
             logger.error(f"❌ [Scheduler] Report file not found: {file_path}")
             return
         
-        success_count = 0
+        # После первой загрузки Telegram отдаёт файл по file_id без повторного аплоада
+        cache_key = (str(file_path_obj), file_path_obj.stat().st_mtime)
+        file_id = self._file_id_cache.get(cache_key)
+        
+        async def _send_one(chat_id: int) -> Any:
+            # Отправка файла
+            message = await self.bot.send_document(
+                chat_id=chat_id,
+                document=file_id or self._make_document(file_path_obj),
+                caption=caption
+            )
+            logger.info(f"📤 [Scheduler] {report_type.title()} report sent to chat {chat_id}")
+            return message
+        
+        pending = list(chat_ids)
+        results: Dict[int, Any] = {}
+        
+        # Загружаем файл последовательно, пока один из чатов не примет его
+        while file_id is None and pending:
+            chat_id = pending.pop(0)
+            result = (await self._send_to_chats(_send_one, [chat_id]))[chat_id]
+            results[chat_id] = result
+            document = getattr(result, 'document', None)
+            if document is not None:
+                file_id = self._file_id_cache[cache_key] = document.file_id
+        
+        if pending:
+            results.update(await self._send_to_chats(_send_one, pending))
+        
+        success_count = len(results) - self._log_send_errors(results, f"{report_type} report")
+        
+        logger.info(f"📊 [Scheduler] {report_type.title()} report sent to {success_count}/{len(results)} chats")
+        
+        if report_key:
+            await self._mark_sent(report_key)
+            logger.info(f"✅ [Scheduler] {report_type.title()} report broadcast completed: {report_key}")
+    
+    def _log_send_errors(self, results: Dict[int, Any], description: str) -> int:
+        """
+        Записать в лог ошибки рассылки, сгруппированные по типу исключения.
+        
+        На каждый тип ошибки пишется одна строка со списком чатов и один traceback,
+        а не по записи на каждый чат.
+        
+        Args:
+            results: chat_id -> результат отправки из _send_to_chats
+            description: Что отправлялось (для лога)
+            
+        Returns:
+            int: Количество чатов с ошибкой
+        """
+        errors: Dict[type, List[int]] = defaultdict(list)
+        first_error: Dict[type, BaseException] = {}
+        for chat_id, result in results.items():
+            if isinstance(result, BaseException):
+                errors[type(result)].append(chat_id)
+                first_error.setdefault(type(result), result)
+        
+        for exc_cls, chats in errors.items():
+            error = first_error[exc_cls]
+            logger.error(f"❌ [Scheduler] Failed to send {description}: {exc_cls.__name__} on {len(chats)} "
+                         f"chats {chats[:5]}: {error}", exc_info=error)
         
-        for chat_id in self.config.target_chats:
+        return sum(len(chats) for chats in errors.values())
+    
+    async def _send_with_retry(self, send_factory: Callable[[], Awaitable[Any]], chat_id: int,
+                               attempts: int = SEND_RETRY_ATTEMPTS) -> Any:
+        """
+        Выполнить отправку с повтором при 429 от Telegram.
+        
+        Ждёт retry_after секунд (с небольшим случайным разбросом) перед повтором.
+        Если бот заблокирован или удалён из чата, чат исключается из рассылки.
+        
+        Args:
+            send_factory: Функция, создающая корутину отправки
+            chat_id: ID чата получателя
+            attempts: Максимальное количество попыток
+            
+        Returns:
+            Результат отправки
+        """
+        for attempt in range(1, attempts + 1):
             try:
-                # Отправка файла
-                if not AIOGRAM_AVAILABLE or FSInputFile is Any:
-                    logger.error("❌ [Scheduler] FSInputFile not available")
-                    continue
-                document = FSInputFile(file_path_obj, filename=file_path_obj.name)
-                await self.bot.send_document(
-                    chat_id=chat_id,
-                    document=document,
-                    caption=caption
-                )
-                
-                success_count += 1
-                logger.info(f"📤 [Scheduler] {report_type.title()} report sent to chat {chat_id}")
-                
-            except Exception as e:
-                logger.exception(f"❌ [Scheduler] Failed to send {report_type} report to chat {chat_id}: {e}")
+                return await send_factory()
+            except TelegramRetryAfter as e:
+                if attempt == attempts:
+                    raise
+                delay = e.retry_after + random.uniform(0, 0.5)
+                logger.warning(f"⏳ [Scheduler] Rate limited for chat {chat_id}, retry {attempt}/{attempts - 1} "
+                               f"in {delay:.1f}s")
+                await asyncio.sleep(delay)
+            except TelegramForbiddenError:
+                logger.warning(f"🚫 [Scheduler] Bot has no access to chat {chat_id}, removing from target chats")
+                self.remove_target_chat(chat_id)
+                raise
+    
+    def _make_document(self, file_path_obj: Path) -> Any:
+        """
+        Подготовить документ для отправки.
+        
+        Небольшие файлы буферизуются в памяти, чтобы не перечитывать их с диска
+        для каждого получателя; большие отправляются через FSInputFile.
         
-        logger.info(f"📊 [Scheduler] {report_type.title()} report sent to {success_count}/{len(self.config.target_chats)} chats")
+        Args:
+            file_path_obj: Путь к файлу отчёта
+            
+        Returns:
+            BufferedInputFile или FSInputFile
+        """
+        if BufferedInputFile is not Any and file_path_obj.stat().st_size < MAX_BUFFERED_DOCUMENT_SIZE:
+            return BufferedInputFile(file_path_obj.read_bytes(), filename=file_path_obj.name)
+        return FSInputFile(file_path_obj, filename=file_path_obj.name)
     
     async def send_test_report(self, chat_id: int, report_type: str = "daily") -> bool:
         """
@@ -448,24 +919,20 @@ class ReportScheduler:
             
             if report_type == "daily":
                 yesterday = now - timedelta(days=1)
-                target_date = yesterday.strftime("%Y-%m-%d")
-                report_data = self.report_manager.generate_daily_report(target_date)
+                target_date = yesterday.date().isoformat()
+                report_data = await self._cached_generate('daily', target_date)
                 caption = f"🧪 Тестовый ежедневный отчёт за {format_datetime_for_report(yesterday, False)}"
                 
             elif report_type == "weekly":
-                days_since_monday = now.weekday()
-                last_monday = now - timedelta(days=days_since_monday + 7)
-                target_date = last_monday.strftime("%Y-%m-%d")
-                report_data = self.report_manager.generate_weekly_report(target_date)
+                last_monday = _last_monday(now)
+                target_date = last_monday.date().isoformat()
+                report_data = await self._cached_generate('weekly', target_date)
                 caption = f"🧪 Тестовый еженедельный отчёт с {format_datetime_for_report(last_monday, False)}"
                 
             elif report_type == "monthly":
-                if now.month == 1:
-                    last_month = now.replace(year=now.year - 1, month=12, day=1)
-                else:
-                    last_month = now.replace(month=now.month - 1, day=1)
-                target_date = last_month.strftime("%Y-%m-%d")
-                report_data = self.report_manager.generate_monthly_report(target_date)
+                last_month = _first_of_last_month(now)
+                target_date = last_month.date().isoformat()
+                report_data = await self._cached_generate('monthly', target_date)
                 caption = f"🧪 Тестовый месячный отчёт за {format_datetime_for_report(last_month, False)}"
                 
             else:
@@ -491,11 +958,14 @@ class ReportScheduler:
                 logger.error("❌ [Scheduler] FSInputFile not available")
                 return False
             
-            document = FSInputFile(file_path_obj, filename=file_path_obj.name)
-            await self.bot.send_document(
-                chat_id=chat_id,
-                document=document,
-                caption=caption
+            document = self._make_document(file_path_obj)
+            await self._send_with_retry(
+                lambda: self.bot.send_document(
+                    chat_id=chat_id,
+                    document=document,
+                    caption=caption
+                ),
+                chat_id
             )
             
             logger.info(f"✅ [Scheduler] Test {report_type} report sent successfully to chat {chat_id}")
@@ -505,6 +975,13 @@ class ReportScheduler:
             logger.exception(f"❌ [Scheduler] Failed to send test {report_type} report to chat {chat_id}: {e}")
             return False
     
+    def _format_report_time(self) -> str:
+        """Время отправки в формате ЧЧ:ММ (пересчитывается только при смене времени)."""
+        report_time = self.config.report_time
+        if self._report_time_label[0] != report_time:
+            self._report_time_label = (report_time, report_time.strftime('%H:%M'))
+        return self._report_time_label[1]
+    
     def get_status(self) -> Dict[str, Any]:
         """
         Получить статус планировщика.
@@ -516,11 +993,12 @@ class ReportScheduler:
             'running': self.running,
             'config': {
                 'enabled': self.config.enabled,
-                'report_time': self.config.report_time.strftime('%H:%M'),
+                'report_time': self._format_report_time(),
                 'target_chats_count': len(self.config.target_chats),
+                'target_chats': sorted(self.config.target_chats),
                 'report_types': self.config.report_types
             },
-            'jobs': [job.id for job in self.scheduler.get_jobs()] if self.running else [],
+            'jobs': sorted(self._active_job_ids) if self.running else [],
             'sent_today': list(self._sent_today),
             'aiogram_available': AIOGRAM_AVAILABLE,
             'bot_available': self.bot is not None
@@ -542,10 +1020,10 @@ class ReportScheduler:
         
         if target_date is None:
             yesterday = get_almaty_now() - timedelta(days=1)
-            target_date = yesterday.strftime("%Y-%m-%d")
+            target_date = yesterday.date().isoformat()
         
         try:
-            report_data = self.report_manager.generate_daily_report(target_date)
+            report_data = await self._cached_generate('daily', target_date)
             file_path = report_data.get('excel_file')
             
             if not file_path:
@@ -578,7 +1056,7 @@ class ReportScheduler:
         logger.info("🚀 [Scheduler] Manual weekly report generation requested")
         
         try:
-            report_data = self.report_manager.generate_weekly_report(target_date)
+            report_data = await self._cached_generate('weekly', target_date)
             file_path = report_data.get('excel_file')
             
             if not file_path:
@@ -611,7 +1089,7 @@ class ReportScheduler:
         logger.info("🚀 [Scheduler] Manual monthly report generation requested")
         
         try:
-            report_data = self.report_manager.generate_monthly_report(target_date)
+            report_data = await self._cached_generate('monthly', target_date)
             file_path = report_data.get('excel_file')
             
             if not file_path:
@@ -633,76 +1111,53 @@ class ReportScheduler:
 
 
 # Функции для упрощения работы с планировщиком в других модулях
-async def schedule_daily_report(scheduler: ReportScheduler, target_date: Optional[str] = None) -> str:
+# Период ручного отчёта по умолчанию: вчера, прошлая неделя, прошлый месяц
+_DEFAULT_DATE_FNS: Dict[str, Callable[[datetime], datetime]] = {
+    'daily': lambda now: now - timedelta(days=1),
+    'weekly': _last_monday,
+    'monthly': _first_of_last_month,
+}
+
+_MANUAL_LOG_PREFIXES = {
+    'daily': "📅 [Manual] Generating daily report",
+    'weekly': "📊 [Manual] Generating weekly report",
+    'monthly': "📈 [Manual] Generating monthly report",
+}
+
+
+async def schedule_report(scheduler: ReportScheduler, kind: str, target_date: Optional[str] = None) -> str:
     """
-    Создать и отправить ежедневный отчёт вручную.
+    Создать отчёт вручную.
     
     Args:
         scheduler: Экземпляр планировщика
-        target_date: Дата для отчёта (YYYY-MM-DD), по умолчанию вчера
+        kind: Тип отчёта (daily, weekly, monthly)
+        target_date: Дата отчёта (YYYY-MM-DD), по умолчанию вчера / прошлый понедельник / прошлый месяц
         
     Returns:
         str: Путь к созданному файлу
     """
     if target_date is None:
-        yesterday = get_almaty_now() - timedelta(days=1)
-        target_date = yesterday.strftime("%Y-%m-%d")
+        target_date = _DEFAULT_DATE_FNS[kind](get_almaty_now()).date().isoformat()
     
-    logger.info(f"📅 [Manual] Generating daily report for {target_date}")
-    report_data = scheduler.report_manager.generate_daily_report(target_date)
+    logger.info(f"{_MANUAL_LOG_PREFIXES[kind]} for {target_date}")
+    report_data = await scheduler._cached_generate(kind, target_date)
     file_path = report_data.get('excel_file')
     if not file_path:
         raise ValueError("No excel file path in report data")
     return file_path
 
 
+async def schedule_daily_report(scheduler: ReportScheduler, target_date: Optional[str] = None) -> str:
+    """Создать ежедневный отчёт вручную (по умолчанию за вчера)."""
+    return await schedule_report(scheduler, 'daily', target_date)
+
+
 async def schedule_weekly_report(scheduler: ReportScheduler, target_date: Optional[str] = None) -> str:
-    """
-    Создать и отправить еженедельный отчёт вручную.
-    
-    Args:
-        scheduler: Экземпляр планировщика
-        target_date: Дата начала недели (YYYY-MM-DD), по умолчанию прошлый понедельник
-        
-    Returns:
-        str: Путь к созданному файлу
-    """
-    if target_date is None:
-        now = get_almaty_now()
-        days_since_monday = now.weekday()
-        last_monday = now - timedelta(days=days_since_monday + 7)
-        target_date = last_monday.strftime("%Y-%m-%d")
-    
-    logger.info(f"📊 [Manual] Generating weekly report for {target_date}")
-    report_data = scheduler.report_manager.generate_weekly_report(target_date)
-    file_path = report_data.get('excel_file')
-    if not file_path:
-        raise ValueError("No excel file path in report data")
-    return file_path
+    """Создать еженедельный отчёт вручную (по умолчанию с прошлого понедельника)."""
+    return await schedule_report(scheduler, 'weekly', target_date)
 
 
 async def schedule_monthly_report(scheduler: ReportScheduler, target_date: Optional[str] = None) -> str:
-    """
-    Создать и отправить месячный отчёт вручную.
-    
-    Args:
-        scheduler: Экземпляр планировщика
-        target_date: Дата начала месяца (YYYY-MM-DD), по умолчанию прошлый месяц
-        
-    Returns:
-        str: Путь к созданному файлу
-    """
-    if target_date is None:
-        now = get_almaty_now()
-        if now.month == 1:
-            last_month = now.replace(year=now.year - 1, month=12, day=1)
-        else:
-            last_month = now.replace(month=now.month - 1, day=1)
-        target_date = last_month.strftime("%Y-%m-%d")
-    
-    logger.info(f"📈 [Manual] Generating monthly report for {target_date}")
-    report_data = scheduler.report_manager.generate_monthly_report(target_date)
-    file_path = report_data.get('excel_file')
-    if not file_path:
-        raise ValueError("No excel file path in report data")
-    return file_path
\ No newline at end of file
+    """Создать месячный отчёт вручную (по умолчанию за прошлый месяц)."""
+    return await schedule_report(scheduler, 'monthly', target_date)
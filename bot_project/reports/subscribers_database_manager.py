@@ -6,16 +6,31 @@ Subscribers Database Manager - Единый Excel файл subscribers_database.
 """
 
 import os
+import sys
+import atexit
 import logging
+import queue
+import threading
+from contextlib import contextmanager
+from time import monotonic
 from datetime import datetime, date, timedelta
-from typing import Dict, List, Optional, Any, Tuple
+from itertools import chain
+from typing import Dict, Iterator, List, Optional, Any, Set, Tuple
 from pathlib import Path
 
 import pandas as pd
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
 from openpyxl import Workbook, load_workbook
-from openpyxl.styles import Font, PatternFill, Alignment, Border, Side
+from openpyxl.styles import Font, PatternFill, Alignment, Border, Side, NamedStyle
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.utils import get_column_letter
 from openpyxl.utils.dataframe import dataframe_to_rows
 from openpyxl.worksheet.worksheet import Worksheet
+from openpyxl.xml import LXML
 
 from db.db import DatabaseManager
 from utils.time_utils import get_almaty_now, format_datetime_for_report
@@ -23,6 +38,105 @@ from utils.logging_conf import get_logger
 
 logger = get_logger(__name__)
 
+# Сколько событий История копить в памяти перед записью в файл
+HISTORY_FLUSH_THRESHOLD = 100
+# Сколько секунд фоновый поток собирает пачку событий перед записью
+HISTORY_FLUSH_INTERVAL = 5
+# Сколько ждать записи оставшихся событий при завершении процесса (секунды)
+HISTORY_EXIT_FLUSH_TIMEOUT = 10
+
+# Заголовки листов согласно ТЗ
+HISTORY_HEADERS = [
+    "Дата/время подписки", "Дата/время выхода", "Никнейм",
+    "Username", "Кто пригласил", "Статус"
+]
+STATISTICS_HEADERS = [
+    "Пригласивший", "Всего приглашено", "Подписаны сейчас", "Отписались"
+]
+
+# Повторяющиеся значения ячеек - один объект строки на все строки листа
+STATUS_SUBSCRIBED = sys.intern("подписан")
+STATUS_LEFT = sys.intern("вышел")
+INVITER_UNKNOWN = sys.intern("Не указан")
+
+# Сколько секунд переиспользовать результаты запросов статистики
+STATS_CACHE_TTL = 30
+
+# Максимальная ширина колонки (в символах)
+MAX_COLUMN_WIDTH = 50
+
+# Стили заголовков - общие экземпляры, чтобы openpyxl свёл их к одной записи в таблице стилей
+_HEADER_FONT = Font(bold=True, color="FFFFFF")
+_HEADER_FILL = PatternFill(start_color="366092", end_color="366092", fill_type="solid")
+_HEADER_ALIGN = Alignment(horizontal="center", vertical="center")
+_THIN = Side(style="thin")
+_HEADER_BORDER = Border(left=_THIN, right=_THIN, top=_THIN, bottom=_THIN)
+# Имя именованного стиля заголовков в книге
+HEADER_STYLE_NAME = "header"
+
+
+def _format_event_time(dt: datetime) -> str:
+    """Дата/время события в формате ДД.ММ.ГГГГ ЧЧ:ММ (без strftime - вызывается на каждое событие)."""
+    return f"{dt.day:02d}.{dt.month:02d}.{dt.year} {dt.hour:02d}:{dt.minute:02d}"
+
+
+class HistoryBuffer:
+    """
+    Буфер событий листа История в колоночном виде - по списку на каждую колонку.
+    
+    Отписка пользователя, чья строка ещё в буфере, обновляет её на месте;
+    остальные отписки помечаются для обновления строки листа при записи.
+    """
+    
+    def __init__(self) -> None:
+        self.sub_times: List[str] = []
+        self.exit_times: List[str] = []
+        self.nicknames: List[str] = []
+        self.usernames: List[str] = []
+        self.inviters: List[str] = []
+        self.statuses: List[str] = []
+        # @username -> позиция первой строки пользователя в буфере
+        self._index: Dict[str, int] = {}
+        # Позиция -> @username: строка обновляет найденную строку листа вместо добавления
+        self.update_rows: Dict[int, str] = {}
+    
+    @property
+    def columns(self) -> Tuple[List[str], ...]:
+        """Колонки в порядке листа История."""
+        return (self.sub_times, self.exit_times, self.nicknames,
+                self.usernames, self.inviters, self.statuses)
+    
+    def __len__(self) -> int:
+        return len(self.sub_times)
+    
+    def add(self, row: Tuple[str, ...], update_username: Optional[str] = None) -> None:
+        """
+        Добавить строку события.
+        
+        Args:
+            row: Значения колонок История
+            update_username: @username для отписки (обновить существующую строку)
+        """
+        if update_username is not None:
+            position = self._index.get(update_username)
+            if position is not None:
+                self.exit_times[position] = row[1]
+                self.statuses[position] = row[5]
+                return
+        
+        position = len(self)
+        for column, value in zip(self.columns, row):
+            column.append(value)
+        if row[3]:
+            self._index.setdefault(row[3], position)
+        if update_username is not None:
+            self.update_rows[position] = update_username
+    
+    def rows(self) -> Iterator[Tuple[Tuple[str, ...], Optional[str]]]:
+        """Строки буфера вместе с @username для обновления (или None)."""
+        for position, row in enumerate(zip(*self.columns)):
+            yield row, self.update_rows.get(position)
+
 
 class SubscribersDatabaseManager:
     """
@@ -40,9 +154,41 @@ class SubscribersDatabaseManager:
         self.reports_dir.mkdir(exist_ok=True)
         self.excel_file = self.reports_dir / "subscribers_database.xlsx"
         
+        # Буфер событий История до записи в файл
+        self._pending = HistoryBuffer()
+        self._flush_threshold = HISTORY_FLUSH_THRESHOLD
+        # Сколько записей подряд завершились ошибкой (события ждут повтора в буфере)
+        self._failed_writes = 0
+        self._lock = threading.Lock()
+        # Чтение-изменение-запись книги выполняется только под этой блокировкой
+        self._io_lock = threading.RLock()
+        
+        # Индекс @username -> номер строки в История и mtime файла, для которого он построен
+        self._username_row_index: Optional[Dict[str, int]] = None
+        self._index_mtime: Optional[float] = None
+        # Имена листов книги и mtime файла, для которого они прочитаны
+        self._sheetnames_cache: Optional[Tuple[float, Set[str]]] = None
+        # Максимальная длина значений по колонкам История, дописанных этим менеджером
+        self._col_max_width: Dict[int, int] = {}
+        
+        # Кэш запросов статистики: (время запроса, результат)
+        self._stats_cache: Optional[Tuple[float, List[Dict[str, Any]]]] = None
+        self._daily_stats_cache: Dict[str, Tuple[float, Dict[str, Any]]] = {}
+        
+        if not LXML:
+            logger.warning("lxml is not installed - openpyxl falls back to the slower pure-Python XML backend")
+        
         # Инициализировать файл если его нет
         self._ensure_file_exists()
         
+        # События пишутся в файл фоновым потоком, чтобы не блокировать event loop бота
+        self._queue: 'queue.Queue[Any]' = queue.Queue()
+        self._writer = threading.Thread(target=self._writer_loop, name="subscribers-xlsx-writer", daemon=True)
+        self._writer.start()
+        
+        # Дописать накопленные события при завершении процесса
+        atexit.register(self.flush, HISTORY_EXIT_FLUSH_TIMEOUT)
+        
         logger.info(f"SubscribersDatabaseManager initialized: {self.excel_file}")
     
     def _ensure_file_exists(self) -> None:
@@ -50,89 +196,84 @@ class SubscribersDatabaseManager:
         if not self.excel_file.exists():
             logger.info("Creating new subscribers_database.xlsx with base sheets")
             
-            wb = Workbook()
-            
-            # Удаляем дефолтный лист
-            if 'Sheet' in wb.sheetnames:
-                wb.remove(wb['Sheet'])
+            # Новый файл содержит только заголовки - пишем его потоково
+            wb = Workbook(write_only=True)
             
             # Создаем листы согласно ТЗ
             self._create_history_sheet(wb)
             self._create_statistics_sheet(wb)
             
-            wb.save(self.excel_file)
+            self._atomic_save(wb)
             logger.info("✅ Created subscribers_database.xlsx with История and Статистика sheets")
     
     def _create_history_sheet(self, wb: Workbook) -> None:
         """Создать лист История с правильными заголовками согласно ТЗ."""
         ws = wb.create_sheet("История")
+        self._append_header_row(ws, HISTORY_HEADERS)
+    
+    def _create_statistics_sheet(self, wb: Workbook, index: Optional[int] = None) -> Worksheet:
+        """Создать лист Статистика с правильными заголовками согласно ТЗ."""
+        ws = wb.create_sheet("Статистика", index)
+        self._append_header_row(ws, STATISTICS_HEADERS)
+        return ws
+    
+    def _append_header_row(self, ws: Any, headers: List[str]) -> None:
+        """Добавить строку заголовков в лист write-only книги и подобрать ширину колонок."""
+        if HEADER_STYLE_NAME not in ws.parent.named_styles:
+            ws.parent.add_named_style(NamedStyle(
+                name=HEADER_STYLE_NAME,
+                font=_HEADER_FONT,
+                fill=_HEADER_FILL,
+                alignment=_HEADER_ALIGN,
+                border=_HEADER_BORDER,
+            ))
         
-        # Заголовки согласно ТЗ
-        headers = [
-            "Дата/время подписки", "Дата/время выхода", "Никнейм", 
-            "Username", "Кто пригласил", "Статус"
-        ]
+        # Стиль регистрируется в книге один раз, ячейкам назначается только его имя
+        row = []
+        for header in headers:
+            cell = WriteOnlyCell(ws, value=header)
+            cell.style = HEADER_STYLE_NAME
+            row.append(cell)
         
-        # Добавляем заголовки
-        for col, header in enumerate(headers, 1):
-            cell = ws.cell(row=1, column=col, value=header)
-            cell.font = Font(bold=True, color="FFFFFF")
-            cell.fill = PatternFill(start_color="366092", end_color="366092", fill_type="solid")
-            cell.alignment = Alignment(horizontal="center", vertical="center")
-            cell.border = Border(
-                left=Side(style="thin"), right=Side(style="thin"),
-                top=Side(style="thin"), bottom=Side(style="thin")
-            )
-        
-        # Автоподбор ширины колонок
-        self._auto_adjust_columns(ws)
-    
-    def _create_statistics_sheet(self, wb: Workbook) -> None:
-        """Создать лист Статистика с правильными заголовками согласно ТЗ."""
-        ws = wb.create_sheet("Статистика")
+        # Ширина колонок по заголовкам (в write-only листе ячейки нельзя перечитать)
+        self._set_column_widths(ws, {col: len(header) for col, header in enumerate(headers, 1)})
         
-        # Заголовки согласно ТЗ
-        headers = [
-            "Пригласивший", "Всего приглашено", "Подписаны сейчас", "Отписались"
-        ]
+        ws.append(row)
+    
+    @staticmethod
+    def _track_widths(widths: Dict[int, int], row: Any) -> None:
+        """Учесть длины значений записываемой строки в максимальной ширине колонок."""
+        for col, value in enumerate(row, 1):
+            if value is not None:
+                widths[col] = max(widths.get(col, 0), len(str(value)))
+    
+    @staticmethod
+    def _set_column_widths(ws: Any, widths: Dict[int, int], grow_only: bool = False) -> None:
+        """
+        Выставить ширину колонок по уже посчитанным длинам значений.
         
-        # Добавляем заголовки
-        for col, header in enumerate(headers, 1):
-            cell = ws.cell(row=1, column=col, value=header)
-            cell.font = Font(bold=True, color="FFFFFF")
-            cell.fill = PatternFill(start_color="366092", end_color="366092", fill_type="solid")
-            cell.alignment = Alignment(horizontal="center", vertical="center")
-            cell.border = Border(
-                left=Side(style="thin"), right=Side(style="thin"),
-                top=Side(style="thin"), bottom=Side(style="thin")
-            )
-        
-        # Автоподбор ширины колонок
-        self._auto_adjust_columns(ws)
-    
-    def _auto_adjust_columns(self, ws: Worksheet) -> None:
-        """Автоподбор ширины колонок по содержимому."""
-        for column in ws.columns:
-            max_length = 0
-            column_letter = column[0].column_letter
-            
-            for cell in column:
-                try:
-                    if len(str(cell.value)) > max_length:
-                        max_length = len(str(cell.value))
-                except:
-                    pass
-            
-            adjusted_width = min(max_length + 2, 50)
-            ws.column_dimensions[column_letter].width = adjusted_width
+        Args:
+            ws: Лист
+            widths: Номер колонки -> максимальная длина значения
+            grow_only: Не уменьшать уже заданную ширину (для дописываемых листов)
+        """
+        for col, length in widths.items():
+            dimension = ws.column_dimensions[get_column_letter(col)]
+            width = min(length + 2, MAX_COLUMN_WIDTH)
+            if grow_only and dimension.width and dimension.width >= width:
+                continue
+            dimension.width = width
     
     def add_history_event(self, event_data: Dict[str, Any]) -> None:
         """
         Добавить новое событие в лист История (дописать в конец, не трогать старые данные).
         
+        Событие только ставится в очередь; фоновый поток записывает события
+        в файл пачками (см. flush).
+        
         Args:
             event_data: Данные события с полями:
-                - event_time: время события
+                - event_time: время события (datetime или строка ISO 8601)
                 - event_type: тип события (subscribe/unsubscribe)
                 - tg_user_id: ID пользователя
                 - username: @username пользователя
@@ -140,83 +281,281 @@ class SubscribersDatabaseManager:
                 - inviter_name: кто пригласил
                 - status: текущий статус
         """
-        try:
-            wb = load_workbook(self.excel_file)
-            ws = wb["История"]
-            
-            # Найти следующую пустую строку
-            next_row = ws.max_row + 1
+        self._queue.put(dict(event_data))
+    
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """
+        Дождаться записи в файл всех событий, добавленных до вызова.
+        
+        Args:
+            timeout: Максимальное время ожидания в секундах (None - без ограничения)
             
-            # Обработка времени события
-            event_time = event_data.get('event_time')
-            if isinstance(event_time, str):
+        Returns:
+            bool: True, если события записаны за отведённое время
+        """
+        if not self._writer.is_alive():
+            self._drain_queue()
+            self._write_buffer()
+            return True
+        
+        done = threading.Event()
+        self._queue.put(done)
+        return done.wait(timeout)
+    
+    def _writer_loop(self) -> None:
+        """
+        Фоновый поток записи: собирает события в течение HISTORY_FLUSH_INTERVAL
+        (или до HISTORY_FLUSH_THRESHOLD событий), затем записывает пачку одним сохранением.
+        """
+        while True:
+            item = self._queue.get()
+            waiters: List[threading.Event] = []
+            deadline = monotonic() + HISTORY_FLUSH_INTERVAL
+            
+            while True:
+                if isinstance(item, threading.Event):
+                    waiters.append(item)
+                else:
+                    self._buffer_event(item)
+                
+                if waiters or len(self._pending) >= self._flush_threshold:
+                    break
                 try:
-                    event_time = datetime.fromisoformat(event_time.replace('Z', '+00:00'))
-                except:
-                    event_time = get_almaty_now()
-            
-            # Получаем user_id для всех веток
-            user_id = str(event_data.get('tg_user_id', ''))
-            
-            # Форматирование согласно ТЗ
-            if event_data.get('event_type') in ['subscribe', 'subscription', 'join']:
-                # Подписка - заполняем дату подписки, дату выхода оставляем пустой
-                subscription_time = event_time.strftime("%d.%m.%Y %H:%M")
-                exit_time = ""
-                status = "подписан"
+                    item = self._queue.get(timeout=max(0.0, deadline - monotonic()))
+                except queue.Empty:
+                    break
+            
+            try:
+                self._write_buffer()
+            except Exception:
+                # События остались в буфере - повторим со следующей пачкой
+                self._failed_writes += 1
+                logger.warning(f"History write failed ({self._failed_writes} in a row), "
+                               f"{len(self._pending)} events kept for retry")
             else:
-                # Отписка - ищем существующую запись для обновления
-                subscription_time = ""
-                exit_time = event_time.strftime("%d.%m.%Y %H:%M")
-                status = "вышел"
-                
-                # Исправленная логика поиска: колонка 4 = Username (@username)
-                username_to_find = event_data.get('username', '')
-                if username_to_find and not username_to_find.startswith('@'):
-                    username_to_find = f'@{username_to_find}'
-                
-                # Попытаемся найти существующую строку для обновления даты выхода
-                for row_num in range(2, ws.max_row + 1):
-                    existing_username = str(ws.cell(row=row_num, column=4).value or '')  # Username колонка
-                    
-                    if username_to_find and existing_username == username_to_find:
-                        # Обновляем существующую запись
-                        ws.cell(row=row_num, column=2, value=exit_time)  # Дата выхода
-                        ws.cell(row=row_num, column=6, value=status)  # Статус
-                        wb.save(self.excel_file)
-                        logger.info(f"Updated exit time for user {user_id} (@{username_to_find})")
-                        return
-            
-            # Обработка username (обеспечиваем @ префикс)
-            username = event_data.get('username', '')
-            if username and not username.startswith('@'):
-                username = f'@{username}'
-            
-            # Обработка имени пригласителя (русификация Unknown)
-            inviter_name = event_data.get('inviter_name', '')
-            if inviter_name == 'Unknown' or not inviter_name:
-                inviter_name = 'Не указан'
-            
-            # Данные строки согласно ТЗ формату
-            row_data = [
-                subscription_time,  # Дата/время подписки
-                exit_time,          # Дата/время выхода
-                event_data.get('user_name', event_data.get('name', '')),  # Никнейм
-                username,           # Username
-                inviter_name,       # Кто пригласил
-                status              # Статус
-            ]
-            
-            # Добавляем данные в строку
-            for col, value in enumerate(row_data, 1):
-                ws.cell(row=next_row, column=col, value=value)
-            
-            wb.save(self.excel_file)
-            logger.info(f"Added history event: {event_data.get('event_type')} for user {user_id}")
+                self._failed_writes = 0
             
+            for waiter in waiters:
+                waiter.set()
+    
+    def _drain_queue(self) -> None:
+        """Перенести события из очереди в буфер (когда фоновый поток не работает)."""
+        while True:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                return
+            if isinstance(item, threading.Event):
+                item.set()
+            else:
+                self._buffer_event(item)
+    
+    def _buffer_event(self, event_data: Dict[str, Any]) -> None:
+        """Преобразовать событие в строку История и добавить её в буфер."""
+        try:
+            row_data, update_username = self._event_to_row(event_data)
+        except ValueError as e:
+            logger.error(f"Skipping history event with invalid data: {e}")
+            return
         except Exception as e:
-            logger.error(f"Error adding history event: {e}")
-            raise
+            # Любое повреждённое событие пропускается, чтобы не остановить поток записи
+            logger.exception(f"Skipping malformed history event: {e}")
+            return
+        
+        with self._lock:
+            self._pending.add(row_data, update_username)
+    
+    def _event_to_row(self, event_data: Dict[str, Any]) -> Tuple[Tuple[str, ...], Optional[str]]:
+        """
+        Сформировать строку История по событию.
+        
+        Returns:
+            Tuple: (значения колонок, @username для обновления при отписке или None)
+            
+        Raises:
+            ValueError: если event_time не в формате ISO 8601
+        """
+        # Обработка времени события
+        event_time = event_data.get('event_time')
+        if isinstance(event_time, str):
+            event_time = datetime.fromisoformat(event_time)
+        
+        # Обработка username (обеспечиваем @ префикс)
+        username = event_data.get('username', '')
+        if username and not username.startswith('@'):
+            username = f'@{username}'
+        
+        # Форматирование согласно ТЗ
+        if event_data.get('event_type') in ['subscribe', 'subscription', 'join']:
+            # Подписка - заполняем дату подписки, дату выхода оставляем пустой
+            subscription_time = _format_event_time(event_time)
+            exit_time = ""
+            status = STATUS_SUBSCRIBED
+            update_username = None
+        else:
+            # Отписка - при записи обновим существующую строку пользователя (колонка 4 = Username)
+            subscription_time = ""
+            exit_time = _format_event_time(event_time)
+            status = STATUS_LEFT
+            update_username = username or None
+        
+        # Обработка имени пригласителя (русификация Unknown)
+        inviter_name = event_data.get('inviter_name', '')
+        if inviter_name == 'Unknown' or not inviter_name:
+            inviter_name = INVITER_UNKNOWN
+        
+        # Данные строки согласно ТЗ формату
+        row_data = (
+            subscription_time,  # Дата/время подписки
+            exit_time,          # Дата/время выхода
+            event_data.get('user_name', event_data.get('name', '')),  # Никнейм
+            username,           # Username
+            inviter_name,       # Кто пригласил
+            status              # Статус
+        )
+        
+        return row_data, update_username
+    
+    def _write_buffer(self) -> None:
+        """
+        Записать накопленные события в лист История.
+        
+        Книга открывается и сохраняется один раз на всю пачку: новые строки
+        дописываются в конец, для отписок обновляется дата выхода и статус
+        найденной строки пользователя.
+        """
+        with self._io_lock:
+            pending = self._take_pending()
+            if not pending:
+                return
+            
+            try:
+                wb = load_workbook(self.excel_file)
+                self._write_pending(wb, pending)
+                self._save(wb)
+            except Exception as e:
+                self._restore_pending(pending)
+                logger.error(f"Error flushing history events: {e}")
+                raise
+    
+    def _take_pending(self) -> HistoryBuffer:
+        """Забрать накопленные события, оставив пустой буфер."""
+        with self._lock:
+            pending, self._pending = self._pending, HistoryBuffer()
+        return pending
+    
+    def _restore_pending(self, pending: HistoryBuffer) -> None:
+        """Вернуть незаписанные события перед новыми (индекс мог разойтись с файлом)."""
+        self._username_row_index = None
+        with self._lock:
+            merged = HistoryBuffer()
+            for row_data, update_username in chain(pending.rows(), self._pending.rows()):
+                merged.add(row_data, update_username)
+            self._pending = merged
+    
+    def _write_pending(self, wb: Workbook, pending: HistoryBuffer) -> None:
+        """Применить события к листу История загруженной книги (без сохранения)."""
+        ws = wb["История"]
+        # Индекс нужен только для отписок; пачку из одних подписок пишем без прохода по колонке Username
+        if pending.update_rows:
+            username_rows = self._load_username_index(ws)
+        elif self._index_is_fresh():
+            username_rows = self._username_row_index
+        else:
+            username_rows = None
+            self._username_row_index = None
+        
+        updated_count = 0
+        for row_data, update_username in pending.rows():
+            row_num = username_rows.get(update_username) if update_username else None
+            if row_num is not None:
+                # Обновляем существующую запись
+                ws.cell(row=row_num, column=2, value=row_data[1])  # Дата выхода
+                ws.cell(row=row_num, column=6, value=row_data[5])  # Статус
+                updated_count += 1
+                continue
+            
+            ws.append(row_data)
+            self._track_widths(self._col_max_width, row_data)
+            if row_data[3] and username_rows is not None:
+                username_rows.setdefault(row_data[3], ws.max_row)
+        
+        self._set_column_widths(ws, self._col_max_width, grow_only=True)
+        logger.info(f"Flushed {len(pending)} history events "
+                    f"({len(pending) - updated_count} added, {updated_count} updated)")
+    
+    def _save(self, wb: Workbook) -> None:
+        """Сохранить книгу и запомнить mtime файла для индекса username."""
+        self._atomic_save(wb)
+        self._index_mtime = self.excel_file.stat().st_mtime
+        self._sheetnames_cache = (self._index_mtime, set(wb.sheetnames))
+    
+    def _get_sheetnames(self) -> Set[str]:
+        """Имена листов книги; файл перечитывается (в read-only режиме) только при смене mtime."""
+        mtime = self.excel_file.stat().st_mtime
+        cached = self._sheetnames_cache
+        if cached is not None and cached[0] == mtime:
+            return cached[1]
+        
+        wb = load_workbook(self.excel_file, read_only=True)
+        try:
+            sheetnames = set(wb.sheetnames)
+        finally:
+            wb.close()
+        
+        self._sheetnames_cache = (mtime, sheetnames)
+        return sheetnames
+    
+    def _atomic_save(self, wb: Workbook) -> None:
+        """
+        Сохранить книгу через временный файл и атомарную замену.
+        
+        Читатели видят либо старую, либо новую версию файла целиком,
+        а падение во время записи не портит subscribers_database.xlsx.
+        """
+        tmp_file = self.excel_file.with_name(f"{self.excel_file.name}.tmp.{os.getpid()}")
+        with self._writer_lock():
+            try:
+                wb.save(tmp_file)
+                os.replace(tmp_file, self.excel_file)
+            finally:
+                if tmp_file.exists():
+                    tmp_file.unlink()
+    
+    @contextmanager
+    def _writer_lock(self):
+        """Межпроцессная блокировка записи через файл .lock рядом с книгой (только POSIX)."""
+        if fcntl is None:
+            yield
+            return
+        
+        lock_file = self.excel_file.with_name(f"{self.excel_file.name}.lock")
+        with open(lock_file, 'w') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+    
+    def _index_is_fresh(self) -> bool:
+        """Построен ли индекс username для текущей версии файла."""
+        return self._username_row_index is not None and self._index_mtime == self.excel_file.stat().st_mtime
+    
+    def _load_username_index(self, ws: Worksheet) -> Dict[str, int]:
+        """
+        Получить индекс @username -> первая строка пользователя в листе История.
+        
+        Индекс строится одним проходом по колонке Username и переиспользуется
+        между записями, пока файл не изменён извне.
+        """
+        if not self._index_is_fresh():
+            index: Dict[str, int] = {}
+            for row_num, (username,) in enumerate(
+                    ws.iter_rows(min_row=2, min_col=4, max_col=4, values_only=True), 2):
+                if username:
+                    index.setdefault(str(username), row_num)
+            self._username_row_index = index
+        return self._username_row_index
     
     def update_statistics_sheet(self) -> None:
         """
@@ -224,51 +563,70 @@ class SubscribersDatabaseManager:
         Подсчеты делаются на момент экспорта согласно ТЗ.
         """
         try:
-            wb = load_workbook(self.excel_file)
-            ws = wb["Статистика"]
-            
-            # Очищаем существующие данные (оставляем заголовки)
-            for row in ws.iter_rows(min_row=2, max_row=ws.max_row):
-                for cell in row:
-                    cell.value = None
-            
-            # Получаем актуальную статистику из базы
-            stats_data = self._get_current_statistics()
-            
-            # Добавляем данные согласно ТЗ формату
-            for row_idx, inviter_stats in enumerate(stats_data, 2):
-                # Нормализация имени пригласителя
-                inviter_name = inviter_stats.get('inviter_name', 'Не указан')
-                if inviter_name == 'Unknown' or not inviter_name:
-                    inviter_name = 'Не указан'
-                
-                ws.cell(row=row_idx, column=1, value=inviter_name)  # Пригласивший
-                ws.cell(row=row_idx, column=2, value=inviter_stats.get('total_invited', 0))  # Всего приглашено
-                ws.cell(row=row_idx, column=3, value=inviter_stats.get('currently_subscribed', 0))  # Подписаны сейчас
-                
-                # Рассчитываем отписавшихся
-                total_invited = inviter_stats.get('total_invited', 0)
-                currently_subscribed = inviter_stats.get('currently_subscribed', 0)
-                unsubscribed = max(0, total_invited - currently_subscribed)
-                ws.cell(row=row_idx, column=4, value=unsubscribed)  # Отписались
-            
-            # Автоподбор колонок
-            self._auto_adjust_columns(ws)
-            
-            wb.save(self.excel_file)
-            logger.info("Updated Статистика sheet with current data")
-            
+            with self._io_lock:
+                wb = load_workbook(self.excel_file)
+                self._update_statistics_sheet(wb)
+                self._save(wb)
         except Exception as e:
             logger.error(f"Error updating statistics sheet: {e}")
             raise
     
+    def _update_statistics_sheet(self, wb: Workbook) -> None:
+        """
+        Перезаписать лист Статистика в загруженной книге (без сохранения).
+        
+        Лист меняется через openpyxl внутри общей книги: xlsxwriter не умеет
+        дописывать в существующий файл, а История должна сохраняться.
+        """
+        # Пересоздаём лист на том же месте вместо очистки старых строк
+        index = wb.sheetnames.index("Статистика")
+        wb.remove(wb["Статистика"])
+        ws = self._create_statistics_sheet(wb, index)
+        
+        # Получаем актуальную статистику из базы
+        stats_data = self._get_current_statistics()
+        
+        # Таблица согласно ТЗ формату одним DataFrame
+        raw = pd.DataFrame(stats_data, columns=['inviter_name', 'total_invited', 'currently_subscribed'])
+        total_invited = raw['total_invited'].fillna(0).astype(int)
+        currently_subscribed = raw['currently_subscribed'].fillna(0).astype(int)
+        # Нормализация имени пригласителя
+        inviter_names = raw['inviter_name'].where(
+            raw['inviter_name'].notna() & ~raw['inviter_name'].isin(['', 'Unknown']), INVITER_UNKNOWN
+        )
+        df = pd.DataFrame({
+            STATISTICS_HEADERS[0]: inviter_names,
+            STATISTICS_HEADERS[1]: total_invited,
+            STATISTICS_HEADERS[2]: currently_subscribed,
+            STATISTICS_HEADERS[3]: (total_invited - currently_subscribed).clip(lower=0),  # Отписались
+        })
+        
+        for row in dataframe_to_rows(df, index=False, header=False):
+            ws.append(row)
+        
+        # Ширина колонок по записанным значениям
+        widths = {col: len(header) for col, header in enumerate(STATISTICS_HEADERS, 1)}
+        if not df.empty:
+            for col, header in enumerate(STATISTICS_HEADERS, 1):
+                widths[col] = max(widths[col], int(df[header].astype(str).str.len().max()))
+        self._set_column_widths(ws, widths)
+        
+        logger.info("Updated Статистика sheet with current data")
+    
     def _get_current_statistics(self) -> List[Dict[str, Any]]:
-        """Получить актуальную статистику по пригласителям из базы данных."""
+        """Получить актуальную статистику по пригласителям из базы данных (кэш на STATS_CACHE_TTL)."""
+        cached = self._stats_cache
+        if cached is not None and monotonic() - cached[0] < STATS_CACHE_TTL:
+            return cached[1]
+        
         try:
-            return self.db.get_statistics_data()
+            stats_data = self.db.get_statistics_data()
         except Exception as e:
             logger.error(f"Error getting statistics: {e}")
             return []
+        
+        self._stats_cache = (monotonic(), stats_data)
+        return stats_data
     
     def create_daily_report_sheet(self, target_date: date) -> Dict[str, Any]:
         """
@@ -282,68 +640,86 @@ class SubscribersDatabaseManager:
             Dict с результатом операции
         """
         try:
-            sheet_name = target_date.strftime("%Y-%m-%d")
-            
-            wb = load_workbook(self.excel_file)
-            
-            # Проверяем есть ли уже такой лист
-            if sheet_name in wb.sheetnames:
-                logger.info(f"Daily sheet {sheet_name} already exists in subscribers_database.xlsx - skipping")
-                return {'sheet_exists': True, 'sheet_name': sheet_name, 'file': str(self.excel_file)}
-            
-            # Создаем новый лист в subscribers_database.xlsx
-            ws = wb.create_sheet(sheet_name)
-            
-            # Получаем данные за день
-            daily_stats = self._get_daily_statistics(target_date)
-            
-            # Формируем отчет согласно ТЗ
-            current_row = 1
-            
-            # Заголовок
-            title_cell = ws.cell(row=current_row, column=1, value=f"Ежедневный отчет за {target_date.strftime('%d.%m.%Y')}")
-            title_cell.font = Font(size=14, bold=True)
-            current_row += 2
-            
-            # Текстовый отчет согласно ТЗ
-            report_content = f"""Сводка по удержанию:
-- Новых пользователей: {daily_stats['new_users']}
-- Остались активными: {daily_stats['retained_users']} ({daily_stats['retention_rate']}%)
-- Вышли в тот же день: {daily_stats['left_same_day']}
-
-Топ-3 пригласителей:
-{daily_stats['top_inviters_text']}
-
-Динамика (vs вчера):
-{daily_stats['dynamics_text']}"""
-            
-            # Добавляем текст отчета построчно для лучшего форматирования
-            for line in report_content.split('\n'):
-                if line.strip():
-                    ws.cell(row=current_row, column=1, value=line)
-                    current_row += 1
-                else:
-                    current_row += 1  # Пустая строка
-            
-            # Автоподбор колонок
-            self._auto_adjust_columns(ws)
-            
-            wb.save(self.excel_file)
-            logger.info(f"✅ Created daily report sheet {sheet_name} in subscribers_database.xlsx")
-            
-            return {
-                'sheet_exists': False,
-                'sheet_name': sheet_name,
-                'stats': daily_stats,
-                'file': str(self.excel_file)
-            }
+            with self._io_lock:
+                # Лист уже есть - не разбираем книгу целиком
+                sheet_name = target_date.strftime("%Y-%m-%d")
+                if sheet_name in self._get_sheetnames():
+                    logger.info(f"Daily sheet {sheet_name} already exists in subscribers_database.xlsx - skipping")
+                    return {'sheet_exists': True, 'sheet_name': sheet_name, 'file': str(self.excel_file)}
+                
+                wb = load_workbook(self.excel_file)
+                result = self._create_daily_report_sheet(wb, target_date)
+                if not result['sheet_exists']:
+                    self._save(wb)
+            return result
             
         except Exception as e:
             logger.error(f"Error creating daily report sheet: {e}")
             return {'error': str(e)}
     
+    def _create_daily_report_sheet(self, wb: Workbook, target_date: date) -> Dict[str, Any]:
+        """Добавить лист отчёта за день в загруженную книгу (без сохранения)."""
+        sheet_name = target_date.strftime("%Y-%m-%d")
+        
+        # Проверяем есть ли уже такой лист
+        if sheet_name in wb.sheetnames:
+            logger.info(f"Daily sheet {sheet_name} already exists in subscribers_database.xlsx - skipping")
+            return {'sheet_exists': True, 'sheet_name': sheet_name, 'file': str(self.excel_file)}
+        
+        # Создаем новый лист в subscribers_database.xlsx
+        ws = wb.create_sheet(sheet_name)
+        
+        # Получаем данные за день
+        daily_stats = self._get_daily_statistics(target_date)
+        
+        # Формируем отчет согласно ТЗ
+        # Заголовок и пустая строка после него
+        title = f"Ежедневный отчет за {target_date.strftime('%d.%m.%Y')}"
+        ws.append([title])
+        ws['A1'].font = Font(size=14, bold=True)
+        ws.append([])
+        
+        # Текстовый отчет согласно ТЗ - сразу построчно (пустые строки остаются пустыми)
+        lines = [
+            "Сводка по удержанию:",
+            f"- Новых пользователей: {daily_stats['new_users']}",
+            f"- Остались активными: {daily_stats['retained_users']} ({daily_stats['retention_rate']}%)",
+            f"- Вышли в тот же день: {daily_stats['left_same_day']}",
+            "",
+            "Топ-3 пригласителей:",
+            *daily_stats['top_inviters_text'].split('\n'),
+            "",
+            "Динамика (vs вчера):",
+            daily_stats['dynamics_text'],
+        ]
+        for line in lines:
+            ws.append([line] if line.strip() else [])
+        
+        # Ширина колонки по самой длинной строке отчёта
+        self._set_column_widths(ws, {1: max(len(title), *(len(line) for line in lines))})
+        
+        logger.info(f"✅ Created daily report sheet {sheet_name} in subscribers_database.xlsx")
+        
+        return {
+            'sheet_exists': False,
+            'sheet_name': sheet_name,
+            'stats': daily_stats,
+            'file': str(self.excel_file)
+        }
+    
     def _get_daily_statistics(self, target_date: date) -> Dict[str, Any]:
-        """Получить статистику за конкретный день."""
+        """Получить статистику за конкретный день (кэш на STATS_CACHE_TTL)."""
+        date_str = target_date.strftime("%Y-%m-%d")
+        cached = self._daily_stats_cache.get(date_str)
+        if cached is not None and monotonic() - cached[0] < STATS_CACHE_TTL:
+            return cached[1]
+        
+        daily_stats = self._query_daily_statistics(target_date)
+        self._daily_stats_cache = {date_str: (monotonic(), daily_stats)}
+        return daily_stats
+    
+    def _query_daily_statistics(self, target_date: date) -> Dict[str, Any]:
+        """Запросить статистику за конкретный день из базы данных."""
         try:
             date_str = target_date.strftime("%Y-%m-%d")
             daily_stats = self.db.get_daily_stats(date_str)
@@ -398,9 +774,9 @@ class SubscribersDatabaseManager:
         
         lines = []
         for i, inviter in enumerate(top_inviters, 1):
-            name = inviter.get('inviter_name', 'Не указан')
+            name = inviter.get('inviter_name', INVITER_UNKNOWN)
             if name == 'Unknown':
-                name = 'Не указан'
+                name = INVITER_UNKNOWN
             invited = inviter.get('invited_count', 0)
             retained = inviter.get('retained_count', 0)
             retention_pct = round((retained / invited * 100) if invited > 0 else 0)
@@ -427,21 +803,61 @@ class SubscribersDatabaseManager:
         Returns:
             str: Путь к файлу subscribers_database.xlsx
         """
-        try:
-            # Сначала обновляем статистику
-            self.update_statistics_sheet()
-            
-            # Создаем лист за сегодня если его еще нет
-            today = get_almaty_now().date()
-            self.create_daily_report_sheet(today)
-            
-            logger.info(f"Database export completed: {self.excel_file}")
-            return str(self.excel_file)
-            
-        except Exception as e:
-            logger.error(f"Error exporting database: {e}")
-            raise
+        # Дожидаемся записи событий из очереди фонового потока
+        self.flush()
+        
+        # Все изменения применяются к одной загруженной книге и сохраняются один раз
+        with self._io_lock:
+            pending = self._take_pending()
+            try:
+                wb = load_workbook(self.excel_file)
+                
+                # Записываем события, не записанные фоновым потоком
+                if pending:
+                    self._write_pending(wb, pending)
+                
+                # Обновляем статистику по свежему запросу
+                self._stats_cache = None
+                self._update_statistics_sheet(wb)
+                
+                # Создаем лист за сегодня если его еще нет
+                today = get_almaty_now().date()
+                self._create_daily_report_sheet(wb, today)
+                
+                self._save(wb)
+                logger.info(f"Database export completed: {self.excel_file}")
+                return str(self.excel_file)
+                
+            except Exception as e:
+                self._restore_pending(pending)
+                logger.error(f"Error exporting database: {e}")
+                raise
     
     def get_file_path(self) -> str:
         """Получить путь к файлу subscribers_database.xlsx."""
-        return str(self.excel_file)
\ No newline at end of file
+        return str(self.excel_file)
+
+
+# Общие менеджеры по пути к файлу - буфер событий должен быть один на файл
+_managers: Dict[str, SubscribersDatabaseManager] = {}
+_managers_lock = threading.Lock()
+
+
+def get_subscribers_database_manager(db_manager: DatabaseManager,
+                                     reports_dir: str = "reports_output") -> SubscribersDatabaseManager:
+    """
+    Получить общий менеджер subscribers_database.xlsx для директории отчётов.
+    
+    Args:
+        db_manager: Менеджер базы данных
+        reports_dir: Директория отчётов
+        
+    Returns:
+        SubscribersDatabaseManager: Менеджер, общий для всех вызывающих
+    """
+    key = str(Path(reports_dir).resolve())
+    with _managers_lock:
+        manager = _managers.get(key)
+        if manager is None:
+            manager = _managers[key] = SubscribersDatabaseManager(db_manager, reports_dir)
+        return manager
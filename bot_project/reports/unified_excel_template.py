@@ -6,14 +6,24 @@ Creates and maintains a single Excel file with История, Статисти
 """
 
 import os
+import re
+import html
+import zipfile
+import atexit
 import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from time import monotonic
 from datetime import datetime, date, timedelta
-from typing import Dict, List, Optional, Any, Tuple
+from typing import Dict, List, Optional, Any, Set, Tuple
 from pathlib import Path
 
 import pandas as pd
+import xlsxwriter
 from openpyxl import Workbook, load_workbook
-from openpyxl.styles import Font, PatternFill, Alignment, Border, Side
+from openpyxl.styles import Font, PatternFill, Alignment, Border, Side, NamedStyle
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.utils import get_column_letter, column_index_from_string
 from openpyxl.utils.dataframe import dataframe_to_rows
 from openpyxl.worksheet.worksheet import Worksheet
 
@@ -23,6 +33,86 @@ from utils.logging_conf import get_logger
 
 logger = get_logger(__name__)
 
+# Save the cached workbook after this many unsaved history events...
+HISTORY_SAVE_EVERY = 50
+# ...or this many seconds after the first unsaved change
+HISTORY_SAVE_DELAY = 5.0
+
+# Sheet headers according to TZ
+HISTORY_HEADERS = [
+    "Дата/время", "Действие", "User ID", "Username",
+    "Имя", "Пригласивший", "Статус"
+]
+STATISTICS_HEADERS = [
+    "Пригласивший", "Всего приглашено", "Подписаны сейчас",
+    "Отписались", "% удержания"
+]
+
+# Seconds to reuse statistics query results (coalesces back-to-back report calls)
+STATS_CACHE_TTL = 5
+
+# Shared pool for the independent daily-report queries (each opens its own SQLite connection)
+_DAILY_QUERY_EXECUTOR = ThreadPoolExecutor(max_workers=4, thread_name_prefix='unified-stats')
+
+# Only the latest daily sheets stay in the unified workbook; every day is also archived
+# as a standalone file in reports_output/daily/YYYY-MM-DD.xlsx
+DAILY_SHEETS_KEPT = 7
+DAILY_SHEET_PATTERN = re.compile(r'^\d\d-\d\d-\d\d\d\d$')
+# Sheet names in xl/workbook.xml, read without a full openpyxl parse
+_WORKBOOK_SHEET_NAME = re.compile(r'<(?:\w+:)?sheet\b[^>]*?\bname="([^"]*)"')
+
+# Styles are built once at import; header and label styles are registered per workbook as named styles
+HEADER_STYLE_NAME = "header"
+_HEADER_FONT = Font(bold=True)
+_HEADER_FILL = PatternFill(start_color="CCCCCC", end_color="CCCCCC", fill_type="solid")
+_HEADER_ALIGN = Alignment(horizontal="center")
+LABEL_STYLE_NAME = "label_bold"
+_LABEL_FONT = Font(bold=True)
+_TITLE_FONT = Font(size=14, bold=True)
+# The same header style as an xlsxwriter format
+_HEADER_XLSX_FORMAT = {'bold': True, 'bg_color': '#CCCCCC', 'align': 'center'}
+
+# Event type and status translations according to TZ
+_ACTION_MAP = {
+    'subscribe': 'подписка',
+    'unsubscribe': 'отписка',
+    'subscription': 'подписка',
+    'unsubscription': 'отписка',
+    'join': 'подписка',
+    'leave': 'отписка'
+}
+_STATUS_MAP = {
+    'subscribed': 'подписан',
+    'unsubscribed': 'вышел',
+    'left': 'вышел',
+    'active': 'подписан',
+    'inactive': 'вышел'
+}
+
+
+# Last formatted event minute: (minute key, "ДД.ММ.ГГГГ HH:MM")
+_last_formatted_minute: Optional[Tuple[int, str]] = None
+
+
+def _format_event_minute(dt: datetime) -> str:
+    """Format event time as ДД.ММ.ГГГГ HH:MM, reusing the result for events in the same minute."""
+    global _last_formatted_minute
+    key = dt.year * 100000000 + dt.month * 1000000 + dt.day * 10000 + dt.hour * 100 + dt.minute
+    cached = _last_formatted_minute
+    if cached is not None and cached[0] == key:
+        return cached[1]
+    
+    formatted = dt.strftime("%d.%m.%Y %H:%M")
+    _last_formatted_minute = (key, formatted)
+    return formatted
+
+
+def _normalize_inviter(name: Optional[str]) -> str:
+    """Translate missing or 'Unknown' inviter names to Russian."""
+    if name == 'Unknown' or not name:
+        return 'Не указан'
+    return name
+
 
 class UnifiedExcelTemplate:
     """
@@ -36,123 +126,214 @@ class UnifiedExcelTemplate:
         self.reports_dir = Path(reports_dir)
         self.reports_dir.mkdir(exist_ok=True)
         self.excel_file = self.reports_dir / "subscribers_report.xlsx"
-        
-        # Initialize Excel file if it doesn't exist
-        self._ensure_excel_file_exists()
-        
-        logger.info(f"UnifiedExcelTemplate initialized: {self.excel_file}")
+        self.export_file = self.reports_dir / "subscribers_report_export.xlsx"
+        self.daily_dir = self.reports_dir / "daily"
+        
+        # The file itself is created lazily on first access (see _workbook/get_sheet_names)
+        # Workbook is kept in memory and saved on a debounce instead of per event
+        self._lock = threading.RLock()
+        self._wb: Optional[Workbook] = None
+        self._wb_mtime: Optional[float] = None
+        self._sheet_names_cache: Optional[Tuple[float, Set[str]]] = None
+        self._dirty = False
+        self._unsaved_events = 0
+        self._save_timer: Optional[threading.Timer] = None
+        
+        # Statistics query cache: (query time, result)
+        self._stats_cache: Optional[Tuple[float, List[Dict[str, Any]]]] = None
+        self._daily_stats_cache: Dict[str, Tuple[float, Dict[str, Any]]] = {}
+        
+        logger.info("UnifiedExcelTemplate initialized: %s", self.excel_file)
     
     def _ensure_excel_file_exists(self) -> None:
         """Create Excel file with История and Статистика sheets if it doesn't exist."""
         if not self.excel_file.exists():
             logger.info("Creating new subscribers_report.xlsx with base sheets")
             
-            wb = Workbook()
-            
-            # Remove default sheet
-            if 'Sheet' in wb.sheetnames:
-                wb.remove(wb['Sheet'])
+            # Fresh file with two header-only sheets - xlsxwriter writes it without building a DOM
+            wb = xlsxwriter.Workbook(str(self.excel_file))
+            try:
+                header_format = wb.add_format(_HEADER_XLSX_FORMAT)
+                for title, headers in (("История", HISTORY_HEADERS), ("Статистика", STATISTICS_HEADERS)):
+                    ws = wb.add_worksheet(title)
+                    ws.write_row(0, 0, headers, header_format)
+                    for col, header in enumerate(headers):
+                        ws.set_column(col, col, min(len(header) + 2, 50))
+            finally:
+                wb.close()
             
-            # Create История sheet
-            self._create_history_sheet(wb)
-            
-            # Create Статистика sheet  
-            self._create_statistics_sheet(wb)
-            
-            wb.save(self.excel_file)
             logger.info("✅ Created subscribers_report.xlsx with История and Статистика sheets")
     
-    def _create_history_sheet(self, wb: Workbook) -> None:
-        """Create История sheet with proper headers."""
-        ws = wb.create_sheet("История")
-        
-        # Headers according to TZ
-        headers = [
-            "Дата/время", "Действие", "User ID", "Username", 
-            "Имя", "Пригласивший", "Статус"
-        ]
-        
-        # Add headers
-        for col, header in enumerate(headers, 1):
-            cell = ws.cell(row=1, column=col, value=header)
-            cell.font = Font(bold=True)
-            cell.fill = PatternFill(start_color="CCCCCC", end_color="CCCCCC", fill_type="solid")
-            cell.alignment = Alignment(horizontal="center")
-        
-        # Auto-adjust column widths
-        self._auto_adjust_columns(ws)
-    
-    def _create_statistics_sheet(self, wb: Workbook) -> None:
+    def _create_statistics_sheet(self, wb: Workbook, index: Optional[int] = None) -> Worksheet:
         """Create Статистика sheet with proper headers."""
-        ws = wb.create_sheet("Статистика")
-        
-        # Headers according to TZ
-        headers = [
-            "Пригласивший", "Всего приглашено", "Подписаны сейчас", 
-            "Отписались", "% удержания"
-        ]
-        
-        # Add headers
-        for col, header in enumerate(headers, 1):
-            cell = ws.cell(row=1, column=col, value=header)
-            cell.font = Font(bold=True)
-            cell.fill = PatternFill(start_color="CCCCCC", end_color="CCCCCC", fill_type="solid")
-            cell.alignment = Alignment(horizontal="center")
-        
-        # Auto-adjust column widths
-        self._auto_adjust_columns(ws)
+        ws = wb.create_sheet("Статистика", index)
+        self._append_header_row(ws, STATISTICS_HEADERS)
+        return ws
+    
+    def _append_header_row(self, ws: Any, headers: List[str]) -> None:
+        """Append a styled header row to a freshly created sheet."""
+        wb = ws.parent
+        if HEADER_STYLE_NAME not in wb.named_styles:
+            wb.add_named_style(NamedStyle(
+                name=HEADER_STYLE_NAME,
+                font=_HEADER_FONT,
+                fill=_HEADER_FILL,
+                alignment=_HEADER_ALIGN,
+            ))
+        
+        row = []
+        for header in headers:
+            cell = WriteOnlyCell(ws, value=header)
+            cell.style = HEADER_STYLE_NAME
+            row.append(cell)
+        
+        # Column widths by headers
+        for col_idx, header in enumerate(headers, 1):
+            ws.column_dimensions[get_column_letter(col_idx)].width = min(len(header) + 2, 50)
+        
+        ws.append(row)
     
     def _auto_adjust_columns(self, ws: Worksheet) -> None:
-        """Auto-adjust column widths based on content."""
-        for column in ws.columns:
-            max_length = 0
-            column_letter = column[0].column_letter
+        """Auto-adjust column widths based on content (single row-wise pass over the sheet)."""
+        widths = [0] * ws.max_column
+        for row in ws.iter_rows(values_only=True):
+            for i, value in enumerate(row):
+                if value is not None:
+                    length = len(value) if isinstance(value, str) else len(str(value))
+                    if length > widths[i]:
+                        widths[i] = length
+        
+        for col_idx, max_length in enumerate(widths, 1):
+            adjusted_width = min(max_length + 2, 50)
+            ws.column_dimensions[get_column_letter(col_idx)].width = adjusted_width
+    
+    def _workbook(self) -> Workbook:
+        """Return the cached workbook, creating the file on first use and reloading it if it was changed by someone else."""
+        self._ensure_excel_file_exists()
+        mtime = self.excel_file.stat().st_mtime
+        if self._wb is None or (not self._dirty and mtime != self._wb_mtime):
+            self._wb = load_workbook(self.excel_file)
+            self._wb_mtime = mtime
+        return self._wb
+    
+    def get_sheet_names(self) -> Set[str]:
+        """
+        Return sheet names of the unified workbook.
+        
+        Uses the cached workbook when it is current; otherwise reads only
+        xl/workbook.xml from the file (cached by mtime) instead of parsing the whole workbook.
+        """
+        with self._lock:
+            self._ensure_excel_file_exists()
+            mtime = self.excel_file.stat().st_mtime
+            if self._wb is not None and (self._dirty or mtime == self._wb_mtime):
+                return set(self._wb.sheetnames)
             
-            for cell in column:
-                try:
-                    if len(str(cell.value)) > max_length:
-                        max_length = len(str(cell.value))
-                except:
-                    pass
+            cached = self._sheet_names_cache
+            if cached is not None and cached[0] == mtime:
+                return cached[1]
             
-            adjusted_width = min(max_length + 2, 50)
-            ws.column_dimensions[column_letter].width = adjusted_width
+            with zipfile.ZipFile(self.excel_file) as archive:
+                workbook_xml = archive.read('xl/workbook.xml').decode('utf-8')
+            sheet_names = {html.unescape(name) for name in _WORKBOOK_SHEET_NAME.findall(workbook_xml)}
+            
+            self._sheet_names_cache = (mtime, sheet_names)
+            return sheet_names
+    
+    def _mark_dirty(self) -> None:
+        """Remember that the cached workbook has unsaved changes and schedule a save."""
+        self._dirty = True
+        if self._save_timer is None:
+            self._save_timer = threading.Timer(HISTORY_SAVE_DELAY, self.flush)
+            self._save_timer.daemon = True
+            self._save_timer.start()
+    
+    def flush(self) -> None:
+        """Save the cached workbook to disk if it has unsaved changes."""
+        with self._lock:
+            if self._save_timer is not None:
+                self._save_timer.cancel()
+                self._save_timer = None
+            
+            if not self._dirty:
+                return
+            
+            self._atomic_save(self._wb)
+            self._wb_mtime = self.excel_file.stat().st_mtime
+            self._dirty = False
+            self._unsaved_events = 0
+    
+    def _atomic_save(self, wb: Workbook) -> None:
+        """
+        Save the workbook through a temporary file and os.replace.
+        
+        Readers see either the old or the new file in full, and a crash
+        mid-save does not corrupt subscribers_report.xlsx.
+        """
+        tmp_file = self.excel_file.with_name(f"{self.excel_file.name}.tmp.{os.getpid()}")
+        try:
+            wb.save(tmp_file)
+            os.replace(tmp_file, self.excel_file)
+        finally:
+            if tmp_file.exists():
+                tmp_file.unlink()
     
     def add_history_event(self, event_data: Dict[str, Any]) -> None:
-        """Add new event to История sheet."""
-        wb = load_workbook(self.excel_file)
-        ws = wb["История"]
-        
-        # Find next empty row
-        next_row = ws.max_row + 1
+        """Add new event to История sheet (saved to disk on a debounce, see flush)."""
+        self.add_history_events([event_data])
+    
+    def add_history_events(self, events: List[Dict[str, Any]]) -> int:
+        """
+        Add a batch of events to История sheet (saved to disk on a debounce, see flush).
+        
+        A malformed event is logged and skipped without losing the rest of the batch.
+        Raises only if the workbook cannot be opened, in which case no rows were added.
+        
+        Returns:
+            int: Number of rows added
+        """
+        rows = []
+        for event_data in events:
+            try:
+                rows.append(self._history_row(event_data))
+            except Exception as e:
+                logger.error("Skipping malformed history event %r: %s", event_data, e)
+        
+        if not rows:
+            return 0
+        
+        with self._lock:
+            ws = self._workbook()["История"]
+            for row_data in rows:
+                ws.append(row_data)
+            self._unsaved_events += len(rows)
+            self._mark_dirty()
+            if self._unsaved_events >= HISTORY_SAVE_EVERY:
+                try:
+                    self.flush()
+                except Exception as e:
+                    # Rows stay in the dirty workbook and go out with the next save
+                    logger.error("Error saving %s: %s", self.excel_file, e)
         
+        logger.info("Added %s history events", len(rows))
+        return len(rows)
+    
+    def _history_row(self, event_data: Dict[str, Any]) -> List[Any]:
+        """Build История row for an event according to TZ format."""
         # Format datetime according to TZ (ДД.ММ.ГГГГ HH:MM)
         event_time = event_data.get('event_time')
         if isinstance(event_time, str):
-            event_time = datetime.fromisoformat(event_time.replace('Z', '+00:00'))
-        
-        formatted_time = event_time.strftime("%d.%m.%Y %H:%M")
-        
-        # Map event type to Russian according to TZ
-        action_map = {
-            'subscribe': 'подписка',
-            'unsubscribe': 'отписка',
-            'subscription': 'подписка',
-            'unsubscription': 'отписка',
-            'join': 'подписка',
-            'leave': 'отписка'
-        }
-        action = action_map.get(event_data.get('event_type', ''), event_data.get('event_type', ''))
-        
-        # Map status to Russian according to TZ
-        status_map = {
-            'subscribed': 'подписан',
-            'unsubscribed': 'вышел',
-            'left': 'вышел',
-            'active': 'подписан',
-            'inactive': 'вышел'
-        }
-        status = status_map.get(event_data.get('status', ''), event_data.get('status', ''))
+            if event_time.endswith('Z'):
+                event_time = event_time[:-1] + '+00:00'
+            event_time = datetime.fromisoformat(event_time)
+        
+        formatted_time = _format_event_minute(event_time)
+        
+        # Map event type and status to Russian according to TZ
+        event_type = event_data.get('event_type', '')
+        action = _ACTION_MAP.get(event_type, event_type)
+        status = event_data.get('status', '')
+        status = _STATUS_MAP.get(status, status)
         
         # Format username (ensure @ prefix)
         username = event_data.get('username', '')
@@ -160,12 +341,10 @@ class UnifiedExcelTemplate:
             username = f'@{username}'
         
         # Format inviter name (prefer username over name) - handle Unknown case
-        inviter_name = event_data.get('inviter_name', '')
-        if inviter_name == 'Unknown' or not inviter_name:
-            inviter_name = 'Не указан'
+        inviter_name = _normalize_inviter(event_data.get('inviter_name', ''))
         
-        # Add data to row according to TZ format
-        row_data = [
+        # Row data according to TZ format
+        return [
             formatted_time,
             action,
             event_data.get('tg_user_id', ''),
@@ -174,79 +353,89 @@ class UnifiedExcelTemplate:
             inviter_name,
             status
         ]
-        
-        for col, value in enumerate(row_data, 1):
-            ws.cell(row=next_row, column=col, value=value)
-        
-        wb.save(self.excel_file)
-        logger.info(f"Added history event: {action} for user {event_data.get('tg_user_id')}")
     
     def update_statistics_sheet(self) -> None:
-        """Update Статистика sheet with current data from database."""
-        wb = load_workbook(self.excel_file)
-        ws = wb["Статистика"]
-        
-        # Clear existing data (keep headers)
-        for row in ws.iter_rows(min_row=2, max_row=ws.max_row):
-            for cell in row:
-                cell.value = None
+        """Update Статистика sheet with current data from database (saved on a debounce, see flush)."""
+        with self._lock:
+            self._update_statistics_sheet(self._workbook())
+            self._mark_dirty()
+        logger.info("Updated Статистика sheet")
+    
+    def _update_statistics_sheet(self, wb: Workbook) -> None:
+        """Rewrite Статистика sheet rows in the given workbook."""
+        # Rebuild the sheet instead of clearing cells one by one
+        index = wb.sheetnames.index("Статистика")
+        wb.remove(wb["Статистика"])
+        ws = self._create_statistics_sheet(wb, index)
         
         # Get current statistics from database
         stats_data = self._get_current_statistics()
         
-        # Add data to sheet with proper name handling
-        for row_idx, inviter_stats in enumerate(stats_data, 2):
-            # Normalize inviter name - translate Unknown to Russian
-            inviter_name = inviter_stats.get('inviter_name', 'Не указан')
-            if inviter_name == 'Unknown' or not inviter_name:
-                inviter_name = 'Не указан'
-            
-            ws.cell(row=row_idx, column=1, value=inviter_name)
-            ws.cell(row=row_idx, column=2, value=inviter_stats.get('total_invited', 0))
-            ws.cell(row=row_idx, column=3, value=inviter_stats.get('currently_subscribed', 0))
-            ws.cell(row=row_idx, column=4, value=inviter_stats.get('unsubscribed', 0))
-            
-            # Calculate retention percentage with safe access
-            total_invited = inviter_stats.get('total_invited', 0)
-            currently_subscribed = inviter_stats.get('currently_subscribed', 0)
-            retention_pct = 0
-            if total_invited > 0:
-                retention_pct = round((currently_subscribed / total_invited) * 100)
-            ws.cell(row=row_idx, column=5, value=f"{retention_pct}%")
+        # Names are already normalized and retention_pct computed in SQL
+        for inviter_stats in stats_data:
+            ws.append([
+                inviter_stats['inviter_name'],
+                inviter_stats['total_invited'],
+                inviter_stats['currently_subscribed'],
+                inviter_stats['unsubscribed'],
+                f"{inviter_stats['retention_pct']}%",
+            ])
         
         # Auto-adjust columns
         self._auto_adjust_columns(ws)
-        
-        wb.save(self.excel_file)
-        logger.info("Updated Статистика sheet")
     
     def _get_current_statistics(self) -> List[Dict[str, Any]]:
-        """Get current statistics by inviter from database - use proper username priority."""
+        """Get current statistics by inviter from database - use proper username priority (cached for STATS_CACHE_TTL)."""
+        cached = self._stats_cache
+        if cached is not None and monotonic() - cached[0] < STATS_CACHE_TTL:
+            return cached[1]
+        
         try:
             # Use database method that properly handles username > name priority
             stats_data = self.db.get_statistics_data()
             
             # Normalize all inviter names to handle Unknown values
             for stat in stats_data:
-                inviter_name = stat.get('inviter_name', 'Не указан')
-                if inviter_name == 'Unknown' or not inviter_name:
-                    stat['inviter_name'] = 'Не указан'
-            
-            return stats_data
+                stat['inviter_name'] = _normalize_inviter(stat.get('inviter_name'))
         except Exception as e:
-            logger.error(f"Error getting statistics: {e}")
+            logger.error("Error getting statistics: %s", e)
             return []
+        
+        self._stats_cache = (monotonic(), stats_data)
+        return stats_data
     
-    def create_daily_report_sheet(self, target_date: date) -> Dict[str, Any]:
-        """Create daily report sheet with format ДД-ММ-ГГГГ."""
+    def invalidate_stats_cache(self) -> None:
+        """Drop cached statistics so the next call queries the database."""
+        self._stats_cache = None
+        self._daily_stats_cache = {}
+    
+    def create_daily_report_sheet(self, target_date: date, save: bool = True) -> Dict[str, Any]:
+        """
+        Create daily report sheet with format ДД-ММ-ГГГГ.
+        
+        The day is also written to a standalone archive file, and only the latest
+        DAILY_SHEETS_KEPT daily sheets are kept in the unified workbook so that its
+        open/save time does not grow with the age of the bot.
+        
+        Args:
+            target_date: Report date
+            save: Save the workbook right away; pass False when the caller batches
+                more changes and calls flush() itself
+        """
         sheet_name = target_date.strftime("%d-%m-%Y")
         
-        wb = load_workbook(self.excel_file)
+        with self._lock:
+            return self._create_daily_report_sheet(self._workbook(), target_date, sheet_name, save)
+    
+    def _create_daily_report_sheet(self, wb: Workbook, target_date: date, sheet_name: str,
+                                   save: bool) -> Dict[str, Any]:
+        """Add the daily report sheet to the cached workbook (and save it if requested)."""
+        archive_file = self.daily_dir / f"{target_date.isoformat()}.xlsx"
         
-        # Check if sheet already exists
-        if sheet_name in wb.sheetnames:
-            logger.info(f"Daily sheet {sheet_name} already exists")
-            return {'sheet_exists': True, 'sheet_name': sheet_name}
+        # Check if sheet already exists (older days live only in the archive)
+        if sheet_name in wb.sheetnames or archive_file.exists():
+            logger.info("Daily sheet %s already exists", sheet_name)
+            return {'sheet_exists': True, 'sheet_name': sheet_name, 'archive_file': str(archive_file)}
         
         # Create new sheet
         ws = wb.create_sheet(sheet_name)
@@ -254,13 +443,10 @@ class UnifiedExcelTemplate:
         # Get daily statistics
         daily_stats = self._get_daily_statistics(target_date)
         
-        # Create the report format according to TZ
-        current_row = 1
-        
-        # Title
-        title_cell = ws.cell(row=current_row, column=1, value="Ежедневный отчёт")
-        title_cell.font = Font(size=14, bold=True)
-        current_row += 2
+        # Title and empty line after it
+        ws.append(["Ежедневный отчёт"])
+        ws['A1'].font = _TITLE_FONT
+        ws.append([])
         
         # Data rows according to TZ format
         report_data = [
@@ -273,46 +459,107 @@ class UnifiedExcelTemplate:
             ("Динамика (vs вчера)", daily_stats['dynamics_text'])
         ]
         
-        for param, value in report_data:
-            ws.cell(row=current_row, column=1, value=param).font = Font(bold=True)
-            ws.cell(row=current_row, column=2, value=value)
-            current_row += 1
+        if LABEL_STYLE_NAME not in wb.named_styles:
+            wb.add_named_style(NamedStyle(name=LABEL_STYLE_NAME, font=_LABEL_FONT))
+        
+        for row in report_data:
+            ws.append(row)
+            ws.cell(row=ws.max_row, column=1).style = LABEL_STYLE_NAME
         
         # Auto-adjust columns
         self._auto_adjust_columns(ws)
         
-        wb.save(self.excel_file)
-        logger.info(f"Created daily report sheet: {sheet_name}")
+        self._write_daily_archive(archive_file, report_data)
+        removed_sheets = self._prune_daily_sheets(wb)
+        
+        self._mark_dirty()
+        if save:
+            self.flush()
+        logger.info("Created daily report sheet: %s", sheet_name)
         
         return {
             'sheet_exists': False, 
             'sheet_name': sheet_name,
             'stats': daily_stats,
-            'excel_file': str(self.excel_file)
+            'excel_file': str(self.excel_file),
+            'archive_file': str(archive_file),
+            'daily_sheets_kept': DAILY_SHEETS_KEPT,
+            'removed_sheets': removed_sheets
         }
     
+    def _write_daily_archive(self, archive_file: Path, report_data: List[Tuple[str, Any]]) -> None:
+        """Write the daily report as a standalone file (same layout as the daily sheet)."""
+        self.daily_dir.mkdir(exist_ok=True)
+        
+        wb = xlsxwriter.Workbook(str(archive_file))
+        try:
+            ws = wb.add_worksheet(archive_file.stem)
+            ws.write(0, 0, "Ежедневный отчёт", wb.add_format({'bold': True, 'font_size': 14}))
+            
+            label_format = wb.add_format({'bold': True})
+            for row_idx, (param, value) in enumerate(report_data, 2):
+                ws.write(row_idx, 0, param, label_format)
+                ws.write(row_idx, 1, value)
+            
+            for col, values in enumerate(zip(*report_data)):
+                ws.set_column(col, col, min(max(len(str(value)) for value in values) + 2, 50))
+        finally:
+            wb.close()
+    
+    def _prune_daily_sheets(self, wb: Workbook) -> List[str]:
+        """Remove all but the latest DAILY_SHEETS_KEPT daily sheets from the workbook."""
+        daily_sheets = sorted(
+            (name for name in wb.sheetnames if DAILY_SHEET_PATTERN.match(name)),
+            key=lambda name: datetime.strptime(name, "%d-%m-%Y")
+        )
+        
+        removed = daily_sheets[:-DAILY_SHEETS_KEPT]
+        for name in removed:
+            wb.remove(wb[name])
+        
+        if removed:
+            logger.info("Removed %s old daily sheets from subscribers_report.xlsx (kept in %s)", len(removed), self.daily_dir)
+        return removed
+    
     def _get_daily_statistics(self, target_date: date) -> Dict[str, Any]:
-        """Get daily statistics for the specified date."""
+        """Get daily statistics for the specified date (cached for STATS_CACHE_TTL)."""
+        date_str = target_date.strftime("%Y-%m-%d")
+        cached = self._daily_stats_cache.get(date_str)
+        if cached is not None and monotonic() - cached[0] < STATS_CACHE_TTL:
+            return cached[1]
+        
+        daily_stats = self._query_daily_statistics(target_date)
+        self._daily_stats_cache = {date_str: (monotonic(), daily_stats)}
+        return daily_stats
+    
+    def _query_daily_statistics(self, target_date: date) -> Dict[str, Any]:
+        """Query daily statistics for the specified date from database."""
         try:
-            # Get basic stats for the day
             date_str = target_date.strftime("%Y-%m-%d")
-            daily_stats = self.db.get_daily_stats(date_str)
+            yesterday = target_date - timedelta(days=1)
+            
+            # The four queries are independent - run them concurrently
+            daily_future = _DAILY_QUERY_EXECUTOR.submit(self.db.get_daily_stats, date_str)
+            retention_future = _DAILY_QUERY_EXECUTOR.submit(self.db.get_retention_for_date, date_str, 3)
+            top_inviters_future = _DAILY_QUERY_EXECUTOR.submit(self._get_top_inviters_for_date, target_date)
+            yesterday_future = _DAILY_QUERY_EXECUTOR.submit(self.db.get_daily_stats, yesterday.strftime("%Y-%m-%d"))
             
+            # Get basic stats for the day
+            daily_stats = daily_future.result()
             new_users = daily_stats.get('total_subscriptions', 0)
             left_same_day = daily_stats.get('same_day_unsubscriptions', 0)
             
             # Calculate 3-day retention
-            retention_3_days = self.db.get_retention_for_date(date_str, 3)
+            retention_3_days = retention_future.result()
             retained_3_days = retention_3_days.get('retained', 0)
             retention_3_days_pct = round(retention_3_days.get('retention_rate', 0))
             
             # Get top 3 inviters for the day
-            top_inviters = self._get_top_inviters_for_date(target_date)
+            top_inviters = top_inviters_future.result()
             top_inviters_text = self._format_top_inviters(top_inviters)
             
             # Get dynamics (compare with yesterday)
-            yesterday = target_date - timedelta(days=1)
-            yesterday_stats = self.db.get_daily_stats(yesterday.strftime("%Y-%m-%d"))
+            yesterday_stats = yesterday_future.result()
             dynamics_text = self._format_dynamics(daily_stats, yesterday_stats)
             
             return {
@@ -326,7 +573,7 @@ class UnifiedExcelTemplate:
             }
             
         except Exception as e:
-            logger.error(f"Error getting daily statistics: {e}")
+            logger.error("Error getting daily statistics: %s", e)
             return {
                 'new_users': 0,
                 'retained_3_days': 0,
@@ -343,29 +590,34 @@ class UnifiedExcelTemplate:
             date_str = target_date.strftime("%Y-%m-%d")
             return self.db.get_top_inviters_for_date(date_str, limit=3)
         except Exception as e:
-            logger.error(f"Error getting top inviters: {e}")
+            logger.error("Error getting top inviters: %s", e)
             return []
     
-    def _format_top_inviters(self, top_inviters: List[Dict[str, Any]]) -> str:
-        """Format top inviters according to TZ specification."""
+    def _format_top_inviters(self, top_inviters: List[Dict[str, Any]], numbered: bool = False) -> str:
+        """
+        Format top inviters according to TZ specification.
+        
+        Args:
+            top_inviters: Inviter rows from the database
+            numbered: One "1. name — ..." line per inviter (message) instead of a comma-separated list (sheet)
+        """
         if not top_inviters:
             return "Нет данных"
         
         formatted_lines = []
         for i, inviter in enumerate(top_inviters, 1):
             # Normalize inviter name - translate Unknown to Russian
-            name = inviter.get('inviter_name', 'Не указан')
-            if name == 'Unknown' or not name:
-                name = 'Не указан'
+            name = _normalize_inviter(inviter.get('inviter_name'))
             invited = inviter.get('invited_count', 0)
             retained = inviter.get('retained_count', 0)
             retention_pct = 0
             if invited > 0:
                 retention_pct = round((retained / invited) * 100)
             
-            formatted_lines.append(f"{name} — {invited} ({retained} удержано, {retention_pct}%)")
+            line = f"{name} — {invited} ({retained} удержано, {retention_pct}%)"
+            formatted_lines.append(f"{i}. {line}" if numbered else line)
         
-        return ", ".join(formatted_lines)
+        return "\n".join(formatted_lines) if numbered else ", ".join(formatted_lines)
     
     def _format_dynamics(self, today_stats: Dict[str, Any], yesterday_stats: Dict[str, Any]) -> str:
         """Format dynamics comparison according to TZ specification."""
@@ -385,18 +637,7 @@ class UnifiedExcelTemplate:
         formatted_date = target_date.strftime("%d.%m.%Y")
         
         # Top 3 inviters formatted for message
-        top_inviters_lines = []
-        for i, inviter in enumerate(daily_stats['top_inviters'][:3], 1):
-            name = inviter.get('inviter_name', 'Unknown')
-            invited = inviter.get('invited_count', 0)
-            retained = inviter.get('retained_count', 0)
-            retention_pct = 0
-            if invited > 0:
-                retention_pct = round((retained / invited) * 100)
-            
-            top_inviters_lines.append(f"{i}. {name} — {invited} ({retained} удержано, {retention_pct}%)")
-        
-        top_inviters_text = "\n".join(top_inviters_lines) if top_inviters_lines else "Нет данных"
+        top_inviters_text = self._format_top_inviters(daily_stats['top_inviters'][:3], numbered=True)
         
         message = f"""📊 Ежедневный отчёт — {formatted_date}
 
@@ -416,4 +657,84 @@ class UnifiedExcelTemplate:
     
     def get_excel_file_path(self) -> str:
         """Get path to the unified Excel file."""
-        return str(self.excel_file)
\ No newline at end of file
+        return str(self.excel_file)
+    
+    def write_export_copy(self) -> str:
+        """
+        Write a downloadable copy of the cached workbook with xlsxwriter.
+        
+        constant_memory mode streams each row to disk, so the export cost stays flat
+        as История grows. Formats are registered once and reused for all cells.
+        
+        Returns:
+            str: Path to the export copy
+        """
+        with self._lock:
+            wb = self._workbook()
+            out = xlsxwriter.Workbook(str(self.export_file), {'constant_memory': True})
+            try:
+                header_format = out.add_format(_HEADER_XLSX_FORMAT)
+                title_format = out.add_format({'bold': True, 'font_size': 14})
+                label_format = out.add_format({'bold': True})
+                
+                for ws in wb.worksheets:
+                    sheet = out.add_worksheet(ws.title)
+                    for letter, dimension in ws.column_dimensions.items():
+                        if dimension.width:
+                            col = column_index_from_string(letter) - 1
+                            sheet.set_column(col, col, dimension.width)
+                    
+                    # История/Статистика: header row + data; daily sheets: title + bold labels in column A
+                    is_daily_sheet = ws.title not in ("История", "Статистика")
+                    for row_idx, row in enumerate(ws.iter_rows(values_only=True)):
+                        if not is_daily_sheet:
+                            sheet.write_row(row_idx, 0, row, header_format if row_idx == 0 else None)
+                        elif row_idx == 0:
+                            sheet.write_row(row_idx, 0, row, title_format)
+                        elif row:
+                            sheet.write(row_idx, 0, row[0], label_format)
+                            sheet.write_row(row_idx, 1, row[1:])
+            finally:
+                out.close()
+        
+        return str(self.export_file)
+
+
+# One template per workbook file: the cached workbook and its debounced saves
+# must not be duplicated, or instances overwrite each other's changes
+_templates: Dict[str, UnifiedExcelTemplate] = {}
+_templates_lock = threading.Lock()
+
+
+def get_unified_excel_template(db_manager: DatabaseManager,
+                               reports_dir: str = "reports_output") -> UnifiedExcelTemplate:
+    """
+    Get the shared UnifiedExcelTemplate for a reports directory.
+    
+    Args:
+        db_manager: Database manager
+        reports_dir: Reports directory
+        
+    Returns:
+        UnifiedExcelTemplate: Template shared by all callers
+    """
+    key = str(Path(reports_dir).resolve())
+    with _templates_lock:
+        template = _templates.get(key)
+        if template is None:
+            template = _templates[key] = UnifiedExcelTemplate(db_manager, reports_dir)
+        return template
+
+
+def _flush_all_templates() -> None:
+    """Save unsaved changes of every shared template (registered with atexit)."""
+    with _templates_lock:
+        templates = list(_templates.values())
+    for template in templates:
+        try:
+            template.flush()
+        except Exception as e:
+            logger.error("Error saving %s on exit: %s", template.excel_file, e)
+
+
+atexit.register(_flush_all_templates)
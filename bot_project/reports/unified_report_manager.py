@@ -5,20 +5,42 @@ Unified Report Manager that integrates the new Excel template with existing syst
 Handles both the unified Excel file and maintains compatibility with current workflows.
 """
 
+import atexit
 import logging
+import threading
+import weakref
+from collections import deque
 from datetime import datetime, date, timedelta
 from typing import Dict, List, Optional, Any
 from pathlib import Path
 
+import numpy as np
 from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
 
 from db.db import DatabaseManager
-from reports.unified_excel_template import UnifiedExcelTemplate
+from reports.unified_excel_template import get_unified_excel_template
 from utils.time_utils import get_almaty_now, format_datetime_for_report
 from utils.logging_conf import get_logger
 
 logger = get_logger(__name__)
 
+# Write queued history events once this many have accumulated...
+EVENT_BATCH_SIZE = 50
+# ...or this many seconds after the first queued event
+EVENT_FLUSH_INTERVAL = 2.0
+
+# Live managers whose queued events are written on exit (weak, so per-request managers are not kept alive)
+_live_managers: "weakref.WeakSet[UnifiedReportManager]" = weakref.WeakSet()
+
+
+def _flush_all_managers() -> None:
+    """Write queued events of every live manager (registered with atexit)."""
+    for manager in list(_live_managers):
+        manager.flush_events()
+
+
+atexit.register(_flush_all_managers)
+
 
 class UnifiedReportManager:
     """
@@ -32,29 +54,68 @@ class UnifiedReportManager:
         self.reports_dir = Path(reports_dir)
         self.reports_dir.mkdir(exist_ok=True)
         
-        # Initialize unified Excel template
-        self.excel_template = UnifiedExcelTemplate(db_manager, reports_dir)
+        # Unified Excel template, shared by every manager working on the same file
+        self.excel_template = get_unified_excel_template(db_manager, reports_dir)
         
-        logger.info(f"UnifiedReportManager initialized with reports directory: {self.reports_dir}")
+        # History events are queued and written to the workbook in batches
+        self._event_queue: deque = deque()
+        self._events_lock = threading.Lock()
+        self._flush_timer: Optional[threading.Timer] = None
+        _live_managers.add(self)
+        
+        logger.info("UnifiedReportManager initialized with reports directory: %s", self.reports_dir)
     
     def add_event_to_history(self, event_data: Dict[str, Any]) -> None:
-        """Add event to История sheet and update Статистика."""
-        try:
-            # Add to История sheet
-            self.excel_template.add_history_event(event_data)
-            
-            # Update Статистика sheet
-            self.excel_template.update_statistics_sheet()
+        """
+        Queue event for История sheet; Статистика is rebuilt only when the file is
+        about to be looked at (generate_daily_report, export_excel_file).
+        
+        Queued events are written every EVENT_BATCH_SIZE events or EVENT_FLUSH_INTERVAL
+        seconds; anything handing the file out calls flush_events first.
+        """
+        with self._events_lock:
+            self._event_queue.append(event_data)
+            flush_now = len(self._event_queue) >= EVENT_BATCH_SIZE
+            if not flush_now and self._flush_timer is None:
+                self._flush_timer = threading.Timer(EVENT_FLUSH_INTERVAL, self.flush_events)
+                self._flush_timer.daemon = True
+                self._flush_timer.start()
+        
+        if flush_now:
+            self.flush_events()
+    
+    def flush_events(self) -> None:
+        """Write queued events to История (the file is saved on the template's debounce)."""
+        with self._events_lock:
+            if self._flush_timer is not None:
+                self._flush_timer.cancel()
+                self._flush_timer = None
             
-            logger.info(f"Added event to unified Excel: {event_data.get('event_type')} for user {event_data.get('tg_user_id')}")
+            events = []
+            while self._event_queue:
+                events.append(self._event_queue.popleft())
+            if not events:
+                return
             
-        except Exception as e:
-            logger.error(f"Error adding event to unified Excel: {e}")
+            try:
+                added = self.excel_template.add_history_events(events)
+                self.excel_template.invalidate_stats_cache()
+                
+                logger.info("Added %s events to unified Excel", added)
+                
+            except Exception as e:
+                # The workbook could not be opened - keep the batch for the next flush
+                self._event_queue.extendleft(reversed(events))
+                logger.error("Error adding events to unified Excel, %s events kept for retry: %s",
+                             len(events), e)
     
     def generate_daily_report(self, target_date: Optional[str] = None) -> Dict[str, Any]:
         """
         Generate daily report according to TZ specification.
         
+        All sheet changes are applied to the template's cached workbook and
+        written with a single save at the end.
+        
         Args:
             target_date: Target date in YYYY-MM-DD format (default: yesterday)
             
@@ -68,15 +129,21 @@ class UnifiedReportManager:
         try:
             target_date_obj = datetime.strptime(target_date, "%Y-%m-%d").date()
             
+            # Write queued history events first
+            self.flush_events()
+            
             # Update Статистика sheet first
             self.excel_template.update_statistics_sheet()
             
             # Create daily report sheet
-            report_result = self.excel_template.create_daily_report_sheet(target_date_obj)
+            report_result = self.excel_template.create_daily_report_sheet(target_date_obj, save=False)
             
             # Generate daily message
             daily_message = self.excel_template.get_daily_report_message(target_date_obj)
             
+            # One save for Статистика and the daily sheet, before the file is offered for download
+            self.excel_template.flush()
+            
             return {
                 'success': True,
                 'target_date': target_date,
@@ -87,7 +154,7 @@ class UnifiedReportManager:
             }
             
         except Exception as e:
-            logger.error(f"Error generating daily report: {e}")
+            logger.error("Error generating daily report: %s", e)
             return {
                 'success': False,
                 'error': str(e),
@@ -117,7 +184,9 @@ class UnifiedReportManager:
         return message, download_button
     
     def get_excel_file_path(self) -> str:
-        """Get path to the unified subscribers_report.xlsx file."""
+        """Get path to the unified subscribers_report.xlsx file (unsaved changes are flushed first)."""
+        self.flush_events()
+        self.excel_template.flush()
         return self.excel_template.get_excel_file_path()
     
     def get_stats_summary(self) -> Dict[str, Any]:
@@ -126,8 +195,12 @@ class UnifiedReportManager:
             stats_data = self.excel_template._get_current_statistics()
             
             total_inviters = len(stats_data)
-            total_invited = sum(stat['total_invited'] for stat in stats_data)
-            total_active = sum(stat['currently_subscribed'] for stat in stats_data)
+            
+            # Totals over all inviters as int64 vector sums (per-inviter retention comes from SQL)
+            total_invited = int(np.fromiter((stat['total_invited'] for stat in stats_data),
+                                            dtype=np.int64, count=total_inviters).sum())
+            total_active = int(np.fromiter((stat['currently_subscribed'] for stat in stats_data),
+                                           dtype=np.int64, count=total_inviters).sum())
             
             return {
                 'total_inviters': total_inviters,
@@ -138,7 +211,7 @@ class UnifiedReportManager:
             }
             
         except Exception as e:
-            logger.error(f"Error getting stats summary: {e}")
+            logger.error("Error getting stats summary: %s", e)
             return {
                 'total_inviters': 0,
                 'total_invited': 0,
@@ -150,19 +223,21 @@ class UnifiedReportManager:
     def export_excel_file(self) -> str:
         """
         Export current unified Excel file.
-        Updates statistics and returns file path.
+        Updates statistics and returns the path of a fresh download copy
+        (subscribers_report_export.xlsx); the main file is saved on its own debounce.
         """
         try:
-            # Update statistics before export
+            # Update statistics before export and write the download copy
+            self.flush_events()
             self.excel_template.update_statistics_sheet()
             
-            file_path = self.excel_template.get_excel_file_path()
-            logger.info(f"Excel file ready for export: {file_path}")
+            file_path = self.excel_template.write_export_copy()
+            logger.info("Excel file ready for export: %s", file_path)
             
             return file_path
             
         except Exception as e:
-            logger.error(f"Error exporting Excel file: {e}")
+            logger.error("Error exporting Excel file: %s", e)
             raise
     
     def handle_subscription_event(self, user_data: Dict[str, Any]) -> None:
@@ -199,17 +274,16 @@ class UnifiedReportManager:
             target_date = (get_almaty_now() - timedelta(days=1)).date()
         
         try:
-            from openpyxl import load_workbook
-            
             excel_file = self.excel_template.get_excel_file_path()
             if not Path(excel_file).exists():
                 return False
             
-            wb = load_workbook(excel_file)
-            sheet_name = target_date.strftime("%d-%m-%Y")
+            # Days older than the latest daily sheets are only kept in the archive
+            if (self.excel_template.daily_dir / f"{target_date.isoformat()}.xlsx").exists():
+                return True
             
-            return sheet_name in wb.sheetnames
+            return target_date.strftime("%d-%m-%Y") in self.excel_template.get_sheet_names()
             
         except Exception as e:
-            logger.error(f"Error checking daily sheet existence: {e}")
+            logger.error("Error checking daily sheet existence: %s", e)
             return False
\ No newline at end of file
@@ -0,0 +1,73 @@
+"""
+Tests for the DatabaseManager connection pool.
+"""
+
+import os
+import tempfile
+import threading
+import unittest
+from unittest import mock
+
+from db import db as db_module
+from db.db import DatabaseManager
+
+
+class ConnectionPoolTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.db = DatabaseManager(os.path.join(self.tmp_dir.name, "pool.db"))
+
+    def tearDown(self):
+        self.db.close()
+        self.tmp_dir.cleanup()
+
+    def test_connections_are_reused(self):
+        with self.db.get_connection() as conn:
+            first = conn
+        with self.db.get_connection() as conn:
+            self.assertIs(conn, first)
+
+    def test_nested_acquisition_does_not_block(self):
+        with self.db.get_connection() as outer:
+            with self.db.get_connection() as inner:
+                self.assertIsNot(inner, outer)
+                self.assertEqual(inner.execute("SELECT 1").fetchone()[0], 1)
+
+    def test_exhausted_pool_opens_overflow_connection(self):
+        held = [self.db._acquire_connection() for _ in range(db_module.DB_POOL_SIZE)]
+        try:
+            result = {}
+
+            def worker():
+                with self.db.get_connection() as conn:
+                    result["conn"] = conn
+                    result["value"] = conn.execute("SELECT 1").fetchone()[0]
+
+            with mock.patch.object(db_module, "DB_POOL_TIMEOUT", 0.05):
+                thread = threading.Thread(target=worker)
+                thread.start()
+                thread.join(timeout=5)
+
+            self.assertFalse(thread.is_alive(), "acquire blocked on an exhausted pool")
+            self.assertEqual(result["value"], 1)
+            self.assertNotIn(result["conn"], held)
+            # Overflow connections are closed on release, not pooled
+            self.assertEqual(self.db._pool.qsize(), 0)
+            self.assertEqual(self.db._overflow, set())
+        finally:
+            for conn in held:
+                self.db._release_connection(conn)
+
+        self.assertEqual(self.db._pool.qsize(), db_module.DB_POOL_SIZE)
+
+    def test_release_rolls_back_uncommitted_changes(self):
+        with self.db.get_connection() as conn:
+            conn.execute("INSERT INTO users (tg_user_id, username, name) VALUES (1, 'u', 'n')")
+        with self.db.get_connection() as conn:
+            count = conn.execute("SELECT COUNT(*) FROM users").fetchone()[0]
+        self.assertEqual(count, 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
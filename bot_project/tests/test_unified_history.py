@@ -0,0 +1,74 @@
+"""
+Tests for batched История writes in the unified Excel report.
+"""
+
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from openpyxl import load_workbook
+
+from db.db import DatabaseManager
+from reports.unified_excel_template import UnifiedExcelTemplate
+
+try:
+    from reports.unified_report_manager import UnifiedReportManager
+except ImportError:  # aiogram is not installed
+    UnifiedReportManager = None
+
+
+def _event(user_id, event_time='2026-01-01T10:00:00+00:00'):
+    return {
+        'event_time': event_time,
+        'event_type': 'subscribe',
+        'tg_user_id': user_id,
+        'username': f'user{user_id}',
+        'name': f'User {user_id}',
+        'inviter_name': 'Unknown',
+        'status': 'subscribed',
+    }
+
+
+class UnifiedHistoryTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.db = DatabaseManager(os.path.join(self.tmp_dir.name, "history.db"))
+        self.reports_dir = os.path.join(self.tmp_dir.name, "reports")
+
+    def tearDown(self):
+        self.db.close()
+        self.tmp_dir.cleanup()
+
+    def _history_user_ids(self, template):
+        template.flush()
+        ws = load_workbook(template.excel_file)["История"]
+        return [row[2] for row in ws.iter_rows(min_row=2, values_only=True)]
+
+    def test_malformed_event_is_skipped_without_losing_the_batch(self):
+        template = UnifiedExcelTemplate(self.db, self.reports_dir)
+
+        added = template.add_history_events([_event(1), _event(2, event_time='garbage'), _event(3)])
+
+        self.assertEqual(added, 2)
+        self.assertEqual(self._history_user_ids(template), [1, 3])
+
+    @unittest.skipIf(UnifiedReportManager is None, "aiogram is not installed")
+    def test_flush_events_keeps_batch_when_workbook_cannot_be_opened(self):
+        manager = UnifiedReportManager(self.db, self.reports_dir)
+        for user_id in (1, 2):
+            manager.add_event_to_history(_event(user_id))
+        manager.add_event_to_history(_event(3, event_time='garbage'))
+
+        with mock.patch.object(manager.excel_template, '_workbook', side_effect=OSError("locked")):
+            manager.flush_events()
+        self.assertEqual(len(manager._event_queue), 3)
+
+        manager.flush_events()
+        self.assertEqual(len(manager._event_queue), 0)
+        self.assertEqual(self._history_user_ids(manager.excel_template), [1, 2])
+
+
+if __name__ == "__main__":
+    unittest.main()
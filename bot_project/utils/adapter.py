@@ -6,13 +6,23 @@
 """
 
 import os
+import atexit
+import asyncio
+import functools
+import itertools
 import logging
 import secrets
+import sqlite3
 import string
-from typing import Dict, List, Optional, Any, Tuple
+import tempfile
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Dict, List, Optional, Any, Tuple, Iterator
 from datetime import datetime, date, timedelta
 from pathlib import Path
 
+from dotenv import dotenv_values
+
 from db.db import get_db, DatabaseManager
 from reports.report_manager import ReportManager
 from utils.time_utils import get_almaty_now, get_today_date_str
@@ -20,6 +30,56 @@ from utils.logging_conf import get_logger
 
 logger = get_logger(__name__)
 
+# Сколько последних событий отдавать в истории пользователя
+USER_HISTORY_LIMIT = 50
+
+# Сколько запросов create_chat_invite_link выполнять одновременно при массовом создании
+INVITE_CREATE_CONCURRENCY = 10
+
+# Через сколько секунд после последнего изменения настроек переписывать .env
+ENV_SAVE_DELAY = 2.0
+# Переменные окружения, которыми управляет SettingsManager
+SETTINGS_ENV_KEYS = ('REPORT_TIME', 'TARGET_CHATS', 'SCHEDULER_ENABLED', 'ADMIN_IDS')
+
+# Пересборка subscribers_database.xlsx выполняется в одном фоновом потоке
+_EXPORT_EXECUTOR = ThreadPoolExecutor(max_workers=1, thread_name_prefix="excel-export")
+
+# Запросы поиска пользователя по полю: (таблица users, журнал)
+_FIND_USER_SQL = {
+    'username': (
+        "SELECT tg_user_id, username, name FROM users WHERE username = ? LIMIT 1",
+        "SELECT tg_user_id, username, name FROM journal WHERE username = ? LIMIT 1",
+    ),
+    'tg_user_id': (
+        "SELECT tg_user_id, username, name FROM users WHERE tg_user_id = ? LIMIT 1",
+        "SELECT tg_user_id, username, name FROM journal WHERE tg_user_id = ? LIMIT 1",
+    ),
+}
+
+
+@functools.cache
+def _target_channels(channels_str: str) -> Tuple[str, ...]:
+    """
+    Список каналов для создания приглашений.
+    
+    Кэшируется по значению переменной окружения (TARGET_CHANNELS, затем TARGET_CHATS
+    как fallback), поэтому строка разбирается один раз на каждое значение.
+    """
+    if not channels_str:
+        logger.warning("TARGET_CHANNELS or TARGET_CHATS not configured - cannot create channel invites")
+        return ()
+    
+    # Парсим каналы из строки (через запятую)
+    channels = tuple(ch.strip() for ch in channels_str.split(',') if ch.strip())
+    logger.info(f"Configured target channels: {list(channels)}")
+    return channels
+
+
+@functools.cache
+def _split_env_list(value: str) -> Tuple[str, ...]:
+    """Разбить значение переменной окружения через запятую (кэшируется по значению)."""
+    return tuple(value.split(',')) if value else ()
+
 
 class InviteManager:
     """Управление пригласительными ссылками для каналов."""
@@ -27,7 +87,13 @@ class InviteManager:
     def __init__(self, db: DatabaseManager, bot=None):
         self.db = db
         self.bot = bot
-        self.target_channels = self._get_target_channels()
+        self.target_channels = _target_channels(
+            os.getenv('TARGET_CHANNELS', '') or os.getenv('TARGET_CHATS', '')
+        )
+        # Кэш имя пригласителя -> id, заполняется при первом обращении;
+        # перестраивается, когда меняется db.inviters_version (любая запись в inviters)
+        self._name_to_id_cache: Optional[Dict[str, int]] = None
+        self._name_to_id_version = -1
     
     async def create_invite_for(self, inviter_name: str) -> str:
         """
@@ -52,56 +118,136 @@ class InviteManager:
             # Создаем приглашение в канал с именем пригласителя
             invite_link = await self._create_channel_invite(channel_id, inviter_name)
             
-            # Сохраняем в БД - обновляем если пользователь уже существует, сохраняя ID
-            with self.db.get_connection() as conn:
-                # Проверяем есть ли уже такой пригласитель
-                existing = conn.execute(
-                    "SELECT id FROM inviters WHERE name = ?", (inviter_name,)
-                ).fetchone()
-                
-                if existing:
-                    # Обновляем существующую запись, сохраняя ID
-                    cursor = conn.execute(
-                        "UPDATE inviters SET username = ?, invite_link = ?, channel_id = ? WHERE id = ?",
-                        (inviter_name, invite_link, channel_id, existing[0])
-                    )
-                    logger.info(f"Updated existing invite for {inviter_name}")
-                else:
-                    # Создаём новую запись 
-                    cursor = conn.execute(
-                        "INSERT INTO inviters (name, username, invite_link, channel_id) VALUES (?, ?, ?, ?)",
-                        (inviter_name, inviter_name, invite_link, channel_id)
-                    )
-                conn.commit()
-                
-                logger.info(f"Created channel invite for {inviter_name}: {invite_link}")
-                return invite_link
+            # Сохраняем в БД в отдельном потоке, чтобы не блокировать event loop
+            await asyncio.to_thread(self._save_invites, {inviter_name: invite_link}, channel_id)
+            
+            logger.info(f"Created channel invite for {inviter_name}: {invite_link}")
+            return invite_link
                 
         except Exception as e:
             logger.exception(f"Failed to create channel invite for {inviter_name}: {e}")
             raise
     
-    def get_invites(self) -> List[Dict[str, Any]]:
+    async def create_invites_for(self, inviter_names: List[str]) -> Dict[str, str]:
+        """
+        Создать пригласительные ссылки для нескольких пригласителей сразу.
+        
+        Запросы к Telegram выполняются параллельно (не более INVITE_CREATE_CONCURRENCY
+        одновременно), результаты сохраняются в БД одной транзакцией.
+        
+        Args:
+            inviter_names: Имена пригласителей
+            
+        Returns:
+            Dict[str, str]: Имя пригласителя -> ссылка (только успешно созданные)
+        """
+        if not self.bot:
+            raise ValueError("Bot instance not available for creating channel invites")
+        
+        if not self.target_channels:
+            raise ValueError("No target channels configured. Set TARGET_CHANNELS or TARGET_CHATS environment variable.")
+        
+        channel_id = self.target_channels[0]
+        names = list(dict.fromkeys(inviter_names))  # без дублей, порядок сохраняется
+        semaphore = asyncio.Semaphore(INVITE_CREATE_CONCURRENCY)
+        
+        async def create_one(inviter_name: str) -> str:
+            async with semaphore:
+                return await self._create_channel_invite(channel_id, inviter_name)
+        
+        results = await asyncio.gather(*(create_one(name) for name in names), return_exceptions=True)
+        
+        links: Dict[str, str] = {}
+        for name, result in zip(names, results):
+            if isinstance(result, BaseException):
+                logger.error(f"Failed to create channel invite for {name}: {result}")
+            else:
+                links[name] = result
+        
+        if links:
+            await asyncio.to_thread(self._save_invites, links, channel_id)
+        
+        logger.info(f"Created {len(links)} of {len(names)} channel invites")
+        return links
+    
+    def _save_invites(self, links: Dict[str, str], channel_id: str) -> None:
+        """
+        Сохранить ссылки пригласителей одной транзакцией.
+        
+        Существующие записи обновляются с сохранением ID, новые добавляются.
+        Синхронный метод: из async-кода вызывается через asyncio.to_thread.
+        """
+        with self.db.get_connection() as conn:
+            if self.db.unique_inviter_names:
+                # Вставка или обновление одним запросом на ссылку
+                conn.executemany(
+                    """INSERT INTO inviters (name, username, invite_link, channel_id) VALUES (?, ?, ?, ?)
+                       ON CONFLICT(name) DO UPDATE SET username = excluded.username,
+                       invite_link = excluded.invite_link, channel_id = excluded.channel_id""",
+                    [(name, name, link, channel_id) for name, link in links.items()]
+                )
+            else:
+                # Старые базы с повторяющимися именами: обновляем первую запись с этим именем
+                existing: Dict[str, int] = {}
+                for name, inviter_id in conn.execute("SELECT name, id FROM inviters ORDER BY id").fetchall():
+                    existing.setdefault(name, inviter_id)
+                
+                conn.executemany(
+                    "UPDATE inviters SET username = ?, invite_link = ?, channel_id = ? WHERE id = ?",
+                    [(name, link, channel_id, existing[name]) for name, link in links.items() if name in existing]
+                )
+                conn.executemany(
+                    "INSERT INTO inviters (name, username, invite_link, channel_id) VALUES (?, ?, ?, ?)",
+                    [(name, name, link, channel_id) for name, link in links.items() if name not in existing]
+                )
+            conn.commit()
+        
+        self.db.mark_inviters_changed()
+    
+    def iter_invites(self, limit: Optional[int] = None) -> Iterator[Dict[str, Any]]:
+        """
+        Пригласительные ссылки со статистикой, по одной по мере чтения курсора.
+        
+        Соединение занято, пока генератор не исчерпан или не закрыт - его нужно
+        дочитать сразу, не прерываясь на await.
+        
+        Args:
+            limit: Сколько ссылок вернуть (None - все)
+        """
+        with self.db.get_connection() as conn:
+            # Ссылки и статистика по ним одним запросом (без запроса на каждого пригласителя)
+            cursor = conn.execute(
+                """SELECT i.id, i.name, i.invite_link, i.channel_id,
+                          COUNT(CASE WHEN j.event_type = 'subscribe' THEN 1 END) AS total_invited,
+                          COUNT(DISTINCT CASE WHEN j.event_type = 'subscribe' AND NOT EXISTS (
+                              SELECT 1 FROM journal j2
+                              WHERE j2.tg_user_id = j.tg_user_id
+                                AND j2.event_type = 'unsubscribe' AND j2.event_time > j.event_time
+                          ) THEN j.tg_user_id END) AS active_now
+                   FROM inviters i
+                   LEFT JOIN journal j ON j.inviter_id = i.id
+                   GROUP BY i.id
+                   ORDER BY i.name"""
+            )
+            for row in itertools.islice(cursor, limit):
+                invite_data = dict(row)
+                invite_data['retention_rate'] = self._retention_rate(
+                    invite_data['total_invited'], invite_data['active_now']
+                )
+                yield invite_data
+    
+    def get_invites(self, limit: Optional[int] = None) -> List[Dict[str, Any]]:
         """
         Получить все пригласительные ссылки.
         
+        Args:
+            limit: Сколько ссылок вернуть (None - все)
+            
         Returns:
             List[Dict]: Список пригласителей и их ссылок
         """
         try:
-            with self.db.get_connection() as conn:
-                cursor = conn.execute(
-                    "SELECT id, name, invite_link, channel_id FROM inviters ORDER BY name"
-                )
-                invites = []
-                for row in cursor.fetchall():
-                    invite_data = dict(row)
-                    # Добавляем статистику
-                    stats = self._get_invite_stats(invite_data['id'])
-                    invite_data.update(stats)
-                    invites.append(invite_data)
-                
-                return invites
+            return list(self.iter_invites(limit))
                 
         except Exception as e:
             logger.exception(f"Failed to get invites: {e}")
@@ -117,6 +263,36 @@ class InviteManager:
             logger.exception(f"Failed to get inviter list: {e}")
             return []
     
+    def get_inviter_id(self, inviter_name: str) -> Optional[int]:
+        """
+        Получить id пригласителя по имени из кэша.
+        
+        Кэш загружается одним запросом и перестраивается после любой записи в inviters
+        (db.mark_inviters_changed). Имени нет в кэше - проверяем одной строкой в БД,
+        на случай записи в обход DatabaseManager.
+        """
+        version = self.db.inviters_version
+        cache = self._name_to_id_cache
+        if cache is None or self._name_to_id_version != version:
+            with self.db.get_connection() as conn:
+                cursor = conn.execute("SELECT name, id FROM inviters ORDER BY id")
+                cache = {}
+                for name, inviter_id in cursor.fetchall():
+                    # При дублях имени берём первую запись, как раньше делал LIMIT 1
+                    cache.setdefault(name, inviter_id)
+            self._name_to_id_cache = cache
+            self._name_to_id_version = version
+        
+        inviter_id = cache.get(inviter_name)
+        if inviter_id is None:
+            with self.db.get_connection() as conn:
+                row = conn.execute(
+                    "SELECT id FROM inviters WHERE name = ? ORDER BY id LIMIT 1", (inviter_name,)
+                ).fetchone()
+            if row is not None:
+                inviter_id = cache[inviter_name] = row[0]
+        return inviter_id
+    
     def delete_invite(self, invite_id: int) -> bool:
         """
         Удалить пригласительную ссылку.
@@ -136,6 +312,7 @@ class InviteManager:
                 conn.commit()
                 
                 if cursor.rowcount > 0:
+                    self.db.mark_inviters_changed()
                     logger.info(f"Deleted invite {invite_id}")
                     return True
                 return False
@@ -155,7 +332,7 @@ class InviteManager:
                 row = cursor.fetchone()
                 if row:
                     invite_data = dict(row)
-                    stats = self._get_invite_stats(invite_id)
+                    stats = self._get_invite_stats(invite_id, conn)
                     invite_data.update(stats)
                     return invite_data
                 return None
@@ -164,19 +341,6 @@ class InviteManager:
             logger.exception(f"Failed to get invite info {invite_id}: {e}")
             return None
     
-    def _get_target_channels(self) -> List[str]:
-        """Получить список каналов для создания приглашений."""
-        # Сначала пробуем TARGET_CHANNELS, затем TARGET_CHATS как fallback
-        channels_str = os.getenv('TARGET_CHANNELS', '') or os.getenv('TARGET_CHATS', '')
-        if not channels_str:
-            logger.warning("TARGET_CHANNELS or TARGET_CHATS not configured - cannot create channel invites")
-            return []
-        
-        # Парсим каналы из строки (через запятую)
-        channels = [ch.strip() for ch in channels_str.split(',') if ch.strip()]
-        logger.info(f"Configured target channels: {channels}")
-        return channels
-    
     async def _create_channel_invite(self, channel_id: str, inviter_name: str) -> str:
         """Создать приглашение в канал через Telegram API."""
         if not self.bot:
@@ -203,47 +367,89 @@ class InviteManager:
                 logger.error(f"Fallback export also failed: {fallback_error}")
                 raise Exception(f"Cannot create invite for channel {channel_id}. Bot may not be admin.")
     
-    def _get_invite_stats(self, inviter_id: int) -> Dict[str, Any]:
-        """Получить статистику по пригласителю."""
+    @staticmethod
+    def _retention_rate(total_invited: int, active_now: int) -> float:
+        """Процент удержания (округлён до 0.1)."""
+        retention_rate = (active_now / total_invited * 100) if total_invited > 0 else 0
+        return round(retention_rate, 1)
+    
+    def _get_invite_stats(self, inviter_id: int,
+                          conn: Optional[sqlite3.Connection] = None) -> Dict[str, Any]:
+        """Получить статистику по пригласителю (на переданном соединении, если оно уже занято вызывающим)."""
         try:
+            if conn is not None:
+                return self._query_invite_stats(conn, inviter_id)
             with self.db.get_connection() as conn:
-                # Всего приглашено
-                cursor = conn.execute(
-                    "SELECT COUNT(*) FROM journal WHERE inviter_id = ? AND event_type = 'subscribe'",
-                    (inviter_id,)
-                )
-                total_invited = cursor.fetchone()[0]
-                
-                # Активных сейчас (подписаны и не вышли)
-                cursor = conn.execute(
-                    """SELECT COUNT(DISTINCT tg_user_id) FROM journal j1 
-                       WHERE j1.inviter_id = ? AND j1.event_type = 'subscribe'
-                       AND j1.tg_user_id NOT IN (
-                           SELECT j2.tg_user_id FROM journal j2 
-                           WHERE j2.event_type = 'unsubscribe' AND j2.event_time > j1.event_time
-                       )""",
-                    (inviter_id,)
-                )
-                active_now = cursor.fetchone()[0]
-                
-                retention_rate = (active_now / total_invited * 100) if total_invited > 0 else 0
-                
-                return {
-                    'total_invited': total_invited,
-                    'active_now': active_now,
-                    'retention_rate': round(retention_rate, 1)
-                }
+                return self._query_invite_stats(conn, inviter_id)
                 
         except Exception as e:
             logger.exception(f"Failed to get invite stats for {inviter_id}: {e}")
             return {'total_invited': 0, 'active_now': 0, 'retention_rate': 0}
+    
+    def _query_invite_stats(self, conn: sqlite3.Connection, inviter_id: int) -> Dict[str, Any]:
+        """Посчитать статистику пригласителя на заданном соединении."""
+        # Всего приглашено
+        cursor = conn.execute(
+            "SELECT COUNT(*) FROM journal WHERE inviter_id = ? AND event_type = 'subscribe'",
+            (inviter_id,)
+        )
+        total_invited = cursor.fetchone()[0]
+        
+        # Активных сейчас (подписаны и не вышли)
+        cursor = conn.execute(
+            """SELECT COUNT(DISTINCT tg_user_id) FROM journal j1 
+               WHERE j1.inviter_id = ? AND j1.event_type = 'subscribe'
+               AND NOT EXISTS (
+                   SELECT 1 FROM journal j2 
+                   WHERE j2.tg_user_id = j1.tg_user_id
+                     AND j2.event_type = 'unsubscribe' AND j2.event_time > j1.event_time
+               )""",
+            (inviter_id,)
+        )
+        active_now = cursor.fetchone()[0]
+        
+        return {
+            'total_invited': total_invited,
+            'active_now': active_now,
+            'retention_rate': self._retention_rate(total_invited, active_now)
+        }
 
 
 class UserManager:
     """Управление пользователями."""
     
-    def __init__(self, db: DatabaseManager):
+    def __init__(self, db: DatabaseManager, invite_manager: InviteManager):
         self.db = db
+        # Общий InviteManager (и его кэш пригласителей), а не собственная копия
+        self.invite_manager = invite_manager
+    
+    @staticmethod
+    def _resolve_user_ident(conn, search_query: str) -> Optional[Tuple[int, Optional[str], Optional[str]]]:
+        """
+        Найти (tg_user_id, username, name) по @username или user_id, без истории.
+        
+        Returns:
+            Tuple или None, если запрос некорректен или пользователь не найден
+        """
+        # Определяем тип поиска
+        if search_query.startswith('@'):
+            search_field = 'username'
+            search_value = search_query[1:]  # убираем @
+        else:
+            try:
+                search_field = 'tg_user_id'
+                search_value = int(search_query)
+            except ValueError:
+                return None
+        
+        # Ищем пользователя: сначала в users, затем в журнале
+        # (в users попадают не все, например только добавленные вручную)
+        users_sql, journal_sql = _FIND_USER_SQL[search_field]
+        user_row = conn.execute(users_sql, (search_value,)).fetchone()
+        if not user_row:
+            user_row = conn.execute(journal_sql, (search_value,)).fetchone()
+        
+        return tuple(user_row) if user_row else None
     
     def find_user(self, search_query: str) -> Optional[Dict[str, Any]]:
         """
@@ -256,58 +462,46 @@ class UserManager:
             Dict: Информация о пользователе или None
         """
         try:
-            # Определяем тип поиска
-            if search_query.startswith('@'):
-                username = search_query[1:]  # убираем @
-                search_field = 'username'
-                search_value = username
-            else:
-                try:
-                    user_id = int(search_query)
-                    search_field = 'tg_user_id'
-                    search_value = user_id
-                except ValueError:
-                    return None
-            
-            # Ищем пользователя
             with self.db.get_connection() as conn:
-                cursor = conn.execute(
-                    f"SELECT DISTINCT tg_user_id, username, name FROM journal WHERE {search_field} = ? LIMIT 1",
-                    (search_value,)
-                )
-                user_row = cursor.fetchone()
-                
-                if not user_row:
+                ident = self._resolve_user_ident(conn, search_query)
+                if not ident:
                     return None
                 
-                user_data = dict(user_row)
+                user_data = dict(zip(('tg_user_id', 'username', 'name'), ident))
+                
+                # Статистика считается в SQL по всей истории пользователя
+                counts = conn.execute(
+                    """SELECT COALESCE(SUM(event_type = 'subscribe'), 0) AS subscribe_count,
+                              COALESCE(SUM(event_type = 'unsubscribe'), 0) AS unsubscribe_count,
+                              MAX(event_time) AS last_activity
+                       FROM journal
+                       WHERE tg_user_id = ?""",
+                    (user_data['tg_user_id'],)
+                ).fetchone()
                 
-                # Получаем историю событий
+                # Получаем последние события
                 cursor = conn.execute(
                     """SELECT j.event_time, j.event_type, j.status, j.note, i.name as inviter_name
                        FROM journal j
                        LEFT JOIN inviters i ON j.inviter_id = i.id
                        WHERE j.tg_user_id = ?
-                       ORDER BY j.event_time DESC""",
-                    (user_data['tg_user_id'],)
+                       ORDER BY j.event_time DESC
+                       LIMIT ?""",
+                    (user_data['tg_user_id'], USER_HISTORY_LIMIT)
                 )
                 
                 history = [dict(row) for row in cursor.fetchall()]
                 user_data['history'] = history
                 
-                # Статистика
-                subscribe_count = len([h for h in history if h['event_type'] == 'subscribe'])
-                unsubscribe_count = len([h for h in history if h['event_type'] == 'unsubscribe'])
-                
                 # Текущий статус
                 last_event = history[0] if history else None
                 current_status = last_event['status'] if last_event else 'unknown'
                 
                 user_data.update({
-                    'subscribe_count': subscribe_count,
-                    'unsubscribe_count': unsubscribe_count,
+                    'subscribe_count': counts['subscribe_count'],
+                    'unsubscribe_count': counts['unsubscribe_count'],
                     'current_status': current_status,
-                    'last_activity': last_event['event_time'] if last_event else None
+                    'last_activity': counts['last_activity']
                 })
                 
                 return user_data
@@ -327,34 +521,17 @@ class UserManager:
             bool: True если добавлен успешно
         """
         try:
-            # Находим пригласителя
+            # Находим пригласителя (из кэша InviteManager)
             inviter_id = None
             if user_data.get('inviter_name'):
-                with self.db.get_connection() as conn:
-                    cursor = conn.execute(
-                        "SELECT id FROM inviters WHERE name = ? LIMIT 1",
-                        (user_data['inviter_name'],)
-                    )
-                    row = cursor.fetchone()
-                    if row:
-                        inviter_id = row[0]
-            
-            # Добавляем пользователя
-            user_id = self.db.insert_user_if_not_exists(
-                user_data['tg_user_id'],
-                user_data.get('username'),
-                user_data.get('name')
-            )
+                inviter_id = self.invite_manager.get_inviter_id(user_data['inviter_name'])
             
-            # Добавляем событие в журнал
-            self.db.insert_journal_event(
-                event_type='manual_add',
+            # Пользователь и событие в журнале пишутся одной транзакцией
+            self.db.add_manual_user(
                 tg_user_id=user_data['tg_user_id'],
                 username=user_data.get('username'),
                 name=user_data.get('name'),
-                inviter_id=inviter_id,
-                status='subscribed',
-                note='manually_added'
+                inviter_id=inviter_id
             )
             
             logger.info(f"Manually added user {user_data['tg_user_id']}")
@@ -375,16 +552,20 @@ class UserManager:
             bool: True если удален успешно
         """
         try:
-            user_data = self.find_user(username_or_id)
-            if not user_data:
+            # Только идентификация пользователя, история не нужна
+            with self.db.get_connection() as conn:
+                ident = self._resolve_user_ident(conn, username_or_id)
+            if not ident:
                 return False
             
+            tg_user_id, username, name = ident
+            
             # Добавляем событие удаления
             self.db.insert_journal_event(
                 event_type='manual_delete',
-                tg_user_id=user_data['tg_user_id'],
-                username=user_data.get('username'),
-                name=user_data.get('name'),
+                tg_user_id=tg_user_id,
+                username=username,
+                name=name,
                 status='deleted',
                 note='manually_deleted'
             )
@@ -404,13 +585,34 @@ class ReportAdapter:
         self.db = db
         self.report_manager = ReportManager(db)
         # Новый менеджер единого файла subscribers_database.xlsx
-        from reports.subscribers_database_manager import SubscribersDatabaseManager
-        self.database_manager = SubscribersDatabaseManager(db)
+        from reports.subscribers_database_manager import get_subscribers_database_manager
+        self.database_manager = get_subscribers_database_manager(db)
+        # Кэш статистики: период -> (версия данных, результат)
+        self._stats_cache: Dict[str, Tuple[Tuple[str, Optional[int], int], Dict[str, Any]]] = {}
+        
+        # Последний готовый экспорт и версия данных, по которой он собран;
+        # текущая пересборка и версия, которую она собирает
+        self._export_lock = threading.Lock()
+        self._export_future: Optional[Future] = None
+        self._export_future_key: Optional[Tuple[str, Optional[int], int]] = None
+        self._export_key: Optional[Tuple[str, Optional[int], int]] = None
+        self._export_path: Optional[str] = None
+    
+    def _journal_version(self) -> Tuple[str, Optional[int], int]:
+        """Версия данных отчётов: (сегодняшняя дата, последний id журнала, версия пригласителей)."""
+        with self.db.get_connection() as conn:
+            last_journal_id = conn.execute("SELECT MAX(id) FROM journal").fetchone()[0]
+        return get_today_date_str(), last_journal_id, self.db.inviters_version
     
     def export_excel(self, report_type: str = "full") -> str:
         """
         Экспорт данных в Excel согласно ТЗ - единый файл subscribers_database.xlsx.
         
+        Файл пересобирается, только если с прошлого экспорта в журнале появились
+        события, изменились пригласители или сменился день. Пока идёт пересборка
+        той же версии, повторные запросы ждут её, а не получают устаревший файл.
+        Блокирующий метод: из async-кода вызывается через asyncio.to_thread.
+        
         Args:
             report_type: Тип отчета (full, daily, weekly, monthly)
             
@@ -419,13 +621,34 @@ class ReportAdapter:
         """
         try:
             # Согласно ТЗ - всегда используем единый файл subscribers_database.xlsx
-            # Обновляем статистику и создаем дневные отчеты если нужно
-            return self.database_manager.export_database()
+            version = self._journal_version()
+            
+            with self._export_lock:
+                last_good = self._export_path if self._export_path and Path(self._export_path).exists() else None
+                if last_good and version == self._export_key:
+                    return last_good
+                
+                future = self._export_future
+                if future is None or future.done() or self._export_future_key != version:
+                    # Пул из одного потока: новая сборка выполнится после текущей
+                    future = _EXPORT_EXECUTOR.submit(self._rebuild_export, version)
+                    self._export_future = future
+                    self._export_future_key = version
+            
+            return future.result()
                 
         except Exception as e:
             logger.exception(f"Failed to export unified database: {e}")
             raise
     
+    def _rebuild_export(self, version: Tuple[str, Optional[int], int]) -> str:
+        """Обновить статистику и дневной лист в subscribers_database.xlsx (фоновый поток)."""
+        file_path = self.database_manager.export_database()
+        with self._export_lock:
+            self._export_key = version
+            self._export_path = file_path
+        return file_path
+    
     def get_stats(self, period: str = "today") -> Dict[str, Any]:
         """
         Получить статистику за период.
@@ -437,18 +660,27 @@ class ReportAdapter:
             Dict: Статистика
         """
         try:
-            today = get_today_date_str()
+            # Статистика меняется только с новыми событиями в журнале или со сменой дня
+            cache_key = self._journal_version()
+            today = cache_key[0]
+            
+            cached = self._stats_cache.get(period)
+            if cached and cached[0] == cache_key:
+                return dict(cached[1])
             
             if period == "today":
-                return self.db.get_daily_stats(today)
+                stats = self.db.get_daily_stats(today)
             elif period == "week":
                 week_start = (datetime.now() - timedelta(days=7)).strftime('%Y-%m-%d')
-                return self.db.get_weekly_stats(week_start)
+                stats = self.db.get_weekly_stats(week_start)
             elif period == "month":
                 month_start = (datetime.now() - timedelta(days=30)).strftime('%Y-%m-%d')
-                return self.db.get_monthly_stats(month_start)
+                stats = self.db.get_monthly_stats(month_start)
             else:
-                return self.db.get_daily_stats(today)
+                stats = self.db.get_daily_stats(today)
+            
+            self._stats_cache[period] = (cache_key, stats)
+            return dict(stats)
                 
         except Exception as e:
             logger.exception(f"Failed to get stats for {period}: {e}")
@@ -468,14 +700,29 @@ class SettingsManager:
     
     def __init__(self):
         self.env_file = Path('.env')
+        
+        # .env читается один раз; дальше настройки живут в памяти
+        self._env_lines: List[str] = (
+            self.env_file.read_text(encoding='utf-8').splitlines() if self.env_file.exists() else []
+        )
+        self._env: Dict[str, str] = {
+            key: value for key, value in dotenv_values(self.env_file).items() if value is not None
+        } if self.env_file.exists() else {}
+        # Переменные процесса важнее .env (как и в load_dotenv)
+        self._env.update({key: os.environ[key] for key in SETTINGS_ENV_KEYS if key in os.environ})
+        
+        self._dirty_keys: set = set()
+        self._save_lock = threading.Lock()
+        self._save_timer: Optional[threading.Timer] = None
+        atexit.register(self.flush)
     
     def get_current_settings(self) -> Dict[str, Any]:
         """Получить текущие настройки."""
         return {
-            'report_time': os.getenv('REPORT_TIME', '23:59'),
-            'target_chats': os.getenv('TARGET_CHATS', '').split(',') if os.getenv('TARGET_CHATS') else [],
-            'scheduler_enabled': os.getenv('SCHEDULER_ENABLED', 'true').lower() == 'true',
-            'admin_ids': os.getenv('ADMIN_IDS', '').split(',') if os.getenv('ADMIN_IDS') else []
+            'report_time': self._env.get('REPORT_TIME', '23:59'),
+            'target_chats': list(_split_env_list(self._env.get('TARGET_CHATS', ''))),
+            'scheduler_enabled': self._env.get('SCHEDULER_ENABLED', 'true').lower() == 'true',
+            'admin_ids': list(_split_env_list(self._env.get('ADMIN_IDS', '')))
         }
     
     def set_report_time(self, time_str: str) -> bool:
@@ -504,9 +751,62 @@ class SettingsManager:
             return False
     
     def _update_env_variable(self, key: str, value: str):
-        """Обновить переменную в .env файле."""
-        # Простая реализация - в продакшене нужно использовать библиотеку python-dotenv
-        logger.info(f"Would update {key}={value} in .env file")
+        """
+        Обновить переменную: сразу в памяти, в .env - отложенной записью (ENV_SAVE_DELAY).
+        """
+        with self._save_lock:
+            self._env[key] = value
+            self._dirty_keys.add(key)
+            
+            if self._save_timer is not None:
+                self._save_timer.cancel()
+            self._save_timer = threading.Timer(ENV_SAVE_DELAY, self.flush)
+            self._save_timer.daemon = True
+            self._save_timer.start()
+        
+        logger.info(f"Updated {key}={value}")
+    
+    def flush(self) -> None:
+        """Записать изменённые переменные в .env (через временный файл и os.replace)."""
+        with self._save_lock:
+            if self._save_timer is not None:
+                self._save_timer.cancel()
+                self._save_timer = None
+            
+            if not self._dirty_keys:
+                return
+            
+            # Заменяем строки изменённых ключей, остальные строки и комментарии сохраняем
+            pending = set(self._dirty_keys)
+            lines = []
+            for line in self._env_lines:
+                key = line.split('=', 1)[0].strip()
+                if key.startswith('export '):
+                    key = key[len('export '):].strip()
+                if '=' in line and key in pending:
+                    lines.append(f"{key}={self._env[key]}")
+                    pending.discard(key)
+                else:
+                    lines.append(line)
+            lines.extend(f"{key}={self._env[key]}" for key in sorted(pending))
+            
+            try:
+                env_dir = self.env_file.resolve().parent
+                fd, tmp_path = tempfile.mkstemp(prefix='.env.', suffix='.tmp', dir=env_dir)
+                try:
+                    with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                        f.write('\n'.join(lines) + '\n')
+                    os.replace(tmp_path, self.env_file)
+                except BaseException:
+                    os.unlink(tmp_path)
+                    raise
+            except Exception as e:
+                logger.exception(f"Failed to write {self.env_file}: {e}")
+                return
+            
+            self._env_lines = lines
+            self._dirty_keys.clear()
+            logger.info(f"Saved settings to {self.env_file}")
 
 
 # Глобальные экземпляры адаптеров
@@ -515,29 +815,36 @@ user_manager: Optional[UserManager] = None
 report_adapter: Optional[ReportAdapter] = None
 settings_manager: Optional[SettingsManager] = None
 
+# Защищает init_adapters от одновременного первого обращения из разных потоков
+# (RLock: геттеры вызывают init_adapters, уже удерживая блокировку)
+_init_lock = threading.RLock()
+
 
 def init_adapters():
     """Инициализация всех адаптеров."""
     global invite_manager, user_manager, report_adapter, settings_manager
     
-    try:
-        db = get_db()
-        invite_manager = InviteManager(db, bot=None)  # Bot будет передан позже
-        user_manager = UserManager(db)
-        report_adapter = ReportAdapter(db)
-        settings_manager = SettingsManager()
-        
-        logger.info("✅ All adapters initialized successfully")
-        
-    except Exception as e:
-        logger.exception(f"❌ Failed to initialize adapters: {e}")
-        raise
+    with _init_lock:
+        try:
+            db = get_db()
+            invite_manager = InviteManager(db, bot=None)  # Bot будет передан позже
+            user_manager = UserManager(db, invite_manager)
+            report_adapter = ReportAdapter(db)
+            settings_manager = SettingsManager()
+            
+            logger.info("✅ All adapters initialized successfully")
+            
+        except Exception as e:
+            logger.exception(f"❌ Failed to initialize adapters: {e}")
+            raise
 
 
 def get_invite_manager() -> InviteManager:
     """Получить менеджер пригласительных ссылок."""
     if invite_manager is None:
-        init_adapters()
+        with _init_lock:
+            if invite_manager is None:
+                init_adapters()
     if invite_manager is None:
         raise RuntimeError("Failed to initialize invite manager")
     return invite_manager
@@ -546,7 +853,9 @@ def get_invite_manager() -> InviteManager:
 def get_user_manager() -> UserManager:
     """Получить менеджер пользователей."""
     if user_manager is None:
-        init_adapters()
+        with _init_lock:
+            if user_manager is None:
+                init_adapters()
     if user_manager is None:
         raise RuntimeError("Failed to initialize user manager")
     return user_manager
@@ -555,7 +864,9 @@ def get_user_manager() -> UserManager:
 def get_report_adapter() -> ReportAdapter:
     """Получить адаптер отчетов."""
     if report_adapter is None:
-        init_adapters()
+        with _init_lock:
+            if report_adapter is None:
+                init_adapters()
     if report_adapter is None:
         raise RuntimeError("Failed to initialize report adapter")
     return report_adapter
@@ -564,7 +875,9 @@ def get_report_adapter() -> ReportAdapter:
 def get_settings_manager() -> SettingsManager:
     """Получить менеджер настроек."""
     if settings_manager is None:
-        init_adapters()
+        with _init_lock:
+            if settings_manager is None:
+                init_adapters()
     if settings_manager is None:
         raise RuntimeError("Failed to initialize settings manager")
     return settings_manager
@@ -579,9 +892,17 @@ async def create_invite_for(name: str, bot=None) -> str:
     return await manager.create_invite_for(name)
 
 
-def get_invites() -> List[Dict[str, Any]]:
+async def create_invites_for(names: List[str], bot=None) -> Dict[str, str]:
+    """Создать пригласительные ссылки для нескольких пригласителей."""
+    manager = get_invite_manager()
+    if bot and not manager.bot:
+        manager.bot = bot
+    return await manager.create_invites_for(names)
+
+
+def get_invites(limit: Optional[int] = None) -> List[Dict[str, Any]]:
     """Получить все пригласительные ссылки."""
-    return get_invite_manager().get_invites()
+    return get_invite_manager().get_invites(limit)
 
 
 def find_user(search_query: str) -> Optional[Dict[str, Any]]:
@@ -5,11 +5,14 @@ Logging configuration module for Telegram bot reporting system.
 Provides centralized logging setup with file rotation and appropriate formatting.
 """
 
+import atexit
 import logging
 import logging.handlers
 import os
+import queue
 import sys
-from datetime import datetime
+import threading
+import time
 from typing import Optional
 from pathlib import Path
 
@@ -18,13 +21,135 @@ DEFAULT_LOG_DIR = "logs"
 DEFAULT_LOG_LEVEL = logging.INFO
 MAX_LOG_FILE_SIZE = 10 * 1024 * 1024  # 10MB
 BACKUP_COUNT = 5
+LOG_QUEUE_SIZE = 10000  # Records waiting for the file writer thread
+LOG_BUFFER_SIZE = 64 * 1024  # Buffered log text written to the file in one go
+LOG_FLUSH_INTERVAL = 0.2  # Seconds a record may wait in the buffer
+
+# LOG_LEVEL values accepted by configure_logging_from_env
+_LOG_LEVEL_MAP = {
+    'DEBUG': logging.DEBUG,
+    'INFO': logging.INFO,
+    'WARNING': logging.WARNING,
+    'ERROR': logging.ERROR,
+    'CRITICAL': logging.CRITICAL
+}
+
+# Listener that writes queued records to the log file (see setup_logging)
+_queue_listener: Optional[logging.handlers.QueueListener] = None
+
+
+def _stop_queue_listener() -> None:
+    """Stop the file writer thread, flushing records still in the queue."""
+    global _queue_listener
+    if _queue_listener is not None:
+        _queue_listener.stop()
+        for handler in _queue_listener.handlers:
+            handler.flush()
+        _queue_listener = None
+
+
+atexit.register(_stop_queue_listener)
+
+
+class BufferedRotatingFileHandler(logging.handlers.RotatingFileHandler):
+    """
+    RotatingFileHandler that collects formatted records and writes them in batches.
+    
+    The buffer is written once it holds LOG_BUFFER_SIZE characters or its oldest
+    record is LOG_FLUSH_INTERVAL seconds old (a timer covers quiet periods), and
+    before every rollover, flush() and close().
+    """
+    
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._buffer: list = []
+        self._buffer_size = 0
+        self._flush_timer: Optional[threading.Timer] = None
+    
+    def emit(self, record):
+        """Format the record into the buffer (called with the handler lock held)."""
+        try:
+            msg = self.format(record) + self.terminator
+            
+            if self.stream is None:
+                if self.mode != 'w' or not self._closed:
+                    self.stream = self._open()
+            
+            # Same size check as shouldRollover, counting text still in the buffer
+            if self.maxBytes > 0 and self.stream is not None:
+                if self.stream.tell() + self._buffer_size + len(msg) >= self.maxBytes:
+                    self._write_buffer()
+                    self.doRollover()
+            
+            self._buffer.append(msg)
+            self._buffer_size += len(msg)
+            
+            if self._buffer_size >= LOG_BUFFER_SIZE:
+                self._write_buffer()
+            elif self._flush_timer is None:
+                self._flush_timer = threading.Timer(LOG_FLUSH_INTERVAL, self.flush)
+                self._flush_timer.daemon = True
+                self._flush_timer.start()
+        except RecursionError:
+            raise
+        except Exception:
+            self.handleError(record)
+    
+    def _write_buffer(self) -> None:
+        """Write buffered records to the file with one write/flush."""
+        if self._flush_timer is not None:
+            self._flush_timer.cancel()
+            self._flush_timer = None
+        
+        if not self._buffer or self.stream is None:
+            return
+        
+        self.stream.write(''.join(self._buffer))
+        self.stream.flush()
+        self._buffer.clear()
+        self._buffer_size = 0
+    
+    def flush(self):
+        """Write buffered records and flush the stream."""
+        self.acquire()
+        try:
+            self._write_buffer()
+            super().flush()
+        finally:
+            self.release()
+
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """
+    QueueHandler that never blocks or raises when the queue is full.
+    
+    Records that do not fit are dropped and counted in `dropped` instead of
+    going through handleError (which would print a traceback per record).
+    """
+    
+    def __init__(self, queue_):
+        super().__init__(queue_)
+        self.dropped = 0
+    
+    def enqueue(self, record):
+        """Put the record on the queue, dropping it if the queue is full."""
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
 
 
 class UTCFormatter(logging.Formatter):
     """
     Custom formatter that uses UTC time for log messages.
+    
+    Timestamps have one-second resolution, so the last formatted second is
+    cached and reused by every record emitted within it.
     """
     
+    # (second, datefmt, formatted) - replaced as a whole, so safe to read from any thread
+    _last_time: tuple = (None, None, '')
+    
     def formatTime(self, record, datefmt=None):
         """
         Format time using UTC timezone.
@@ -36,11 +161,14 @@ class UTCFormatter(logging.Formatter):
         Returns:
             str: Formatted timestamp
         """
-        dt = datetime.utcfromtimestamp(record.created)
-        if datefmt:
-            return dt.strftime(datefmt)
-        else:
-            return dt.strftime('%Y-%m-%d %H:%M:%S UTC')
+        sec = int(record.created)
+        cached_sec, cached_fmt, formatted = self._last_time
+        if sec == cached_sec and datefmt == cached_fmt:
+            return formatted
+        
+        formatted = time.strftime(datefmt or '%Y-%m-%d %H:%M:%S UTC', time.gmtime(sec))
+        self._last_time = (sec, datefmt, formatted)
+        return formatted
 
 
 def setup_logging(
@@ -63,6 +191,8 @@ def setup_logging(
     Returns:
         logging.Logger: Configured logger instance
     """
+    global _queue_listener
+    
     # Create logs directory if it doesn't exist
     if file_output:
         Path(log_dir).mkdir(parents=True, exist_ok=True)
@@ -73,6 +203,7 @@ def setup_logging(
     
     # Clear existing handlers
     logger.handlers.clear()
+    _stop_queue_listener()
     
     # Create formatter
     formatter = UTCFormatter(
@@ -87,10 +218,11 @@ def setup_logging(
         console_handler.setFormatter(formatter)
         logger.addHandler(console_handler)
     
-    # File handler with rotation
+    # File handler with rotation, fed from a queue by a background thread
+    # so logging calls never wait on disk I/O
     if file_output:
         log_file_path = os.path.join(log_dir, f"{app_name}.log")
-        file_handler = logging.handlers.RotatingFileHandler(
+        file_handler = BufferedRotatingFileHandler(
             log_file_path,
             maxBytes=MAX_LOG_FILE_SIZE,
             backupCount=BACKUP_COUNT,
@@ -98,7 +230,13 @@ def setup_logging(
         )
         file_handler.setLevel(log_level)
         file_handler.setFormatter(formatter)
-        logger.addHandler(file_handler)
+        
+        log_queue: queue.Queue = queue.Queue(maxsize=LOG_QUEUE_SIZE)
+        _queue_listener = logging.handlers.QueueListener(
+            log_queue, file_handler, respect_handler_level=True
+        )
+        _queue_listener.start()
+        logger.addHandler(DroppingQueueHandler(log_queue))
     
     # Set specific loggers levels
     # Reduce aiogram verbosity
@@ -125,6 +263,39 @@ def get_logger(name: str) -> logging.Logger:
     return logging.getLogger(name)
 
 
+# Loggers used by the log_* helpers, looked up once
+_function_calls_logger = logging.getLogger('function_calls')
+_database_logger = logging.getLogger('database')
+_telegram_events_logger = logging.getLogger('telegram_events')
+_reports_logger = logging.getLogger('reports')
+_scheduler_logger = logging.getLogger('scheduler')
+
+
+def _format_details(details: dict) -> str:
+    """Format keyword details as 'key=value, ...'."""
+    if not details:
+        return ''
+    if len(details) == 1:
+        (key, value), = details.items()
+        return f'{key}={value}'
+    return ', '.join(f'{k}={v}' for k, v in details.items())
+
+
+class _CallArgs:
+    """Call arguments rendered as 'a, b, k=v' only when the record is formatted."""
+    
+    __slots__ = ('args', 'kwargs')
+    
+    def __init__(self, args: tuple, kwargs: Optional[dict]):
+        self.args = args
+        self.kwargs = kwargs
+    
+    def __str__(self) -> str:
+        args_str = ', '.join(repr(arg) for arg in self.args) if self.args else ''
+        kwargs_str = ', '.join(f'{k}={repr(v)}' for k, v in (self.kwargs or {}).items())
+        return ', '.join(filter(None, [args_str, kwargs_str]))
+
+
 def log_function_call(func_name: str, args: tuple = (), kwargs: Optional[dict] = None) -> None:
     """
     Log function call with arguments.
@@ -134,13 +305,10 @@ def log_function_call(func_name: str, args: tuple = (), kwargs: Optional[dict] =
         args: Positional arguments
         kwargs: Keyword arguments
     """
-    logger = logging.getLogger('function_calls')
-    
-    args_str = ', '.join(repr(arg) for arg in args) if args else ''
-    kwargs_str = ', '.join(f'{k}={repr(v)}' for k, v in (kwargs if kwargs is not None else {}).items())
+    if not _function_calls_logger.isEnabledFor(logging.DEBUG):
+        return
     
-    all_args = ', '.join(filter(None, [args_str, kwargs_str]))
-    logger.debug(f"Calling {func_name}({all_args})")
+    _function_calls_logger.debug("Calling %s(%s)", func_name, _CallArgs(args, kwargs))
 
 
 def log_database_operation(operation: str, table: str, **kwargs) -> None:
@@ -152,10 +320,10 @@ def log_database_operation(operation: str, table: str, **kwargs) -> None:
         table: Table name
         **kwargs: Additional operation details
     """
-    logger = logging.getLogger('database')
+    if not _database_logger.isEnabledFor(logging.DEBUG):
+        return
     
-    details = ', '.join(f'{k}={v}' for k, v in kwargs.items()) if kwargs else ''
-    logger.debug(f"DB {operation} on {table}: {details}")
+    _database_logger.debug("DB %s on %s: %s", operation, table, _format_details(kwargs))
 
 
 def log_telegram_event(event_type: str, user_id: int, username: Optional[str] = None, **kwargs) -> None:
@@ -168,18 +336,19 @@ def log_telegram_event(event_type: str, user_id: int, username: Optional[str] =
         username: Telegram username (optional)
         **kwargs: Additional event details
     """
-    logger = logging.getLogger('telegram_events')
+    if not _telegram_events_logger.isEnabledFor(logging.INFO):
+        return
     
-    user_info = f"user_id={user_id}"
+    template = "Telegram %s: user_id=%s"
+    args = [event_type, user_id]
     if username:
-        user_info += f", username={username}"
+        template += ", username=%s"
+        args.append(username)
+    if kwargs:
+        template += ", %s"
+        args.append(_format_details(kwargs))
     
-    details = ', '.join(f'{k}={v}' for k, v in kwargs.items()) if kwargs else ''
-    log_message = f"Telegram {event_type}: {user_info}"
-    if details:
-        log_message += f", {details}"
-    
-    logger.info(log_message)
+    _telegram_events_logger.info(template, *args)
 
 
 def log_report_generation(report_type: str, period: str, status: str, **kwargs) -> None:
@@ -192,17 +361,17 @@ def log_report_generation(report_type: str, period: str, status: str, **kwargs)
         status: Generation status (started, completed, failed)
         **kwargs: Additional details
     """
-    logger = logging.getLogger('reports')
+    level = logging.ERROR if status == 'failed' else logging.INFO
+    if not _reports_logger.isEnabledFor(level):
+        return
     
-    details = ', '.join(f'{k}={v}' for k, v in kwargs.items()) if kwargs else ''
-    log_message = f"Report {status}: {report_type} for {period}"
-    if details:
-        log_message += f", {details}"
+    template = "Report %s: %s for %s"
+    args = [status, report_type, period]
+    if kwargs:
+        template += ", %s"
+        args.append(_format_details(kwargs))
     
-    if status == 'failed':
-        logger.error(log_message)
-    else:
-        logger.info(log_message)
+    _reports_logger.log(level, template, *args)
 
 
 def log_scheduler_event(task_name: str, status: str, next_run: Optional[str] = None, **kwargs) -> None:
@@ -215,21 +384,20 @@ def log_scheduler_event(task_name: str, status: str, next_run: Optional[str] = N
         next_run: Next run time (optional)
         **kwargs: Additional details
     """
-    logger = logging.getLogger('scheduler')
-    
-    details = ', '.join(f'{k}={v}' for k, v in kwargs.items()) if kwargs else ''
-    log_message = f"Task {task_name} {status}"
+    level = logging.ERROR if status == 'failed' else logging.INFO
+    if not _scheduler_logger.isEnabledFor(level):
+        return
     
+    template = "Task %s %s"
+    args = [task_name, status]
     if next_run:
-        log_message += f", next run: {next_run}"
+        template += ", next run: %s"
+        args.append(next_run)
+    if kwargs:
+        template += ", %s"
+        args.append(_format_details(kwargs))
     
-    if details:
-        log_message += f", {details}"
-    
-    if status == 'failed':
-        logger.error(log_message)
-    else:
-        logger.info(log_message)
+    _scheduler_logger.log(level, template, *args)
 
 
 def setup_development_logging() -> logging.Logger:
@@ -262,10 +430,8 @@ def setup_production_logging() -> logging.Logger:
     try:
         Path(log_dir).mkdir(parents=True, exist_ok=True)
         # Test write permissions
-        test_file = os.path.join(log_dir, "test_write.tmp")
-        with open(test_file, 'w') as f:
-            f.write("test")
-        os.remove(test_file)
+        if not os.access(log_dir, os.W_OK):
+            raise PermissionError(log_dir)
     except (PermissionError, OSError):
         # Fall back to relative logs directory
         log_dir = os.getenv('LOG_DIR', DEFAULT_LOG_DIR)
@@ -298,14 +464,7 @@ def configure_logging_from_env() -> logging.Logger:
     app_env = os.getenv('APP_ENV', 'development').lower()
     
     # Convert log level string to constant
-    log_level_map = {
-        'DEBUG': logging.DEBUG,
-        'INFO': logging.INFO,
-        'WARNING': logging.WARNING,
-        'ERROR': logging.ERROR,
-        'CRITICAL': logging.CRITICAL
-    }
-    log_level = log_level_map.get(log_level_str, logging.INFO)
+    log_level = _LOG_LEVEL_MAP.get(log_level_str, logging.INFO)
     
     # Configure based on environment
     if app_env == 'production':
@@ -5,13 +5,24 @@ Time utilities module for Telegram bot reporting system.
 Provides timezone-aware date/time operations and formatting functions.
 """
 
+import time
 from datetime import datetime, date, timezone, timedelta
+from functools import lru_cache
 from typing import Optional, Union
-import pytz
+from zoneinfo import ZoneInfo
 
-# Almaty timezone
-ALMATY_TZ = pytz.timezone('Asia/Almaty')
-UTC_TZ = pytz.timezone('UTC')
+# Almaty timezone (stdlib zoneinfo: no pytz localize/normalize needed)
+ALMATY_TZ = ZoneInfo('Asia/Almaty')
+UTC_TZ = timezone.utc
+
+# Today's Almaty date for the current second: (second, date, ISO string)
+_today_cache: tuple = (None, None, '')
+
+# Genitive month names for report dates
+_MONTHS_RU = (
+    'января', 'февраля', 'марта', 'апреля', 'мая', 'июня',
+    'июля', 'августа', 'сентября', 'октября', 'ноября', 'декабря'
+)
 
 
 def get_almaty_now() -> datetime:
@@ -45,7 +56,7 @@ def almaty_to_utc(almaty_dt: datetime) -> datetime:
         datetime: Datetime in UTC timezone
     """
     if almaty_dt.tzinfo is None:
-        almaty_dt = ALMATY_TZ.localize(almaty_dt)
+        almaty_dt = almaty_dt.replace(tzinfo=ALMATY_TZ)
     return almaty_dt.astimezone(UTC_TZ)
 
 
@@ -60,22 +71,37 @@ def utc_to_almaty(utc_dt: datetime) -> datetime:
         datetime: Datetime in Almaty timezone
     """
     if utc_dt.tzinfo is None:
-        utc_dt = UTC_TZ.localize(utc_dt)
+        utc_dt = utc_dt.replace(tzinfo=UTC_TZ)
     return utc_dt.astimezone(ALMATY_TZ)
 
 
+def _almaty_today() -> tuple:
+    """
+    Today's date in Almaty as (date, ISO string), recomputed at most once per second.
+    """
+    global _today_cache
+    now = time.time()
+    sec = int(now)
+    cached_sec, today, today_str = _today_cache
+    if sec != cached_sec:
+        today = datetime.fromtimestamp(now, ALMATY_TZ).date()
+        today_str = today.isoformat()
+        _today_cache = (sec, today, today_str)
+    return today, today_str
+
+
 def get_today_date_str(tz: Optional[timezone] = None) -> str:
     """
     Get today's date as ISO string.
     
     Args:
-        tz: Timezone to use (default: Moscow)
+        tz: Timezone to use (default: Almaty)
         
     Returns:
         str: Today's date in YYYY-MM-DD format
     """
     if tz is None:
-        return get_almaty_now().date().isoformat()
+        return _almaty_today()[1]
     else:
         return datetime.now(tz).date().isoformat()
 
@@ -86,13 +112,13 @@ def get_date_n_days_ago(days: int, tz: Optional[timezone] = None) -> str:
     
     Args:
         days: Number of days ago
-        tz: Timezone to use (default: Moscow)
+        tz: Timezone to use (default: Almaty)
         
     Returns:
         str: Date in YYYY-MM-DD format
     """
     if tz is None:
-        base_date = get_almaty_now().date()
+        base_date = _almaty_today()[0]
     else:
         base_date = datetime.now(tz).date()
     
@@ -111,27 +137,15 @@ def format_datetime_for_report(dt: datetime, include_time: bool = True) -> str:
     Returns:
         str: Formatted datetime string
     """
-    # Convert to Almaty timezone if needed
+    # Convert to Almaty timezone if needed (naive values are UTC)
     if dt.tzinfo is None:
-        dt = UTC_TZ.localize(dt)
-    
-    almaty_dt = dt.astimezone(ALMATY_TZ)
+        dt = dt.replace(tzinfo=UTC_TZ)
     
-    months_ru = [
-        'января', 'февраля', 'марта', 'апреля', 'мая', 'июня',
-        'июля', 'августа', 'сентября', 'октября', 'ноября', 'декабря'
-    ]
-    
-    day = almaty_dt.day
-    month = months_ru[almaty_dt.month - 1]
-    year = almaty_dt.year
+    dt = dt.astimezone(ALMATY_TZ)
     
     if include_time:
-        hour = almaty_dt.hour
-        minute = almaty_dt.minute
-        return f"{day} {month} {year} г. в {hour:02d}:{minute:02d}"
-    else:
-        return f"{day} {month} {year} г."
+        return f"{dt.day} {_MONTHS_RU[dt.month - 1]} {dt.year} г. в {dt.hour:02d}:{dt.minute:02d}"
+    return f"{dt.day} {_MONTHS_RU[dt.month - 1]} {dt.year} г."
 
 
 def parse_iso_datetime(iso_string: str) -> datetime:
@@ -148,43 +162,53 @@ def parse_iso_datetime(iso_string: str) -> datetime:
         ValueError: If the input string is not a valid ISO datetime
     """
     try:
-        # Try parsing with timezone info
         dt = datetime.fromisoformat(iso_string)
     except ValueError:
-        try:
-            # Fallback: handle 'Z' suffix and other common formats
-            dt = datetime.fromisoformat(iso_string.replace('Z', '+00:00'))
-        except ValueError:
-            raise ValueError(f"Invalid ISO datetime string: {iso_string}")
+        raise ValueError(f"Invalid ISO datetime string: {iso_string}")
     
     # Ensure timezone-aware (assume UTC if naive)
     if dt.tzinfo is None:
-        dt = UTC_TZ.localize(dt)
+        return dt.replace(tzinfo=UTC_TZ)
+    
+    # Already UTC ('Z' / '+00:00') - nothing to convert
+    if dt.tzinfo is UTC_TZ:
+        return dt
     
     # Convert to UTC for consistency
     return dt.astimezone(UTC_TZ)
 
 
-def get_week_start_date(target_date: Optional[Union[date, str]] = None) -> str:
+def get_week_start_date_as_date(target_date: Optional[Union[date, str]] = None) -> date:
     """
-    Get the start date of the week (Monday) for the given date.
+    Get the start date of the week (Monday) for the given date as a date object.
     
     Args:
         target_date: Target date (default: today)
         
     Returns:
-        str: Week start date in YYYY-MM-DD format
+        date: Week start date
     """
     if target_date is None:
-        target_date = get_almaty_now().date()
+        target_date = _almaty_today()[0]
     elif isinstance(target_date, str):
         target_date = date.fromisoformat(target_date)
     
     # Calculate days since Monday (0=Monday, 6=Sunday)
     days_since_monday = target_date.weekday()
-    week_start = target_date - timedelta(days=days_since_monday)
+    return target_date - timedelta(days=days_since_monday)
+
+
+def get_week_start_date(target_date: Optional[Union[date, str]] = None) -> str:
+    """
+    Get the start date of the week (Monday) for the given date.
     
-    return week_start.isoformat()
+    Args:
+        target_date: Target date (default: today)
+        
+    Returns:
+        str: Week start date in YYYY-MM-DD format
+    """
+    return get_week_start_date_as_date(target_date).isoformat()
 
 
 def get_month_start_date(target_date: Optional[Union[date, str]] = None) -> str:
@@ -198,7 +222,7 @@ def get_month_start_date(target_date: Optional[Union[date, str]] = None) -> str:
         str: Month start date in YYYY-MM-DD format
     """
     if target_date is None:
-        target_date = get_almaty_now().date()
+        target_date = _almaty_today()[0]
     elif isinstance(target_date, str):
         target_date = date.fromisoformat(target_date)
     
@@ -233,6 +257,16 @@ def is_valid_date_string(date_string: str) -> bool:
     Returns:
         bool: True if valid ISO date format
     """
+    # Reject obviously malformed input without raising
+    if (not isinstance(date_string, str) or len(date_string) != 10
+            or date_string[4] != '-' or date_string[7] != '-'):
+        return False
+    return _parse_date_ok(date_string)
+
+
+@lru_cache(maxsize=256)
+def _parse_date_ok(date_string: str) -> bool:
+    """Check a YYYY-MM-DD shaped string with date.fromisoformat (memoized)."""
     try:
         date.fromisoformat(date_string)
         return True
@@ -260,6 +294,7 @@ def get_retention_check_dates(retention_days: int, check_date: Optional[str] = N
     return [target_date.isoformat()]
 
 
+@lru_cache(maxsize=512)
 def format_time_period_ru(days: int) -> str:
     """
     Format time period in Russian with correct pluralization.